@@ -5,6 +5,7 @@ import json
 import os
 import uvloop
 from aiohttp import web
+from prometheus_async.aio.web import server_stats
 
 import jwt
 import hail as hl
@@ -12,11 +13,16 @@ from hail.utils import FatalError
 from hail.utils.java import Env, info, scala_object
 from hailtop.gear.auth import authenticated_users_only
 
+from .result_cache import ResultCache, ir_inputs, result_key
+
 uvloop.install()
 
 master = os.environ.get('HAIL_APISERVER_SPARK_MASTER')
 hl.init(master=master, min_block_size=0)
 
+RESULT_CACHE_BYTES = int(os.environ.get('HAIL_APISERVER_RESULT_CACHE_BYTES', 256 * 1024 * 1024))
+info(f'RESULT_CACHE_BYTES {RESULT_CACHE_BYTES}')
+
 app = web.Application()
 routes = web.RouteTableDef()
 
@@ -49,13 +55,34 @@ def blocking_execute(code):
     }
 
 
+def blocking_execute_key(code):
+    inputs = ir_inputs(code)
+    if inputs is None:
+        return None
+    fs = Env.fs()
+    fingerprints = []
+    for path in inputs:
+        try:
+            stat = fs.stat(path)
+        except Exception:  # pylint: disable=W0703
+            # for example a glob, let the execution report missing files
+            return None
+        fingerprints.append((path, stat['size_bytes'], stat['modification_time']))
+    return result_key(code, fingerprints)
+
+
+# results are json strings, their size dominates
+result_cache = ResultCache(RESULT_CACHE_BYTES, sizeof=lambda result: len(result['result']))
+
+
 @routes.post('/execute')
 @authenticated_users_only
 async def execute(request, userdata):
     code = await request.json()
     info(f'execute: {code}')
     try:
-        result = await run(blocking_execute, code)
+        key = await run(blocking_execute_key, code)
+        result = await result_cache.get(key, ft.partial(run, blocking_execute, code))
         info(f'result: {result}')
         return web.json_response(result)
     except FatalError as e:
@@ -163,12 +190,56 @@ async def blockmatrix_type(request, userdata):
         }, status=400)
 
 
+type_functions = {
+    'value': blocking_value_type,
+    'table': blocking_table_type,
+    'matrix': blocking_matrix_type,
+    'blockmatrix': blocking_blockmatrix_type
+}
+
+
+def blocking_type_batch(irs):
+    results = []
+    for ir in irs:
+        try:
+            results.append({'type': type_functions[ir['kind']](ir['code'])})
+        except FatalError as e:
+            results.append({'message': e.args[0]})
+    return results
+
+
+@routes.post('/type/batch')
+@authenticated_users_only
+async def type_batch(request, _userdata):
+    irs = await request.json()
+    if not isinstance(irs, list):
+        return web.json_response({
+            'message': 'expected a list of IRs'
+        }, status=400)
+    info(f'type batch: {len(irs)} irs')
+    for ir in irs:
+        if not isinstance(ir, dict) or not isinstance(ir.get('code'), str):
+            return web.json_response({
+                'message': f'expected an IR with a kind and code: {ir}'
+            }, status=400)
+        if ir.get('kind') not in type_functions:
+            return web.json_response({
+                'message': f'unknown IR kind: {ir.get("kind")}'
+            }, status=400)
+    result = await run(blocking_type_batch, irs)
+    info(f'result: {result}')
+    return web.json_response(result)
+
+
 @routes.post('/references/create')
 @authenticated_users_only
 async def create_reference(request, userdata):
     try:
         config = await request.json()
         hl.ReferenceGenome._from_config(config)
+        # cached results may have been computed with an earlier reference
+        # of the same name
+        result_cache.clear()
         return status_response(204)
     except FatalError as e:
         return web.json_response({
@@ -189,6 +260,25 @@ async def create_reference_from_fasta(request, userdata):
             data['y_contigs'],
             data['mt_contigs'],
             data['par'])
+        result_cache.clear()
+        return status_response(204)
+    except FatalError as e:
+        return web.json_response({
+            'message': e.args[0]
+        }, status=400)
+
+
+def blocking_remove_reference(data):
+    Env.hail().variant.ReferenceGenome.removeReference(data['name'])
+
+
+@routes.delete('/references/delete')
+@authenticated_users_only
+async def remove_reference(request, userdata):
+    try:
+        data = await request.json()
+        await run(blocking_remove_reference, data)
+        result_cache.clear()
         return status_response(204)
     except FatalError as e:
         return web.json_response({
@@ -227,6 +317,7 @@ async def reference_add_sequence(request, userdata):
     try:
         data = await request.json()
         await run(blocking_reference_add_sequence, data)
+        result_cache.clear()
         return status_response(204)
     except FatalError as e:
         return web.json_response({'message': e.args[0]}, status=400)
@@ -243,6 +334,7 @@ async def reference_remove_sequence(request, userdata):
     try:
         data = await request.json()
         await run(blocking_reference_remove_sequence, data)
+        result_cache.clear()
         return status_response(204)
     except FatalError as e:
         return web.json_response({
@@ -263,6 +355,7 @@ async def reference_add_liftover(request, userdata):
     try:
         data = await request.json()
         await run(blocking_reference_add_liftover, data)
+        result_cache.clear()
         return status_response(204)
     except FatalError as e:
         return web.json_response({'message': e.args[0]}, status=400)
@@ -280,6 +373,7 @@ async def reference_remove_liftover(request, userdata):
     try:
         data = await request.json()
         await run(blocking_reference_remove_liftover, data)
+        result_cache.clear()
         return status_response(204)
     except FatalError as e:
         return web.json_response({'message': e.args[0]}, status=400)
@@ -301,4 +395,5 @@ async def parse_vcf_metadata(request, userdata):
 
 
 app.add_routes(routes)
+app.router.add_get('/metrics', server_stats)
 web.run_app(app, host='0.0.0.0', port=5000)
@@ -0,0 +1,112 @@
+"""Measures /execute throughput with and without the result cache.
+
+A stand-in for the apiserver is served on a local port.  It executes each
+request on a 16-thread pool, like the apiserver, by sleeping for a fixed time
+instead of running the IR.  Concurrent clients repeatedly send queries drawn
+from a small set of distinct IRs, as notebook users re-running the same
+``count()`` or ``aggregate`` on a shared dataset do.
+
+    python3 -m apiserver.cache_benchmark --clients 32 --requests 50 --distinct-queries 8
+"""
+import argparse
+import asyncio
+import concurrent
+import functools as ft
+import json
+import random
+import time
+
+import aiohttp
+from aiohttp import web
+
+from .result_cache import ResultCache, ir_inputs, result_key
+
+
+def query(i):
+    reader = json.dumps({'name': 'TableNativeReader', 'path': f'gs://bucket/dataset-{i}.ht'})
+    reader = reader.replace('\\', '\\\\').replace('"', '\\"')
+    return f'(TableCount (TableRead None False "{reader}"))'
+
+
+class StandInServer:
+    def __init__(self, execution_time, cache_bytes):
+        self.execution_time = execution_time
+        self.result_cache = ResultCache(cache_bytes, sizeof=lambda result: len(result['result'])) \
+            if cache_bytes else None
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=16)
+        self.n_executed = 0
+
+        self.app = web.Application()
+        self.app.add_routes([web.post('/execute', self.execute)])
+
+    def blocking_execute(self, code):
+        self.n_executed += 1
+        time.sleep(self.execution_time)
+        return {'type': 'int64', 'result': str(len(code))}
+
+    async def execute(self, request):
+        code = await request.json()
+        loop = asyncio.get_event_loop()
+        execute = ft.partial(loop.run_in_executor, self.executor, self.blocking_execute, code)
+        if self.result_cache is None:
+            result = await execute()
+        else:
+            fingerprints = [(path, 1024, 'Thu Jan 01 00:00:00 UTC 1970') for path in ir_inputs(code)]
+            result = await self.result_cache.get(result_key(code, fingerprints), execute)
+        return web.json_response(result)
+
+
+async def client(session, url, queries, n_requests, latencies):
+    for _ in range(n_requests):
+        start = time.time()
+        async with session.post(f'{url}/execute', json=random.choice(queries)) as resp:
+            await resp.json()
+        latencies.append(time.time() - start)
+
+
+async def run(args, cache_bytes):
+    server = StandInServer(args.execution_time, cache_bytes)
+    runner = web.AppRunner(server.app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    url = f'http://127.0.0.1:{port}'
+
+    queries = [query(i) for i in range(args.distinct_queries)]
+    latencies = []
+    try:
+        async with aiohttp.ClientSession(raise_for_status=True,
+                                         connector=aiohttp.TCPConnector(limit=args.clients)) as session:
+            start = time.time()
+            await asyncio.gather(*[client(session, url, queries, args.requests, latencies)
+                                   for _ in range(args.clients)])
+            elapsed = time.time() - start
+    finally:
+        await runner.cleanup()
+        server.executor.shutdown()
+
+    latencies.sort()
+    return len(latencies), elapsed, latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99)], \
+        server.n_executed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure apiserver /execute throughput with repeated queries.')
+    parser.add_argument('--clients', type=int, default=32)
+    parser.add_argument('--requests', type=int, default=50, help='requests sent by each client')
+    parser.add_argument('--distinct-queries', type=int, default=8)
+    parser.add_argument('--execution-time', type=float, default=0.2,
+                        help='seconds the stand-in server takes to execute a query')
+    parser.add_argument('--cache-bytes', type=int, default=256 * 1024 * 1024)
+    args = parser.parse_args()
+
+    loop = asyncio.get_event_loop()
+    for name, cache_bytes in [('uncached', 0), ('cached', args.cache_bytes)]:
+        n, elapsed, p50, p99, n_executed = loop.run_until_complete(run(args, cache_bytes))
+        print(f'{name}: {n} requests in {elapsed:.2f}s, {n / elapsed:.0f} requests/s, '
+              f'p50 {p50 * 1000:.1f}ms, p99 {p99 * 1000:.1f}ms, {n_executed} executions')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,169 @@
+import asyncio
+import collections
+import hashlib
+import json
+import re
+
+import prometheus_client as pc
+
+EXECUTE_REQUESTS = pc.Counter('apiserver_execute_requests', 'Number of execute requests by result cache outcome',
+                              ['outcome'])
+RESULT_CACHE_BYTES = pc.Gauge('apiserver_result_cache_bytes', 'Size of the cached execute results in bytes')
+RESULT_CACHE_ENTRIES = pc.Gauge('apiserver_result_cache_entries', 'Number of cached execute results')
+
+_string_literal_re = re.compile(r'"(?:[^"\\]|\\.)*"')
+_token_re = re.compile(r'("(?:[^"\\]|\\.)*")|(\s+)|([^"\s]+)')
+_write_node_re = re.compile(r'\(\s*\w*Write\b')
+
+# the fields of the readers' json that name the files they read; native
+# tables, matrix tables and block matrices are fingerprinted by their
+# metadata file, which is rewritten whenever they are
+_reader_inputs = {
+    'TableNativeReader': lambda r: [r['path'] + '/metadata.json.gz'],
+    'MatrixNativeReader': lambda r: [r['path'] + '/metadata.json.gz'],
+    'BlockMatrixNativeReader': lambda r: [r['path'] + '/metadata.json'],
+    'TableFromBlockMatrixNativeReader': lambda r: [r['path'] + '/metadata.json'],
+    'BlockMatrixBinaryReader': lambda r: [r['path']],
+    'TextTableReader': lambda r: r['options']['files'],
+    'MatrixRangeReader': lambda r: [],
+    'MatrixVCFReader': lambda r: r['files'],
+    'MatrixBGENReader': lambda r: (r['files'] + ([r['sampleFile']] if r['sampleFile'] else [])
+                                   + list((r['indexFileMap'] or {}).values())),
+    'MatrixPLINKReader': lambda r: [r['bed'], r['bim'], r['fam']],
+    'MatrixGENReader': lambda r: r['files'] + [r['sampleFile']]
+}
+
+# the configs of the *Apply nodes whose functions only compute a value; the
+# others, like MatrixWriteBlockMatrix and MatrixExportEntriesByCol, write
+# files, so their results are never cached
+_pure_function_configs = {
+    'ForceCountMatrixTable', 'ForceCountTable', 'GetElement', 'LocalLDPrune', 'LogisticRegression',
+    'MatrixFilterPartitions', 'Nirvana', 'NPartitionsMatrixTable', 'NPartitionsTable', 'PCA',
+    'PoissonRegression', 'Skat', 'TableFilterPartitions', 'VEP', 'WindowByLocus'
+}
+
+
+def _unescape(literal):
+    return bytes(literal[1:-1], 'utf-8').decode('unicode_escape')
+
+
+def normalize_ir(code):
+    """Returns `code` with the whitespace outside of string literals
+    normalized, so that IRs differing only in layout are equal."""
+    parts = [' ' if space else string or other for string, space, other in _token_re.findall(code)]
+    return ''.join(
+        p for i, p in enumerate(parts)
+        if p != ' ' or (0 < i < len(parts) - 1 and not parts[i - 1].endswith('(') and not parts[i + 1].startswith(')')))
+
+
+def ir_inputs(code):
+    """Returns the paths of the files read by the IR `code`, or ``None`` if
+    its result cannot be cached, because it writes, applies a function that
+    is not known to be pure, or reads from a reader whose inputs are
+    unknown."""
+    if _write_node_re.search(code):
+        return None
+    paths = []
+    for literal in _string_literal_re.findall(code):
+        try:
+            spec = json.loads(_unescape(literal))
+        except ValueError:
+            continue
+        if not isinstance(spec, dict) or not isinstance(spec.get('name'), str):
+            continue
+        name = spec['name']
+        if name.endswith('Reader'):
+            inputs = _reader_inputs.get(name)
+            if inputs is None:
+                return None
+            try:
+                paths.extend(inputs(spec))
+            except (KeyError, TypeError):
+                return None
+        elif name not in _pure_function_configs:
+            return None
+    return sorted(set(paths))
+
+
+def result_key(code, fingerprints):
+    """Returns the cache key of the result of the IR `code` reading files
+    with `fingerprints`, a list of (path, size, modification time)."""
+    h = hashlib.sha256()
+    h.update(normalize_ir(code).encode('utf-8'))
+    h.update(b'\0')
+    h.update(json.dumps(fingerprints).encode('utf-8'))
+    return h.hexdigest()
+
+
+class ResultCache:
+    """A least recently used cache of results holding at most `max_bytes`,
+    as measured by `sizeof`.
+
+    Concurrent requests for the same key are coalesced into one computation,
+    whose result or error is shared among them.
+    """
+
+    def __init__(self, max_bytes, sizeof=lambda result: len(json.dumps(result))):
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.n_bytes = 0
+        self._results = collections.OrderedDict()
+        self._pending = {}
+        # incremented by clear, so that computations started before are not
+        # cached
+        self._generation = 0
+
+    async def get(self, key, compute):
+        """Returns the result for `key`, awaiting ``compute()`` if it is
+        neither cached nor being computed.  If `key` is ``None``, the result
+        is always computed and not cached."""
+        if key is None:
+            EXECUTE_REQUESTS.labels(outcome='uncacheable').inc()
+            return await compute()
+
+        if key in self._results:
+            self._results.move_to_end(key)
+            EXECUTE_REQUESTS.labels(outcome='hit').inc()
+            return self._results[key][0]
+
+        task = self._pending.get(key)
+        if task is not None:
+            EXECUTE_REQUESTS.labels(outcome='coalesced').inc()
+        else:
+            EXECUTE_REQUESTS.labels(outcome='miss').inc()
+            task = asyncio.ensure_future(self._compute(key, compute, self._generation))
+            self._pending[key] = task
+        # a cancelled request does not cancel the requests sharing the task
+        return await asyncio.shield(task)
+
+    def clear(self):
+        """Forgets all results.  Results being computed are returned to
+        their requests but not cached."""
+        self._results.clear()
+        self._pending = {}
+        self._generation += 1
+        self.n_bytes = 0
+        RESULT_CACHE_BYTES.set(self.n_bytes)
+        RESULT_CACHE_ENTRIES.set(len(self._results))
+
+    async def _compute(self, key, compute, generation):
+        try:
+            result = await compute()
+            if generation == self._generation:
+                self._add(key, result)
+            return result
+        finally:
+            if generation == self._generation:
+                del self._pending[key]
+
+    def _add(self, key, result):
+        size = self.sizeof(result)
+        if size > self.max_bytes:
+            return
+        self._results[key] = (result, size)
+        self.n_bytes += size
+        while self.n_bytes > self.max_bytes:
+            _, (_, evicted_size) = self._results.popitem(last=False)
+            self.n_bytes -= evicted_size
+        RESULT_CACHE_BYTES.set(self.n_bytes)
+        RESULT_CACHE_ENTRIES.set(len(self._results))
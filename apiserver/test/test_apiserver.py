@@ -5,3 +5,10 @@ from hail.backend import ServiceBackend
 def test_count_range():
     assert isinstance(hl.current_backend(), ServiceBackend)
     assert hl.utils.range_table(1000)._force_count() == 1000
+
+
+def test_type_batch_rejects_invalid_irs():
+    backend = hl.current_backend()
+    for irs in [{}, [1], [{'kind': 'value'}]]:
+        resp = backend._session.post(f'{backend.url}/type/batch', json=irs, cookies=backend.cookies)
+        assert resp.status_code == 400, (irs, resp.status_code)
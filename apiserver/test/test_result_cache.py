@@ -0,0 +1,144 @@
+import asyncio
+import json
+
+import pytest
+
+from apiserver.result_cache import ResultCache, ir_inputs, normalize_ir, result_key, EXECUTE_REQUESTS
+
+
+def reader(spec):
+    return '"' + json.dumps(spec).replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+def native_table_count(path):
+    return f'(TableCount (TableRead None False {reader({"name": "TableNativeReader", "path": path})}))'
+
+
+def count(outcome):
+    return EXECUTE_REQUESTS.labels(outcome=outcome)._value.get()
+
+
+def run(coro):
+    return asyncio.get_event_loop().run_until_complete(coro)
+
+
+def test_normalize_ir():
+    code = native_table_count('gs://bucket/a  table.ht')
+    assert normalize_ir(code) == code
+    assert normalize_ir(code.replace(' (', '\n   (').replace(')', ' )\n')) == code
+    assert normalize_ir('(I32 1)') != normalize_ir('(I32 2)')
+
+
+def test_ir_inputs():
+    assert ir_inputs('(TableCount (TableRange 10 2))') == []
+    assert ir_inputs(native_table_count('gs://bucket/t.ht')) == ['gs://bucket/t.ht/metadata.json.gz']
+    vcf = reader({'name': 'MatrixVCFReader', 'files': ['b.vcf', 'a.vcf']})
+    assert ir_inputs(f'(TableCount (MatrixRowsTable (MatrixRead None False False {vcf})))') == ['a.vcf', 'b.vcf']
+
+    unknown = reader({'name': 'MatrixFancyReader', 'path': 'x'})
+    assert ir_inputs(f'(TableCount (MatrixRowsTable (MatrixRead None False False {unknown})))') is None
+    writer = reader({'name': 'TableNativeWriter', 'path': 'out.ht'})
+    assert ir_inputs(f'(TableWrite {writer} (TableRange 10 2))') is None
+
+    count_config = reader({'name': 'ForceCountTable'})
+    assert ir_inputs(f'(TableToValueApply {count_config} (TableRange 10 2))') == []
+    for config in [{'name': 'MatrixWriteBlockMatrix', 'path': 'out.bm', 'overwrite': False,
+                    'entryField': 'x', 'blockSize': 4096},
+                   {'name': 'MatrixExportEntriesByCol', 'parallelism': 2, 'path': 'out',
+                    'bgzip': True, 'headerJsonInFile': True}]:
+        assert ir_inputs(f'(MatrixToValueApply {reader(config)} (MatrixRead None False False {vcf}))') is None
+
+
+def test_result_key():
+    code = native_table_count('t.ht')
+    assert result_key(code, [['t.ht/metadata.json.gz', 10, 'Mon']]) == \
+        result_key(code.replace(' (', '\n  ('), [['t.ht/metadata.json.gz', 10, 'Mon']])
+    assert result_key(code, [['t.ht/metadata.json.gz', 10, 'Mon']]) != \
+        result_key(code, [['t.ht/metadata.json.gz', 10, 'Tue']])
+
+
+def test_coalesces_and_caches():
+    cache = ResultCache(1000)
+    n_computed = 0
+
+    async def compute():
+        nonlocal n_computed
+        n_computed += 1
+        await asyncio.sleep(0.05)
+        return {'result': '1000'}
+
+    async def test():
+        results = await asyncio.gather(*[cache.get('k', compute) for _ in range(10)])
+        assert all(r == {'result': '1000'} for r in results)
+        assert n_computed == 1
+        assert await cache.get('k', compute) == {'result': '1000'}
+        assert n_computed == 1
+        await cache.get(None, compute)
+        await cache.get(None, compute)
+        assert n_computed == 3
+
+    hits, coalesced = count('hit'), count('coalesced')
+    run(test())
+    assert count('hit') == hits + 1
+    assert count('coalesced') == coalesced + 9
+
+
+def test_errors_are_shared_and_not_cached():
+    cache = ResultCache(1000)
+    n_computed = 0
+
+    async def fail():
+        nonlocal n_computed
+        n_computed += 1
+        await asyncio.sleep(0.01)
+        raise ValueError('boom')
+
+    async def test():
+        results = await asyncio.gather(*[cache.get('k', fail) for _ in range(3)], return_exceptions=True)
+        assert all(isinstance(r, ValueError) for r in results)
+        assert n_computed == 1
+        with pytest.raises(ValueError):
+            await cache.get('k', fail)
+        assert n_computed == 2
+
+    run(test())
+
+
+def test_evicts_least_recently_used():
+    cache = ResultCache(10, sizeof=len)
+
+    async def value(v):
+        return v
+
+    async def test():
+        await cache.get('a', lambda: value('aaaa'))
+        await cache.get('b', lambda: value('bbbb'))
+        await cache.get('a', lambda: value('unused'))
+        await cache.get('c', lambda: value('cccc'))
+        await cache.get('d', lambda: value('d' * 11))
+        assert list(cache._results) == ['a', 'c']
+        assert cache.n_bytes == 8
+        assert await cache.get('b', lambda: value('new')) == 'new'
+
+    run(test())
+
+
+def test_clear_forgets_results_being_computed():
+    cache = ResultCache(1000, sizeof=len)
+
+    async def value(v):
+        await asyncio.sleep(0.01)
+        return v
+
+    async def test():
+        await cache.get('a', lambda: value('old'))
+        pending = asyncio.ensure_future(cache.get('b', lambda: value('old')))
+        await asyncio.sleep(0)
+        cache.clear()
+        assert cache.n_bytes == 0
+        assert await cache.get('b', lambda: value('new')) == 'new'
+        assert await pending == 'old'
+        assert await cache.get('a', lambda: value('new')) == 'new'
+        assert await cache.get('b', lambda: value('unused')) == 'new'
+
+    run(test())
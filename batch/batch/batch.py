@@ -1,9 +1,9 @@
 import asyncio
 import concurrent
+import contextlib
 import time
 import logging
 import os
-import threading
 import traceback
 import json
 import uuid
@@ -11,10 +11,10 @@ from shlex import quote as shq
 
 import jinja2
 import aiohttp_jinja2
+import aiohttp
 from aiohttp import web
 import cerberus
 import kubernetes as kube
-import requests
 import uvloop
 import prometheus_client as pc
 from prometheus_async.aio import time as prom_async_time
@@ -24,10 +24,11 @@ from hailtop import gear
 from hailtop.gear.auth import rest_authenticated_users_only, web_authenticated_users_only, \
     new_csrf_token, check_csrf_token
 
-from .blocking_to_async import blocking_to_async
 from .log_store import LogStore
-from .database import BatchDatabase, JobsBuilder, JobsTable
+from .database import BatchDatabase, JobsBuilder, JobsTable, DuplicateChunkError
 from .k8s import K8s
+from .callbacks import CallbackDelivery
+from .pod_index import PodIndex
 from .globals import complete_states
 from .queue import scale_queue_consumers
 
@@ -44,6 +45,8 @@ REQUEST_TIME_GET_BATCHES = REQUEST_TIME.labels(endpoint='/api/v1alpha/batches',
 REQUEST_TIME_POST_CREATE_JOBS = REQUEST_TIME.labels(endpoint='/api/v1alpha/batches/batch_id/jobs/create', verb="POST")
 REQUEST_TIME_POST_CREATE_BATCH = REQUEST_TIME.labels(endpoint='/api/v1alpha/batches/create', verb='POST')
 REQUEST_TIME_POST_GET_BATCH = REQUEST_TIME.labels(endpoint='/api/v1alpha/batches/batch_id', verb='GET')
+REQUEST_TIME_GET_BATCH_JOBS = REQUEST_TIME.labels(endpoint='/api/v1alpha/batches/batch_id/jobs', verb='GET')
+REQUEST_TIME_GET_BATCH_CHANGES = REQUEST_TIME.labels(endpoint='/api/v1alpha/batches/batch_id/changes', verb='GET')
 REQUEST_TIME_PATCH_CANCEL_BATCH = REQUEST_TIME.labels(endpoint='/api/v1alpha/batches/batch_id/cancel', verb="PATCH")
 REQUEST_TIME_PATCH_CLOSE_BATCH = REQUEST_TIME.labels(endpoint='/api/v1alpha/batches/batch_id/close', verb="PATCH")
 REQUEST_TIME_DELETE_BATCH = REQUEST_TIME.labels(endpoint='/api/v1alpha/batches/batch_id', verb="DELETE")
@@ -57,18 +60,33 @@ uvloop.install()
 
 KUBERNETES_TIMEOUT_IN_SECONDS = float(os.environ.get('KUBERNETES_TIMEOUT_IN_SECONDS', 5.0))
 REFRESH_INTERVAL_IN_SECONDS = int(os.environ.get('REFRESH_INTERVAL_IN_SECONDS', 5 * 60))
+POD_RELIST_INTERVAL_IN_SECONDS = int(os.environ.get('POD_RELIST_INTERVAL_IN_SECONDS', 30 * 60))
 HAIL_POD_NAMESPACE = os.environ.get('HAIL_POD_NAMESPACE', 'batch-pods')
 POD_VOLUME_SIZE = os.environ.get('POD_VOLUME_SIZE', '10Mi')
 INSTANCE_ID = os.environ.get('HAIL_INSTANCE_ID', uuid.uuid4().hex)
 
 log.info(f'KUBERNETES_TIMEOUT_IN_SECONDS {KUBERNETES_TIMEOUT_IN_SECONDS}')
 log.info(f'REFRESH_INTERVAL_IN_SECONDS {REFRESH_INTERVAL_IN_SECONDS}')
+log.info(f'POD_RELIST_INTERVAL_IN_SECONDS {POD_RELIST_INTERVAL_IN_SECONDS}')
 log.info(f'HAIL_POD_NAMESPACE {HAIL_POD_NAMESPACE}')
 log.info(f'POD_VOLUME_SIZE {POD_VOLUME_SIZE}')
 log.info(f'INSTANCE_ID = {INSTANCE_ID}')
 
 STORAGE_CLASS_NAME = 'batch'
 
+BATCHES_PAGE_SIZE = 50
+JOBS_PAGE_SIZE = 1000
+MAX_PAGE_SIZE = 10000
+
+LONG_POLL_TIMEOUT_IN_SECONDS = 20
+MAX_LONG_POLL_TIMEOUT_IN_SECONDS = 50
+BATCH_CHANGES_POLL_INTERVAL_IN_SECONDS = 5
+
+POD_LOOKUP_BATCH_SIZE = 1000
+
+CALLBACK_MAX_CONCURRENCY = 64
+CALLBACK_TIMEOUT_IN_SECONDS = 120
+
 if 'BATCH_USE_KUBE_CONFIG' in os.environ:
     kube.config.load_kube_config()
 else:
@@ -229,6 +247,7 @@ class Job:
                 n_updated = await db.jobs.update_record(*self.id, compare_items={'state': self._state}, state='Running')
                 if n_updated == 0:
                     log.warning(f'changing the state for job {self.full_id} failed due to the expected state {self._state} not in db')
+                batch_changed(self.batch_id)
                 return
             traceback.print_tb(err.__traceback__)
             log.info(f'pod creation failed for job {self.full_id} '
@@ -238,6 +257,7 @@ class Job:
         n_updated = await db.jobs.update_record(*self.id, compare_items={'state': self._state}, state='Running')
         if n_updated == 0:
             log.warning(f'changing the state for job {self.full_id} failed due to the expected state {self._state} not in db')
+        batch_changed(self.batch_id)
 
     async def _delete_pvc(self):
         if self._pvc_name is None:
@@ -327,6 +347,8 @@ class Job:
             log.info(f'could not update job {self.id} due to db not matching expected state and task_idx')
             return False
 
+        batch_changed(self.batch_id)
+
         self.exit_codes[self._task_idx] = exit_code
         self.pod_statuses[self._task_idx] = pod_status
         self.log_uris[self._task_idx] = uri
@@ -384,6 +406,15 @@ class Job:
         user = pod.metadata.labels['user']
         return await Job.from_db(batch_id, job_id, user)
 
+    @staticmethod
+    async def from_k8s_labels_multiple(pods):
+        ids = [(int(pod.metadata.labels['batch_id']), int(pod.metadata.labels['job_id']), pod.metadata.labels['user'])
+               for pod in pods]
+        records = await db.jobs.get_undeleted_records_by_ids(ids)
+        jobs = {(record['batch_id'], record['job_id'], record['user']): Job.from_record(record)
+                for record in records}
+        return [jobs.get(id) for id in ids]
+
     @staticmethod
     async def from_db(batch_id, job_id, user):
         jobs = await Job.from_db_multiple(batch_id, job_id, user)
@@ -427,7 +458,8 @@ class Job:
             task_idx=task_idx,
             always_run=always_run,
             duration=duration,
-            token=token)
+            token=token,
+            n_pending_parents=len(parent_ids))
 
         for parent in parent_ids:
             jobs_builder.create_job_parent(
@@ -476,12 +508,6 @@ class Job:
         task_name = self._current_task.name if self._current_task else None
         return (self.batch_id, self.job_id, task_name)
 
-    async def refresh_parents_and_maybe_create(self):
-        for record in await db.jobs.get_parents(*self.id):
-            parent_job = Job.from_record(record)
-            assert parent_job.batch_id == self.batch_id
-            await self.parent_new_state(parent_job._state, *parent_job.id)
-
     async def set_state(self, new_state):
         if self._state != new_state:
             n_updated = await db.jobs.update_record(*self.id, compare_items={'state': self._state}, state=new_state)
@@ -495,34 +521,14 @@ class Job:
                 self._state,
                 new_state))
             self._state = new_state
+            batch_changed(self.batch_id)
             await self.notify_children(new_state)
 
     async def notify_children(self, new_state):
         if new_state not in complete_states:
             return
 
-        children = [Job.from_record(record) for record in await db.jobs.get_children(*self.id)]
-        for child in children:
-            await child.parent_new_state(new_state, *self.id)
-
-    async def parent_new_state(self, new_state, parent_batch_id, parent_job_id):
-        assert parent_batch_id == self.batch_id
-        if new_state in complete_states:
-            await self.create_if_ready()
-
-    async def create_if_ready(self):
-        incomplete_parent_ids = await db.jobs.get_incomplete_parents(*self.id)
-        if self._state == 'Pending' and not incomplete_parent_ids:
-            parents = [Job.from_record(record) for record in await db.jobs.get_parents(*self.id)]
-            if (self.always_run or
-                    (not self._cancelled and all(p.is_successful() for p in parents))):
-                log.info(f'all parents complete for {self.full_id},'
-                         f' creating pod')
-                await self.set_state('Ready')
-                await self._create_pod()
-            else:
-                log.info(f'parents deleted, cancelled, or failed: cancelling {self.full_id}')
-                await self.set_state('Cancelled')
+        await release_children(self.batch_id, [self.job_id])
 
     async def cancel(self):
         self._cancelled = True
@@ -615,15 +621,7 @@ class Job:
         log.info('job {} complete with state {}, exit_codes {}'.format(self.id, self._state, self.exit_codes))
 
         if self.callback:
-            def handler(id, callback, json):
-                try:
-                    requests.post(callback, json=json, timeout=120)
-                except requests.exceptions.RequestException as exc:
-                    log.warning(
-                        f'callback for job {id} failed due to an error, I will not retry. '
-                        f'Error: {exc}')
-
-            threading.Thread(target=handler, args=(self.id, self.callback, self.to_dict())).start()
+            app['callbacks'].post(self.callback, self.to_dict(), f'job {self.id}')
 
         if self.batch_id:
             batch = await Batch.from_db(self.batch_id, self.user)
@@ -645,6 +643,55 @@ class Job:
         return result
 
 
+class BatchChanges:
+    """Wakes up requests waiting for the jobs of a batch to change."""
+
+    def __init__(self):
+        # batch_id => [event, number of waiters]
+        self._events = {}
+
+    @contextlib.contextmanager
+    def watch(self, batch_id):
+        """Yields the event set at the next change to the batch.  Enter
+        before reading the batch, so no change is missed.  The event is
+        forgotten when its last waiter exits."""
+        entry = self._events.get(batch_id)
+        if entry is None:
+            entry = [asyncio.Event(), 0]
+            self._events[batch_id] = entry
+        entry[1] += 1
+        try:
+            yield entry[0]
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0 and self._events.get(batch_id) is entry:
+                del self._events[batch_id]
+
+    def notify(self, batch_id):
+        entry = self._events.pop(batch_id, None)
+        if entry is not None:
+            entry[0].set()
+
+
+def batch_changed(batch_id):
+    app['batch_changes'].notify(batch_id)
+
+
+def start_jobs(jobs):
+    queue = app['start_job_queue']
+    for job in jobs:
+        queue.put_nowait(job)
+
+
+async def release_children(batch_id, parent_ids):
+    records = await db.jobs.release_children(batch_id, parent_ids)
+    batch_changed(batch_id)
+    if records:
+        log.info(f'parents {parent_ids} of batch {batch_id} released '
+                 f'{len(records)} ready jobs')
+    start_jobs([Job.from_record(record) for record in records])
+
+
 def create_job(jobs_builder, batch_id, userdata, parameters):  # pylint: disable=R0912
     pod_spec = v1.api_client._ApiClient__deserialize(
         parameters['spec'], kube.client.V1PodSpec)
@@ -778,6 +825,7 @@ class Batch:
             return Batch(id=record['id'],
                          attributes=attributes,
                          callback=record['callback'],
+                         coalesce_callbacks=record['coalesce_callbacks'],
                          userdata=userdata,
                          user=record['user'],
                          state=state,
@@ -801,29 +849,33 @@ class Batch:
         return batches
 
     @staticmethod
-    async def create_batch(attributes, callback, userdata):
+    async def create_batch(attributes, callback, coalesce_callbacks, userdata):
         user = userdata['username']
 
         id = await db.batch.new_record(
             attributes=json.dumps(attributes),
             callback=callback,
+            coalesce_callbacks=coalesce_callbacks,
             userdata=json.dumps(userdata),
             user=user,
             deleted=False,
             cancelled=False,
             closed=False)
+        if attributes:
+            await db.batch_attributes.new_records(id, attributes)
 
         batch = Batch(id=id, attributes=attributes, callback=callback,
-                      userdata=userdata, user=user, state='running',
+                      coalesce_callbacks=coalesce_callbacks, userdata=userdata, user=user, state='running',
                       complete=False, deleted=False, cancelled=False,
                       closed=False)
         return batch
 
-    def __init__(self, id, attributes, callback, userdata, user,
+    def __init__(self, id, attributes, callback, coalesce_callbacks, userdata, user,
                  state, complete, deleted, cancelled, closed):
         self.id = id
         self.attributes = attributes
         self.callback = callback
+        self.coalesce_callbacks = coalesce_callbacks
         self.userdata = userdata
         self.user = user
         self.state = state
@@ -865,18 +917,10 @@ class Batch:
 
     async def mark_job_complete(self, job):
         if self.callback:
-            def handler(id, job_id, callback, json):
-                try:
-                    requests.post(callback, json=json, timeout=120)
-                except requests.exceptions.RequestException as exc:
-                    log.warning(
-                        f'callback for batch {id}, job {job_id} failed due to an error, I will not retry. '
-                        f'Error: {exc}')
-
-            threading.Thread(
-                target=handler,
-                args=(self.id, job.id, self.callback, job.to_dict())
-            ).start()
+            if self.coalesce_callbacks:
+                app['callbacks'].post_job(self.callback, self.id, job.to_dict())
+            else:
+                app['callbacks'].post(self.callback, job.to_dict(), f'batch {self.id}, job {job.id}')
 
     def is_complete(self):
         return self.complete
@@ -884,7 +928,7 @@ class Batch:
     def is_successful(self):
         return self.state == 'success'
 
-    async def to_dict(self, include_jobs=False):
+    async def to_dict(self):
         result = {
             'id': self.id,
             'state': self.state,
@@ -893,35 +937,63 @@ class Batch:
         }
         if self.attributes:
             result['attributes'] = self.attributes
-        if include_jobs:
-            jobs = await self.get_jobs()
-            result['jobs'] = sorted([j.to_dict() for j in jobs], key=lambda j: j['job_id'])
         return result
 
+    async def get_jobs_page(self, last_job_id=None, limit=JOBS_PAGE_SIZE):
+        records = await db.jobs.get_records_page(self.id, last_job_id, limit)
+        return [Job.from_record(record) for record in records]
+
+
+def _get_int_param(params, name, minimum=0):
+    value = params.get(name)
+    if value is None:
+        return None
+    try:
+        value = int(value)
+    except ValueError:
+        abort(400, f'invalid {name} value, expected an integer, got {value}')
+    if value < minimum:
+        abort(400, f'invalid {name} value, expected an integer >= {minimum}, got {value}')
+    return value
+
+
+def _get_limit_param(params, default):
+    limit = _get_int_param(params, 'limit', minimum=1)
+    if limit is None:
+        return default
+    return min(limit, MAX_PAGE_SIZE)
 
-async def _get_batches_list(params, user):
-    batches = [Batch.from_record(record)
-               for record in await db.batch.get_records_where({'user': user, 'deleted': False})]
 
+async def _get_batches_list(params, user):
+    complete = None
+    success = None
+    attributes = {}
     for name, value in params.items():
         if name == 'complete':
             if value not in ('0', '1'):
                 abort(400, f'invalid complete value, expected 0 or 1, got {value}')
-            c = value == '1'
-            batches = [batch for batch in batches if batch.is_complete() == c]
+            complete = value == '1'
         elif name == 'success':
             if value not in ('0', '1'):
                 abort(400, f'invalid success value, expected 0 or 1, got {value}')
-            s = value == '1'
-            batches = [batch for batch in batches if batch.is_successful() == s]
-        else:
-            if not name.startswith('a:'):
-                abort(400, f'unknown query parameter {name}')
-            k = name[2:]
-            batches = [batch for batch in batches
-                       if batch.attributes and k in batch.attributes and batch.attributes[k] == value]
+            success = value == '1'
+        elif name.startswith('a:'):
+            attributes[name[2:]] = value
+        elif name not in ('last_batch_id', 'limit'):
+            abort(400, f'unknown query parameter {name}')
+
+    last_batch_id = _get_int_param(params, 'last_batch_id')
+    limit = _get_limit_param(params, BATCHES_PAGE_SIZE)
 
-    return [await batch.to_dict(include_jobs=False) for batch in batches]
+    records = await db.batch.get_undeleted_records_page(
+        user, complete=complete, success=success, attributes=attributes,
+        last_id=last_batch_id, limit=limit)
+    batches = [Batch.from_record(record) for record in records]
+
+    result = {'batches': [await batch.to_dict() for batch in batches]}
+    if len(batches) == limit:
+        result['last_batch_id'] = batches[-1].id
+    return result
 
 
 @prom_async_time(REQUEST_TIME_GET_BATCHES)
@@ -933,6 +1005,41 @@ async def get_batches_list(request, userdata):
     return jsonify(await _get_batches_list(params, user))
 
 
+async def _iter_lines(content):
+    # StreamReader's own line iteration fails on lines longer than its
+    # buffer limit, and a job spec has no length limit
+    pending = []
+    async for data in content.iter_any():
+        *lines, rest = data.split(b'\n')
+        for line in lines:
+            pending.append(line)
+            yield b''.join(pending)
+            pending = []
+        if rest:
+            pending.append(rest)
+    if pending:
+        yield b''.join(pending)
+
+
+async def _read_job_specs(request):
+    # newline-delimited job specs are parsed as they arrive; a JSON document
+    # with a list of jobs is also accepted
+    try:
+        if request.content_type == 'application/x-ndjson':
+            async for line in _iter_lines(request.content):
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+        else:
+            jobs_parameters = await request.json()
+            if not isinstance(jobs_parameters, dict) or not isinstance(jobs_parameters.get('jobs'), list):
+                abort(400, 'invalid request: expected a document with a list of jobs')
+            for job_params in jobs_parameters['jobs']:
+                yield job_params
+    except json.JSONDecodeError as err:
+        abort(400, f'invalid request: {err}')
+
+
 @prom_async_time(REQUEST_TIME_POST_CREATE_JOBS)
 @routes.post('/api/v1alpha/batches/{batch_id}/jobs/create')
 @rest_authenticated_users_only
@@ -945,28 +1052,31 @@ async def create_jobs(request, userdata):
     if batch.closed:
         abort(400, f'batch {batch_id} is already closed')
 
-    jobs_parameters = await request.json()
-
-    validator = cerberus.Validator(schemas.job_array_schema)
-    if not validator.validate(jobs_parameters):
-        abort(400, 'invalid request: {}'.format(validator.errors))
+    chunk_id = _get_int_param(request.query, 'chunk_id')
+    validator = cerberus.Validator({'job': schemas.job_schema})
 
     jobs_builder = JobsBuilder(db)
     try:
         jobs = []
-        for job_params in jobs_parameters['jobs']:
+        async for job_params in _read_job_specs(request):
+            if not validator.validate({'job': job_params}):
+                abort(400, 'invalid request: {}'.format(validator.errors))
             job = create_job(jobs_builder, batch.id, userdata, job_params)
             jobs.append(job)
 
-        success = await jobs_builder.commit()
-        if not success:
+        try:
+            released = await jobs_builder.commit(chunk_id=chunk_id)
+        except DuplicateChunkError:
+            log.info(f'ignoring chunk {chunk_id} of batch {batch_id}, which was already inserted')
+            return jsonify({})
+        if released is None:
             abort(400, f'insertion of jobs in db failed')
 
-        log.info(f"created {len(jobs_parameters['jobs'])} jobs for batch {batch_id}")
+        log.info(f"created {len(jobs)} jobs for batch {batch_id}")
+        batch_changed(batch_id)
 
-        for job in jobs:
-            if job._state == 'Ready':
-                await app['start_job_queue'].put(job)
+        start_jobs([job for job in jobs if job._state == 'Ready'] +
+                   [Job.from_record(record) for record in released])
     finally:
         await jobs_builder.close()
 
@@ -985,16 +1095,85 @@ async def create_batch(request, userdata):
     batch = await Batch.create_batch(
         attributes=parameters.get('attributes'),
         callback=parameters.get('callback'),
+        coalesce_callbacks=parameters.get('coalesce_callbacks', False),
         userdata=userdata)
 
-    return jsonify(await batch.to_dict(include_jobs=False))
+    return jsonify(await batch.to_dict())
 
 
 async def _get_batch(batch_id, user):
     batch = await Batch.from_db(batch_id, user)
     if not batch:
         abort(404)
-    return await batch.to_dict(include_jobs=True)
+    return await batch.to_dict()
+
+
+async def _get_batch_jobs(batch_id, user, params):
+    batch = await Batch.from_db(batch_id, user)
+    if not batch:
+        abort(404)
+    last_job_id = _get_int_param(params, 'last_job_id')
+    limit = _get_limit_param(params, JOBS_PAGE_SIZE)
+
+    jobs = await batch.get_jobs_page(last_job_id, limit)
+
+    result = {'jobs': [j.to_dict() for j in jobs]}
+    if len(jobs) == limit:
+        result['last_job_id'] = jobs[-1].job_id
+    return result
+
+
+async def _get_batch_changes(batch_id, user, params):
+    version = _get_int_param(params, 'version')
+    if version is None:
+        version = 0
+    # with job_id, only changes to that job are waited for and returned
+    job_id = _get_int_param(params, 'job_id')
+    timeout = _get_int_param(params, 'timeout')
+    if timeout is None:
+        timeout = LONG_POLL_TIMEOUT_IN_SECONDS
+    deadline = time.time() + min(timeout, MAX_LONG_POLL_TIMEOUT_IN_SECONDS)
+
+    while True:
+        with app['batch_changes'].watch(batch_id) as event:
+            records = await db.batch.get_undeleted_records(batch_id, user)
+            if not records:
+                abort(404)
+            record = records[0]
+            batch = Batch.from_record(record)
+            if job_id is None:
+                current_version = record['version']
+                complete = batch.complete
+            else:
+                job_records = await db.jobs.get_undeleted_records(batch_id, job_id, user)
+                if not job_records:
+                    abort(404)
+                job_record = job_records[0]
+                current_version = job_record['version']
+                complete = job_record['state'] in complete_states
+            remaining = deadline - time.time()
+            if current_version > version or complete or remaining <= 0:
+                break
+            # changes made by other means are picked up by polling
+            try:
+                await asyncio.wait_for(event.wait(), min(remaining, BATCH_CHANGES_POLL_INTERVAL_IN_SECONDS))
+            except asyncio.TimeoutError:
+                pass
+
+    job_records = []
+    if job_id is not None:
+        if current_version > version or complete:
+            job_records = [job_record]
+    elif current_version > version:
+        job_records = await db.jobs.get_records_changed(batch_id, version, current_version, JOBS_PAGE_SIZE)
+        if len(job_records) == JOBS_PAGE_SIZE:
+            current_version = job_records[-1]['version']
+
+    return {
+        'version': current_version,
+        'complete': batch.complete,
+        'jobs': [Job.from_record(record).to_dict() for record in job_records]
+    }
 
 
 async def _cancel_batch(batch_id, user):
@@ -1011,6 +1190,22 @@ async def get_batch(request, userdata):
     user = userdata['username']
     return jsonify(await _get_batch(batch_id, user))
 
+@prom_async_time(REQUEST_TIME_GET_BATCH_JOBS)
+@routes.get('/api/v1alpha/batches/{batch_id}/jobs')
+@rest_authenticated_users_only
+async def get_batch_jobs(request, userdata):
+    batch_id = int(request.match_info['batch_id'])
+    user = userdata['username']
+    return jsonify(await _get_batch_jobs(batch_id, user, request.query))
+
+@prom_async_time(REQUEST_TIME_GET_BATCH_CHANGES)
+@routes.get('/api/v1alpha/batches/{batch_id}/changes')
+@rest_authenticated_users_only
+async def get_batch_changes(request, userdata):
+    batch_id = int(request.match_info['batch_id'])
+    user = userdata['username']
+    return jsonify(await _get_batch_changes(batch_id, user, request.query))
+
 @prom_async_time(REQUEST_TIME_PATCH_CANCEL_BATCH)
 @routes.patch('/api/v1alpha/batches/{batch_id}/cancel')
 @rest_authenticated_users_only
@@ -1053,6 +1248,7 @@ async def ui_batch(request, userdata):
     batch_id = int(request.match_info['batch_id'])
     user = userdata['username']
     batch = await _get_batch(batch_id, user)
+    batch.update(await _get_batch_jobs(batch_id, user, request.query))
     return {'batch': batch}
 
 
@@ -1077,7 +1273,9 @@ async def ui_batches(request, userdata):
     user = userdata['username']
     batches = await _get_batches_list(params, user)
     token = new_csrf_token()
-    context = {'batch_list': batches, 'token': token}
+    context = {'batch_list': batches['batches'], 'token': token}
+    if 'last_batch_id' in batches:
+        context['next_page'] = request.rel_url.update_query(last_batch_id=batches['last_batch_id'])
 
     response = aiohttp_jinja2.render_template('batches.html',
                                               request,
@@ -1138,64 +1336,44 @@ async def update_job_with_pod(job, pod):
                 await job.mark_complete(pod, failed=True, failure_reason=container_status.state.waiting.reason)
 
 
-class DeblockedIterator:
-    def __init__(self, it):
-        self.it = it
-
-    def __aiter__(self):
-        return self
-
-    def __anext__(self):
-        return blocking_to_async(app['blocking_pool'], self.it.__next__)
-
-
 async def pod_changed(pod):
     job = await Job.from_k8s_labels(pod)
     if job and not job.is_complete():
         await update_job_with_pod(job, pod)
 
 
+async def pods_changed(pods):
+    for i in range(0, len(pods), POD_LOOKUP_BATCH_SIZE):
+        chunk = pods[i:i + POD_LOOKUP_BATCH_SIZE]
+        jobs = await Job.from_k8s_labels_multiple(chunk)
+        for job, pod in zip(jobs, chunk):
+            if job and not job.is_complete():
+                await update_job_with_pod(job, pod)
+
+
 async def kube_event_loop():
-    while True:
-        try:
-            stream = kube.watch.Watch().stream(
-                v1.list_namespaced_pod,
-                HAIL_POD_NAMESPACE,
-                label_selector=f'app=batch-job,hail.is/batch-instance={INSTANCE_ID}')
-            async for event in DeblockedIterator(stream):
-                await pod_changed(event['object'])
-        except Exception as exc:  # pylint: disable=W0703
-            log.exception(f'k8s event stream failed due to: {exc}')
-        await asyncio.sleep(5)
+    await app['pod_index'].run(pod_changed, pods_changed)
 
 
 async def refresh_k8s_pods():
-    # if we do this after we get pods, we will pick up jobs created
-    # while listing pods and unnecessarily restart them
-    pod_jobs = [Job.from_record(record) for record in await db.jobs.get_records_where({'state': ['Ready', 'Running']})]
-
-    pods, err = await app['k8s'].list_pods(
-        label_selector=f'app=batch-job,hail.is/batch-instance={INSTANCE_ID}')
-    if err is not None:
-        traceback.print_tb(err.__traceback__)
-        log.info(f'could not refresh pods due to {err}, will try again later')
+    pod_index = app['pod_index']
+    if not pod_index.synced:
+        log.info('pods have not been listed yet, will refresh pods later')
         return
 
-    log.info(f'k8s had {len(pods.items)} pods')
-
-    seen_pods = set()
-    for pod in pods.items:
-        pod_name = pod.metadata.name
-        seen_pods.add(pod_name)
+    pod_jobs = [Job.from_record(record) for record in await db.jobs.get_records_where({'state': ['Ready', 'Running']})]
 
-        job = await Job.from_k8s_labels(pod)
-        if job and not job.is_complete():
-            await update_job_with_pod(job, pod)
+    # the index follows pod events asynchronously and may not have seen
+    # the pods of jobs created just before the query above, so jobs are
+    # only restarted once their pod has been missing for two refreshes
+    unseen = {job.id: job for job in pod_jobs if job._pod_name not in pod_index.pods}
+    previously_unseen = app['unseen_pod_jobs']
+    app['unseen_pod_jobs'] = set(unseen)
 
     log.info('restarting ready and running jobs with pods not seen in k8s')
 
-    for job in pod_jobs:
-        if job._pod_name not in seen_pods:
+    for id, job in unseen.items():
+        if id in previously_unseen:
             log.info(f'restarting job {job.full_id}')
             await update_job_with_pod(job, None)
 
@@ -1231,8 +1409,19 @@ async def start_job(queue):
         queue.task_done()
 
 
+async def refresh_released_jobs():
+    # jobs that completed without releasing their children, for example
+    # because the server stopped in between
+    parents = {}
+    for record in await db.jobs.get_unreleased_records():
+        parents.setdefault(record['batch_id'], []).append(record['job_id'])
+    for batch_id, parent_ids in parents.items():
+        await release_children(batch_id, parent_ids)
+
+
 async def refresh_k8s_state():  # pylint: disable=W0613
     log.info('started k8s state refresh')
+    await refresh_released_jobs()
     await refresh_k8s_pods()
     await refresh_k8s_pvc()
     log.info('k8s state refresh complete')
@@ -1274,6 +1463,15 @@ async def on_startup(app):
     app['k8s'] = K8s(pool, KUBERNETES_TIMEOUT_IN_SECONDS, HAIL_POD_NAMESPACE, v1, log)
     app['log_store'] = LogStore(pool, INSTANCE_ID, log)
     app['start_job_queue'] = asyncio.Queue()
+    app['batch_changes'] = BatchChanges()
+    app['pod_index'] = PodIndex(app['k8s'], f'app=batch-job,hail.is/batch-instance={INSTANCE_ID}', log,
+                                relist_interval=POD_RELIST_INTERVAL_IN_SECONDS)
+    app['unseen_pod_jobs'] = set()
+    app['callbacks'] = CallbackDelivery(
+        aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=CALLBACK_MAX_CONCURRENCY),
+                              timeout=aiohttp.ClientTimeout(total=CALLBACK_TIMEOUT_IN_SECONDS)),
+        log,
+        max_concurrency=CALLBACK_MAX_CONCURRENCY)
 
     asyncio.ensure_future(polling_event_loop())
     asyncio.ensure_future(kube_event_loop())
@@ -1287,6 +1485,7 @@ app.on_startup.append(on_startup)
 async def on_cleanup(app):
     blocking_pool = app['blocking_pool']
     blocking_pool.shutdown()
+    await app['callbacks'].session.close()
 
 
 app.on_cleanup.append(on_cleanup)
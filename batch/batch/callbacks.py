@@ -0,0 +1,92 @@
+import asyncio
+import random
+import time
+
+import aiohttp
+import prometheus_client as pc
+
+CALLBACKS = pc.Counter('batch_callbacks', 'Number of callbacks by delivery outcome', ['outcome'])
+CALLBACK_RETRIES = pc.Counter('batch_callback_retries', 'Number of failed callback attempts that were retried')
+CALLBACKS_PENDING = pc.Gauge('batch_callbacks_pending', 'Number of callbacks waiting to be delivered')
+CALLBACK_LATENCY = pc.Summary('batch_callback_latency_seconds',
+                              'Time from queueing a callback to its delivery in seconds')
+
+
+class CallbackDelivery:
+    """Delivers callbacks in the background with a shared session.
+
+    At most `max_concurrency` callbacks are posted at once.  Connection
+    errors, timeouts and 5xx responses are retried with exponential backoff
+    up to `max_attempts` times; other responses are not retried.
+    """
+
+    def __init__(self, session, log, max_concurrency=64, max_attempts=5,
+                 coalesce_delay=1.0, max_coalesced=1000, max_backoff=60.0):
+        self.session = session
+        self.log = log
+        self.max_attempts = max_attempts
+        self.coalesce_delay = coalesce_delay
+        self.max_coalesced = max_coalesced
+        self.max_backoff = max_backoff
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._coalesced = {}
+
+    def post(self, url, body, description):
+        """Queues `body` to be posted as json to `url`."""
+        CALLBACKS_PENDING.inc()
+        asyncio.ensure_future(self._deliver(url, body, description, time.time()))
+
+    def post_job(self, url, batch_id, job):
+        """Queues the job dict `job` to be posted to `url` together with the
+        other jobs of batch `batch_id` completed within `coalesce_delay`
+        seconds, as ``{'batch_id': batch_id, 'jobs': [...]}``."""
+        key = (url, batch_id)
+        jobs = self._coalesced.get(key)
+        if jobs is None:
+            jobs = self._coalesced[key] = []
+            asyncio.get_event_loop().call_later(self.coalesce_delay, self._flush, key)
+        jobs.append(job)
+        if len(jobs) >= self.max_coalesced:
+            self._flush(key)
+
+    def _flush(self, key):
+        jobs = self._coalesced.pop(key, None)
+        if jobs:
+            url, batch_id = key
+            self.post(url, {'batch_id': batch_id, 'jobs': jobs}, f'batch {batch_id}, {len(jobs)} jobs')
+
+    async def _deliver(self, url, body, description, queued):
+        try:
+            delay = min(1.0, self.max_backoff)
+            for attempt in range(1, self.max_attempts + 1):
+                try:
+                    async with self._semaphore:
+                        async with self.session.post(url, json=body) as resp:
+                            if resp.status < 500:
+                                if resp.status >= 400:
+                                    self.log.warning(f'callback for {description} was rejected with status '
+                                                     f'{resp.status}, I will not retry')
+                                    CALLBACKS.labels(outcome='rejected').inc()
+                                else:
+                                    CALLBACKS.labels(outcome='delivered').inc()
+                                    CALLBACK_LATENCY.observe(time.time() - queued)
+                                return
+                            error = f'status {resp.status}'
+                except (aiohttp.ClientError, asyncio.TimeoutError) as exc:
+                    error = exc
+
+                if attempt == self.max_attempts:
+                    break
+                CALLBACK_RETRIES.inc()
+                await asyncio.sleep(delay * random.uniform(0.5, 1.0))
+                delay = min(2 * delay, self.max_backoff)
+
+            self.log.warning(f'callback for {description} failed after {self.max_attempts} attempts '
+                             f'due to {error}, I will not retry')
+            CALLBACKS.labels(outcome='failed').inc()
+        except Exception as exc:  # pylint: disable=W0703
+            self.log.exception(f'callback for {description} failed due to an error, I will not retry. '
+                               f'Error: {exc}')
+            CALLBACKS.labels(outcome='failed').inc()
+        finally:
+            CALLBACKS_PENDING.dec()
@@ -0,0 +1,107 @@
+"""Measures how long job completions take to make their children ready.
+
+A batch with a wide DAG is inserted directly into the database: every one of
+`--parents` parents is a parent of every one of `--children` children.  The
+parents are then marked successful one at a time, and the readiness of the
+children is updated after each completion, either with one query per child
+and parent as the service used to do, or with
+:meth:`.JobsTable.release_children`.  Run it against a scratch MySQL
+database created with ``create-batch-tables.sql``, for example a local
+``mysql:5.7`` container:
+
+    python3 -m batch.dag_benchmark --sql-config sql-config.json --parents 100 --children 100
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from .database import BatchDatabase, JobsBuilder
+
+
+async def create_dag(db, n_parents, n_children):
+    batch_id = await db.batch.new_record(
+        attributes=json.dumps(None),
+        callback=None,
+        userdata=json.dumps({}),
+        user='dag-benchmark',
+        deleted=False,
+        cancelled=False,
+        closed=True)
+
+    builder = JobsBuilder(db)
+
+    def create_job(job_id, state, n_pending_parents):
+        builder.create_job(
+            batch_id=batch_id, job_id=job_id, state=state, pvc_size=None,
+            callback=None, attributes=json.dumps(None), tasks=json.dumps([]),
+            task_idx=0, always_run=False, duration=0, token='dag',
+            n_pending_parents=n_pending_parents)
+
+    parent_ids = list(range(1, n_parents + 1))
+    child_ids = list(range(n_parents + 1, n_parents + n_children + 1))
+    for job_id in parent_ids:
+        create_job(job_id, 'Running', 0)
+    for job_id in child_ids:
+        create_job(job_id, 'Pending', n_parents)
+        for parent_id in parent_ids:
+            builder.create_job_parent(batch_id=batch_id, job_id=job_id, parent_id=parent_id)
+    assert await builder.commit() == []
+    await builder.close()
+
+    return batch_id, parent_ids, child_ids
+
+
+async def release_per_child(db, batch_id, parent_id):
+    ready = []
+    for child in await db.jobs.get_children(batch_id, parent_id):
+        if child['state'] != 'Pending':
+            continue
+        if await db.jobs.get_incomplete_parents(batch_id, child['job_id']):
+            continue
+        parents = await db.jobs.get_parents(batch_id, child['job_id'])
+        if all(p['state'] == 'Success' for p in parents):
+            n_updated = await db.jobs.update_record(batch_id, child['job_id'],
+                                                    compare_items={'state': 'Pending'},
+                                                    state='Ready')
+            if n_updated:
+                ready.append(child)
+    return ready
+
+
+async def release_bulk(db, batch_id, parent_id):
+    return await db.jobs.release_children(batch_id, [parent_id])
+
+
+async def run(db, release, n_parents, n_children):
+    batch_id, parent_ids, child_ids = await create_dag(db, n_parents, n_children)
+    try:
+        start = time.time()
+        n_ready = 0
+        for parent_id in parent_ids:
+            await db.jobs.update_record(batch_id, parent_id, compare_items={'state': 'Running'}, state='Success')
+            n_ready += len(await release(db, batch_id, parent_id))
+        elapsed = time.time() - start
+        assert n_ready == len(child_ids), (n_ready, len(child_ids))
+        return elapsed
+    finally:
+        await db.batch.delete_record(batch_id)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure job readiness propagation in a wide DAG.')
+    parser.add_argument('--sql-config', required=True, help='path of the database config json')
+    parser.add_argument('--parents', type=int, default=100)
+    parser.add_argument('--children', type=int, default=100)
+    args = parser.parse_args()
+
+    loop = asyncio.get_event_loop()
+    db = BatchDatabase.create_synchronous(args.sql_config)
+    n_edges = args.parents * args.children
+    for name, release in [('per-child queries', release_per_child), ('bulk release', release_bulk)]:
+        elapsed = loop.run_until_complete(run(db, release, args.parents, args.children))
+        print(f'{name}: {args.parents} completions, {n_edges} edges in {elapsed:.2f}s')
+
+
+if __name__ == '__main__':
+    main()
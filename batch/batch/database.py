@@ -1,14 +1,24 @@
 import json
 import logging
 import asyncio
+import time
 import aiomysql
 import pymysql
+import prometheus_client as pc
 from asyncinit import asyncinit
 
+from .globals import complete_states
+
 log = logging.getLogger('batch.database')
 
 MAX_RETRIES = 2
 
+WRITE_FLUSH_LATENCY = pc.Summary('batch_db_write_flush_latency_seconds',
+                                 'Latency of coalesced database write flushes in seconds')
+WRITE_FLUSH_SIZE = pc.Histogram('batch_db_write_flush_size',
+                                'Number of updates in each coalesced database write flush',
+                                buckets=[1, 2, 5, 10, 20, 50, 100, 200, 500, 1000])
+
 
 def run_synchronous(coro):
     loop = asyncio.get_event_loop()
@@ -87,10 +97,153 @@ async def execute_with_retry(cursor, sql, items):
     await _retry(cursor, lambda c: c.execute(sql, items))
 
 
+async def _transaction(conn, f):
+    await conn.begin()
+    try:
+        async with conn.cursor() as cursor:
+            result = await f(cursor)
+        await conn.commit()
+        return result
+    except Exception:  # pylint: disable=W0703
+        await conn.rollback()
+        raise
+
+
+async def transaction_with_retry(conn, f):
+    return await _retry(conn, lambda c: _transaction(c, f))
+
+
 async def executemany_with_retry(cursor, sql, items):
     await _retry(cursor, lambda c: c.executemany(sql, items))
 
 
+def _matches(value, expected):
+    if expected is None:
+        return value is None
+    return value == expected
+
+
+class UpdateCoalescer:
+    """Collects record updates for up to `delay` seconds and applies them in
+    one transaction.
+
+    Each update is a compare-and-set: it applies only if the record's
+    current values, including those set by earlier updates in the same
+    flush, equal its compare items.  The records are locked and compared in
+    one query, and the applied updates are written with one multi-row
+    statement per set of updated fields.
+
+    If given, `lock(cursor, keys)` is called first in each transaction to
+    lock, in a fixed order, the rows that triggers on the table update, so
+    that concurrent flushes do not deadlock on them.  If a flush fails, its
+    halves are applied on their own, so that an error is only raised to the
+    updates that fail by themselves.
+    """
+
+    def __init__(self, db, table_name, key_fields, lock=None, delay=0.005, max_size=1000):
+        self._db = db
+        self._table_name = table_name
+        self._key_fields = key_fields
+        self._lock = lock
+        self._delay = delay
+        self._max_size = max_size
+        self._pending = []
+        self._timer = None
+
+    async def update(self, key, compare_items, set_items):
+        """Returns 1 if the update was applied and 0 otherwise."""
+        future = asyncio.get_event_loop().create_future()
+        self._pending.append((key, compare_items, set_items, future))
+        if len(self._pending) >= self._max_size:
+            self._start_flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_event_loop().call_later(self._delay, self._start_flush)
+        return await future
+
+    def _start_flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        updates = self._pending
+        self._pending = []
+        asyncio.ensure_future(self._flush(updates))
+
+    async def _flush(self, updates):
+        start = time.time()
+        try:
+            await self._flush_part(updates)
+        finally:
+            WRITE_FLUSH_LATENCY.observe(time.time() - start)
+            WRITE_FLUSH_SIZE.observe(len(updates))
+
+    async def _flush_part(self, updates):
+        try:
+            async with self._db.pool.acquire() as conn:
+                results = await transaction_with_retry(conn, lambda cursor: self._apply(cursor, updates))
+        except Exception as err:  # pylint: disable=W0703
+            if len(updates) > 1:
+                # in order, since later updates compare against earlier ones
+                half = len(updates) // 2
+                await self._flush_part(updates[:half])
+                await self._flush_part(updates[half:])
+                return
+            _, _, _, future = updates[0]
+            if not future.done():
+                future.set_exception(err)
+            return
+
+        for (_, _, _, future), result in zip(updates, results):
+            if not future.done():
+                future.set_result(result)
+
+    def _key_condition(self, n_keys):
+        names = ', '.join(f'`{name}`' for name in self._key_fields)
+        row = '(' + ', '.join(['%s'] * len(self._key_fields)) + ')'
+        return f"({names}) IN ({', '.join([row] * n_keys)})"
+
+    async def _apply(self, cursor, updates):
+        keys = sorted({key for key, _, _, _ in updates})
+        if self._lock is not None:
+            await self._lock(cursor, keys)
+        compare_fields = sorted({f for _, compare_items, _, _ in updates for f in compare_items})
+        select_fields = ', '.join(f'`{f}`' for f in [*self._key_fields, *compare_fields])
+        sql = f"""SELECT {select_fields} FROM `{self._table_name}`
+                  WHERE {self._key_condition(len(keys))}
+                  ORDER BY {', '.join(f'`{name}`' for name in self._key_fields)}
+                  FOR UPDATE"""
+        await cursor.execute(sql, tuple(v for key in keys for v in key))
+        rows = {tuple(row[f] for f in self._key_fields): row for row in await cursor.fetchall()}
+
+        results = []
+        merged = {}
+        for key, compare_items, set_items, _ in updates:
+            row = rows.get(key)
+            if row is None or not all(_matches(row.get(k), v) for k, v in compare_items.items()):
+                results.append(0)
+                continue
+            row.update(set_items)
+            merged.setdefault(key, {}).update(set_items)
+            results.append(1)
+
+        groups = {}
+        for key, set_items in merged.items():
+            groups.setdefault(tuple(sorted(set_items)), []).append((key, set_items))
+
+        for fields, entries in groups.items():
+            columns = [*self._key_fields, *fields]
+            first = 'SELECT ' + ', '.join(f'%s AS `{c}`' for c in columns)
+            rest = 'SELECT ' + ', '.join(['%s'] * len(columns))
+            values = ' UNION ALL '.join([first] + [rest] * (len(entries) - 1))
+            on = ' AND '.join(f'`{self._table_name}`.`{k}` = updates.`{k}`' for k in self._key_fields)
+            assignments = ', '.join(f'`{self._table_name}`.`{f}` = updates.`{f}`' for f in fields)
+            sql = f"""UPDATE `{self._table_name}` INNER JOIN ({values}) AS updates
+                      ON {on}
+                      SET {assignments}"""
+            await cursor.execute(sql, tuple(v for key, set_items in entries
+                                            for v in (*key, *(set_items[f] for f in fields))))
+        return results
+
+
 class Table:  # pylint: disable=R0903
     def __init__(self, db, name):
         self.name = name
@@ -154,10 +307,14 @@ class Table:  # pylint: disable=R0903
                 await cursor.execute(sql, tuple(where_values))
 
 
+class DuplicateChunkError(Exception):
+    pass
+
+
 class JobsBuilder:
     jobs_fields = {'batch_id', 'job_id', 'state', 'pvc_size',
                    'callback', 'attributes', 'tasks', 'task_idx',
-                   'always_run', 'duration', 'token'}
+                   'always_run', 'duration', 'token', 'n_pending_parents'}
 
     jobs_parents_fields = {'batch_id', 'job_id', 'parent_id'}
 
@@ -183,24 +340,67 @@ class JobsBuilder:
         assert set(items) == JobsBuilder.jobs_parents_fields, set(items)
         self._jobs_parents.append(dict(items))
 
-    async def commit(self):
+    async def commit(self, chunk_id=None):
+        """Insert the jobs and their parents in one transaction.
+
+        If `chunk_id` is given, the jobs are inserted only if no chunk with
+        that id was inserted in the batch before, and :class:`.DuplicateChunkError`
+        is raised otherwise.
+
+        Returns the records of jobs released by :meth:`.JobsTable.release_new_jobs`
+        as they became ready, or ``None`` if the insertion failed.
+        """
         assert self._is_open
+
+        class InsertionFailed(Exception):
+            pass
+
+        children = {}
+        for job in self._jobs:
+            if job['n_pending_parents'] > 0:
+                children.setdefault(job['batch_id'], []).append(job['job_id'])
+
+        batch_ids = {job['batch_id'] for job in self._jobs}
+
+        async def insert(cursor):
+            if chunk_id is not None:
+                assert len(batch_ids) == 1, batch_ids
+                try:
+                    await cursor.execute(self._db.job_chunks.new_record_template('batch_id', 'chunk_id'),
+                                         {'batch_id': next(iter(batch_ids)), 'chunk_id': chunk_id})
+                except pymysql.err.IntegrityError as err:
+                    code, _ = err.args
+                    if code == 1062:
+                        raise DuplicateChunkError(chunk_id) from err
+                    raise
+
+            for batch_id in sorted(children):
+                await self._db.jobs._lock_batch(cursor, batch_id)
+
+            if len(self._jobs) > 0:
+                await cursor.executemany(self._jobs_sql, self._jobs)
+                n_jobs_inserted = cursor.rowcount
+                if n_jobs_inserted != len(self._jobs):
+                    log.info(f'inserted {n_jobs_inserted} jobs, but expected {len(self._jobs)} jobs')
+                    raise InsertionFailed()
+
+            if len(self._jobs_parents) > 0:
+                await cursor.executemany(self._jobs_parents_sql, self._jobs_parents)
+                n_jobs_parents_inserted = cursor.rowcount
+                if n_jobs_parents_inserted != len(self._jobs_parents):
+                    log.info(f'inserted {n_jobs_parents_inserted} jobs parents, but expected {len(self._jobs_parents)}')
+                    raise InsertionFailed()
+
+            ready = []
+            for batch_id, job_ids in children.items():
+                ready.extend(await self._db.jobs.release_new_jobs(cursor, batch_id, job_ids))
+            return ready
+
         async with self._db.pool.acquire() as conn:
-            async with conn.cursor() as cursor:
-                if len(self._jobs) > 0:
-                    await executemany_with_retry(cursor, self._jobs_sql, self._jobs)
-                    n_jobs_inserted = cursor.rowcount
-                    if n_jobs_inserted != len(self._jobs):
-                        log.info(f'inserted {n_jobs_inserted} jobs, but expected {len(self._jobs)} jobs')
-                        return False
-
-                if len(self._jobs_parents) > 0:
-                    await executemany_with_retry(cursor, self._jobs_parents_sql, self._jobs_parents)
-                    n_jobs_parents_inserted = cursor.rowcount
-                    if n_jobs_parents_inserted != len(self._jobs_parents):
-                        log.info(f'inserted {n_jobs_parents_inserted} jobs parents, but expected {len(self._jobs_parents)}')
-                        return False
-                return True
+            try:
+                return await transaction_with_retry(conn, insert)
+            except InsertionFailed:
+                return None
 
 
 class BatchDatabase(Database):
@@ -210,6 +410,8 @@ class BatchDatabase(Database):
         self.jobs = JobsTable(self)
         self.jobs_parents = JobsParentsTable(self)
         self.batch = BatchTable(self)
+        self.batch_attributes = BatchAttributesTable(self)
+        self.job_chunks = JobChunksTable(self)
 
 
 class JobsTable(Table):
@@ -245,13 +447,13 @@ class JobsTable(Table):
 
     def __init__(self, db):
         super().__init__(db, 'jobs')
+        self._updates = UpdateCoalescer(db, self.name, ('batch_id', 'job_id'), lock=self._lock_batches)
 
     async def update_record(self, batch_id, job_id, compare_items=None, **items):
         assert not set(items).intersection(JobsTable.batch_view_fields)
-        where_items = {'batch_id': batch_id, 'job_id': job_id}
-        if compare_items is not None:
-            where_items.update(compare_items)
-        return await super().update_record(where_items, items)
+        if len(items) == 0:
+            return 0
+        return await self._updates.update((batch_id, job_id), compare_items or {}, items)
 
     async def get_all_records(self):
         async with self._db.pool.acquire() as conn:
@@ -291,12 +493,174 @@ class JobsTable(Table):
                 result = await cursor.fetchall()
         return result
 
+    async def get_undeleted_records_by_ids(self, ids):
+        """Returns the jobs of undeleted batches with the given
+        (batch_id, job_id, user) ids."""
+        if not ids:
+            return []
+        async with self._db.pool.acquire() as conn:
+            async with conn.cursor() as cursor:
+                batch_name = self._db.batch.name
+                fields = ', '.join(self._select_fields())
+                rows = ', '.join(['(%s, %s, %s)'] * len(ids))
+                sql = f"""SELECT {fields} FROM `{self.name}`
+                INNER JOIN `{batch_name}` ON `{self.name}`.batch_id = `{batch_name}`.id
+                WHERE (`{self.name}`.batch_id, `{self.name}`.job_id, `{batch_name}`.user) IN ({rows})
+                AND `{batch_name}`.deleted = FALSE"""
+                await cursor.execute(sql, tuple(v for id in ids for v in id))
+                result = await cursor.fetchall()
+        return result
+
     async def has_record(self, batch_id, job_id):
         return await super().has_record({'batch_id': batch_id, 'job_id': job_id})
 
     async def delete_record(self, batch_id, job_id):
         await super().delete_record({'batch_id': batch_id, 'job_id': job_id})
 
+    async def get_records_changed(self, batch_id, after_version, up_to_version, limit):
+        """Returns the jobs of the batch inserted or changed state after
+        `after_version` and up to `up_to_version`, in version order."""
+        async with self._db.pool.acquire() as conn:
+            async with conn.cursor() as cursor:
+                batch_name = self._db.batch.name
+                fields = ', '.join(self._select_fields())
+                sql = f"""SELECT {fields} FROM `{self.name}`
+                          INNER JOIN `{batch_name}` ON `{self.name}`.batch_id = `{batch_name}`.id
+                          WHERE `{self.name}`.batch_id = %s
+                          AND `{self.name}`.version > %s AND `{self.name}`.version <= %s
+                          ORDER BY `{self.name}`.version
+                          LIMIT %s"""
+                await cursor.execute(sql, (batch_id, after_version, up_to_version, limit))
+                return await cursor.fetchall()
+
+    async def _lock_batch(self, cursor, batch_id):
+        # serializes the readiness accounting of a batch
+        await cursor.execute(f"SELECT id FROM `{self._db.batch.name}` WHERE id = %s FOR UPDATE", (batch_id,))
+
+    async def _lock_batches(self, cursor, keys):
+        # job updates change their batch through triggers, and
+        # release_children locks the batch before its jobs, so batches are
+        # locked first, in id order
+        batch_ids = sorted({batch_id for batch_id, _ in keys})
+        await cursor.execute(f"""SELECT id FROM `{self._db.batch.name}` WHERE id IN %s
+                                 ORDER BY id FOR UPDATE""", (batch_ids,))
+
+    async def _count_released_parents(self, cursor, batch_id, condition, values):
+        # subtracts, from each child of the edges matching condition, the
+        # number of those edges whose parent has released its children
+        jobs_parents_name = self._db.jobs_parents.name
+        sql = f"""UPDATE `{self.name}` INNER JOIN
+                  (SELECT `{jobs_parents_name}`.job_id, COUNT(*) AS n,
+                   SUM(parents.state != 'Success') AS n_failed
+                   FROM `{jobs_parents_name}`
+                   INNER JOIN `{self.name}` AS parents
+                   ON `{jobs_parents_name}`.batch_id = parents.batch_id
+                   AND `{jobs_parents_name}`.parent_id = parents.job_id
+                   WHERE `{jobs_parents_name}`.batch_id = %s AND parents.children_released AND {condition}
+                   GROUP BY `{jobs_parents_name}`.job_id) AS counts
+                  ON `{self.name}`.batch_id = %s AND `{self.name}`.job_id = counts.job_id
+                  SET `{self.name}`.n_pending_parents = `{self.name}`.n_pending_parents - counts.n,
+                  `{self.name}`.parents_failed = `{self.name}`.parents_failed OR counts.n_failed > 0"""
+        await cursor.execute(sql, (batch_id, *values, batch_id))
+
+    async def _release_pending(self, cursor, batch_id, condition, values):
+        # moves the Pending jobs matching condition with no incomplete
+        # parents to Ready or Cancelled; returns the Ready records and the
+        # ids of the Cancelled jobs
+        batch_name = self._db.batch.name
+        fields = ', '.join(self._select_fields())
+        sql = f"""SELECT {fields} FROM `{self.name}`
+                  INNER JOIN `{batch_name}` ON `{self.name}`.batch_id = `{batch_name}`.id
+                  WHERE `{self.name}`.batch_id = %s AND {condition}
+                  AND `{self.name}`.state = 'Pending' AND `{self.name}`.n_pending_parents = 0
+                  FOR UPDATE"""
+        await cursor.execute(sql, (batch_id, *values))
+        records = await cursor.fetchall()
+
+        ready = []
+        cancelled_ids = []
+        for record in records:
+            if record['always_run'] or not (record['cancelled'] or record['parents_failed']):
+                record['state'] = 'Ready'
+                ready.append(record)
+            else:
+                cancelled_ids.append(record['job_id'])
+
+        for state, ids in (('Ready', [record['job_id'] for record in ready]), ('Cancelled', cancelled_ids)):
+            if ids:
+                await cursor.execute(f"UPDATE `{self.name}` SET state = %s WHERE batch_id = %s AND job_id IN %s",
+                                     (state, batch_id, ids))
+        return ready, cancelled_ids
+
+    async def _release_children(self, cursor, batch_id, parent_ids):
+        jobs_parents_name = self._db.jobs_parents.name
+        ready = []
+        while parent_ids:
+            sql = f"""SELECT job_id FROM `{self.name}`
+                      WHERE batch_id = %s AND job_id IN %s AND state IN %s AND NOT children_released
+                      FOR UPDATE"""
+            await cursor.execute(sql, (batch_id, parent_ids, complete_states))
+            parent_ids = [record['job_id'] for record in await cursor.fetchall()]
+            if not parent_ids:
+                break
+            await cursor.execute(f"""UPDATE `{self.name}` SET children_released = TRUE
+                                     WHERE batch_id = %s AND job_id IN %s""",
+                                 (batch_id, parent_ids))
+
+            await self._count_released_parents(
+                cursor, batch_id, f'`{jobs_parents_name}`.parent_id IN %s', (parent_ids,))
+
+            children = f"""`{self.name}`.job_id IN
+                           (SELECT job_id FROM `{jobs_parents_name}` WHERE batch_id = %s AND parent_id IN %s)"""
+            new_ready, parent_ids = await self._release_pending(cursor, batch_id, children, (batch_id, parent_ids))
+            ready.extend(new_ready)
+        return ready
+
+    async def release_children(self, batch_id, parent_ids):
+        """Account for the completion of the jobs `parent_ids` in their children.
+
+        Each child's count of incomplete parents is decremented with one
+        statement, and children left without incomplete parents are moved,
+        in the same transaction, to Ready, or to Cancelled if a parent did
+        not succeed or the batch was cancelled and the child is not
+        always_run.  Cancelled children are released in turn.  Parents that
+        are not complete or were already released are ignored, so this may
+        be called more than once.
+
+        Returns the records of the jobs that became Ready.
+        """
+        async def release(cursor):
+            await self._lock_batch(cursor, batch_id)
+            return await self._release_children(cursor, batch_id, parent_ids)
+
+        async with self._db.pool.acquire() as conn:
+            return await transaction_with_retry(conn, release)
+
+    async def release_new_jobs(self, cursor, batch_id, job_ids):
+        """Account for the parents of the newly inserted jobs `job_ids` that
+        have already released their children.  Must be called in the
+        inserting transaction, after the batch is locked.
+
+        Returns the records of the jobs that became Ready.
+        """
+        jobs_parents_name = self._db.jobs_parents.name
+        await self._count_released_parents(
+            cursor, batch_id, f'`{jobs_parents_name}`.job_id IN %s', (job_ids,))
+        ready, cancelled_ids = await self._release_pending(
+            cursor, batch_id, f'`{self.name}`.job_id IN %s', (job_ids,))
+        ready.extend(await self._release_children(cursor, batch_id, cancelled_ids))
+        return ready
+
+    async def get_unreleased_records(self):
+        """Returns the batch and job ids of complete jobs that have not
+        released their children."""
+        async with self._db.pool.acquire() as conn:
+            async with conn.cursor() as cursor:
+                sql = f"""SELECT batch_id, job_id FROM `{self.name}`
+                          WHERE state IN %s AND NOT children_released"""
+                await cursor.execute(sql, (complete_states,))
+                return await cursor.fetchall()
+
     async def get_incomplete_parents(self, batch_id, job_id):
         async with self._db.pool.acquire() as conn:
             async with conn.cursor() as cursor:
@@ -313,6 +677,19 @@ class JobsTable(Table):
     async def get_records_by_batch(self, batch_id):
         return await self.get_records_where({'batch_id': batch_id})
 
+    async def get_records_page(self, batch_id, last_job_id, limit):
+        async with self._db.pool.acquire() as conn:
+            async with conn.cursor() as cursor:
+                batch_name = self._db.batch.name
+                fields = ', '.join(self._select_fields())
+                sql = f"""SELECT {fields} FROM `{self.name}`
+                          INNER JOIN `{batch_name}` ON `{self.name}`.batch_id = `{batch_name}`.id
+                          WHERE `{self.name}`.batch_id = %s AND `{self.name}`.job_id > %s
+                          ORDER BY `{self.name}`.job_id
+                          LIMIT %s"""
+                await cursor.execute(sql, (batch_id, last_job_id if last_job_id is not None else -1, limit))
+                return await cursor.fetchall()
+
     async def get_records_where(self, condition):
         async with self._db.pool.acquire() as conn:
             async with conn.cursor() as cursor:
@@ -425,3 +802,53 @@ class BatchTable(Table):
 
     async def get_undeleted_records(self, ids, user):
         return await super().get_records({'id': ids, 'user': user, 'deleted': False})
+
+    async def get_undeleted_records_page(self, user, complete=None, success=None, attributes=None,
+                                         last_id=None, limit=None):
+        conditions = ['`user` = %s', '`deleted` = FALSE']
+        values = [user]
+        if complete is not None:
+            condition = '(`closed` AND `n_completed` = `n_jobs`)'
+            conditions.append(condition if complete else f'NOT {condition}')
+        if success is not None:
+            condition = '(`closed` AND `n_failed` = 0 AND `n_cancelled` = 0 AND `n_succeeded` = `n_jobs`)'
+            conditions.append(condition if success else f'NOT {condition}')
+        if attributes:
+            attributes_name = self._db.batch_attributes.name
+            for k, v in attributes.items():
+                conditions.append(f"""EXISTS (SELECT 1 FROM `{attributes_name}`
+                                      WHERE `{attributes_name}`.batch_id = `{self.name}`.id
+                                      AND `{attributes_name}`.`key` = %s AND `{attributes_name}`.`value` = %s)""")
+                values.extend([k, v])
+        if last_id is not None:
+            conditions.append('`id` < %s')
+            values.append(last_id)
+
+        sql = f"SELECT * FROM `{self.name}` WHERE {' AND '.join(conditions)} ORDER BY `id` DESC"
+        if limit is not None:
+            sql += ' LIMIT %s'
+            values.append(limit)
+
+        async with self._db.pool.acquire() as conn:
+            async with conn.cursor() as cursor:
+                await cursor.execute(sql, tuple(values))
+                return await cursor.fetchall()
+
+
+class BatchAttributesTable(Table):
+    def __init__(self, db):
+        super().__init__(db, 'batch-attributes')
+
+    async def new_records(self, batch_id, attributes):
+        records = [{'batch_id': batch_id, 'key': k, 'value': v}
+                   for k, v in attributes.items() if v is not None]
+        if records:
+            async with self._db.pool.acquire() as conn:
+                async with conn.cursor() as cursor:
+                    sql = self.new_record_template('batch_id', 'key', 'value')
+                    await executemany_with_retry(cursor, sql, records)
+
+
+class JobChunksTable(Table):  # pylint: disable=R0903
+    def __init__(self, db):
+        super().__init__(db, 'batch-job-chunks')
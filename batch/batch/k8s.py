@@ -9,6 +9,7 @@ class K8s:
         self.timeout = timeout
         self.namespace = namespace
         self.log = log
+        self._k8s_api = k8s_api
         self._delete_pod = self._wrap_k8s_delete(k8s_api.delete_namespaced_pod)
         self._delete_pvc = self._wrap_k8s_delete(k8s_api.delete_namespaced_persistent_volume_claim)
         self._create_pod = self._wrap_k8s(k8s_api.create_namespaced_pod)
@@ -46,6 +47,24 @@ class K8s:
     async def list_pvcs(self, *args, **kwargs):
         return await self._list_pvcs(*args, **kwargs)
 
+    async def watch_pods(self, resource_version, timeout_seconds, **kwargs):
+        """Yields the pod events after `resource_version` until the watch
+        times out.  Raises an ApiException with status 410 if
+        `resource_version` is too old to resume from."""
+        stream = kube.watch.Watch().stream(self._k8s_api.list_namespaced_pod,
+                                           self.namespace,
+                                           resource_version=resource_version,
+                                           timeout_seconds=timeout_seconds,
+                                           **kwargs)
+        while True:
+            event = await blocking_to_async(self.blocking_pool, next, stream, None)
+            if event is None:
+                return
+            if event['type'] == 'ERROR':
+                status = event['raw_object']
+                raise kube.client.rest.ApiException(status=status.get('code'), reason=status.get('message'))
+            yield event
+
     async def get_pod(self, *args, **kwargs):
         return await self._get_pod(*args, **kwargs)
 
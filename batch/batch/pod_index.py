@@ -0,0 +1,92 @@
+import asyncio
+import time
+
+import kubernetes as kube
+
+
+class PodIndex:
+    """An in-memory index of the batch pods by name.
+
+    The index is filled from a full list of the pods and then kept current
+    by a watch that resumes from the resource version of the last event
+    seen.  The pods are listed again every `relist_interval` seconds, or
+    when the version the watch would resume from has expired.
+    """
+
+    def __init__(self, k8s, label_selector, log, relist_interval=30 * 60, watch_timeout=5 * 60):
+        self.k8s = k8s
+        self.label_selector = label_selector
+        self.log = log
+        self.relist_interval = relist_interval
+        self.watch_timeout = watch_timeout
+        self.pods = {}
+        self.resource_version = None
+        self._last_relist = None
+
+    @property
+    def synced(self):
+        return self.resource_version is not None
+
+    async def relist(self):
+        """Replaces the index with a full list of the pods.
+
+        Returns the pods that are new or have changed since they were last
+        seen, or None if the pods could not be listed.
+        """
+        pods, err = await self.k8s.list_pods(label_selector=self.label_selector)
+        if err is not None:
+            self.log.info(f'could not list pods due to {err}, will try again later')
+            return None
+
+        self.log.info(f'k8s had {len(pods.items)} pods')
+
+        new_pods = {pod.metadata.name: pod for pod in pods.items}
+        changed = []
+        for name, pod in new_pods.items():
+            old_pod = self.pods.get(name)
+            if old_pod is None or old_pod.metadata.resource_version != pod.metadata.resource_version:
+                changed.append(pod)
+
+        self.pods = new_pods
+        self.resource_version = pods.metadata.resource_version
+        self._last_relist = time.time()
+        return changed
+
+    def apply(self, event):
+        pod = event['object']
+        if event['type'] == 'DELETED':
+            self.pods.pop(pod.metadata.name, None)
+        else:
+            self.pods[pod.metadata.name] = pod
+        self.resource_version = pod.metadata.resource_version
+
+    async def run(self, pod_changed, pods_changed):
+        """Keeps the index current forever.
+
+        `pod_changed` is awaited with the pod of each watch event, and
+        `pods_changed` with the list of pods found to be new or changed by
+        a full list.
+        """
+        while True:
+            try:
+                if not self.synced or time.time() - self._last_relist >= self.relist_interval:
+                    changed = await self.relist()
+                    if changed is None:
+                        await asyncio.sleep(5)
+                        continue
+                    await pods_changed(changed)
+
+                async for event in self.k8s.watch_pods(self.resource_version, self.watch_timeout,
+                                                       label_selector=self.label_selector):
+                    self.apply(event)
+                    await pod_changed(event['object'])
+                continue
+            except kube.client.rest.ApiException as err:
+                if err.status == 410:
+                    self.log.info(f'pod watch resource version {self.resource_version} expired, relisting')
+                    self.resource_version = None
+                    continue
+                self.log.exception(f'k8s event stream failed due to: {err}')
+            except Exception as exc:  # pylint: disable=W0703
+                self.log.exception(f'k8s event stream failed due to: {exc}')
+            await asyncio.sleep(5)
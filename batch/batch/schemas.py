@@ -39,5 +39,6 @@ batch_schema = {
         'keyschema': {'type': 'string'},
         'valueschema': {'type': 'string'}
     },
-    'callback': {'type': 'string'}
+    'callback': {'type': 'string'},
+    'coalesce_callbacks': {'type': 'boolean'}
 }
@@ -0,0 +1,111 @@
+"""Measures job submission throughput of the batch client.
+
+A stand-in for the batch service is served on a local port.  It parses and
+counts submitted jobs and answers each request after a fixed delay, standing
+in for the database round trips of the real service.  A large batch is
+submitted with one chunk in flight at a time and with concurrent chunks.
+
+    python3 -m batch.submit_benchmark --jobs 100000 --request-latency 0.05
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import aiohttp
+from aiohttp import web
+
+import hailtop.gear.auth as hj
+from hailtop.batch_client.aioclient import BatchClient
+
+
+class StandInService:
+    def __init__(self, request_latency):
+        self.request_latency = request_latency
+        self.n_batches = 0
+        self.jobs = {}
+        self.chunks = set()
+        self.closed = {}
+
+        self.app = web.Application(client_max_size=None)
+        self.app.add_routes([
+            web.post('/api/v1alpha/batches/create', self.create_batch),
+            web.post('/api/v1alpha/batches/{batch_id}/jobs/create', self.create_jobs),
+            web.patch('/api/v1alpha/batches/{batch_id}/close', self.close_batch)])
+
+    async def create_batch(self, request):
+        await request.json()
+        self.n_batches += 1
+        self.jobs[self.n_batches] = 0
+        return web.json_response({'id': self.n_batches})
+
+    async def create_jobs(self, request):
+        batch_id = int(request.match_info['batch_id'])
+        chunk = (batch_id, int(request.query['chunk_id']))
+        n_jobs = 0
+        async for line in request.content:
+            if line.strip():
+                json.loads(line)
+                n_jobs += 1
+        await asyncio.sleep(self.request_latency)
+        if chunk not in self.chunks:
+            self.chunks.add(chunk)
+            self.jobs[batch_id] += n_jobs
+        return web.json_response({})
+
+    async def close_batch(self, request):
+        # the number of jobs inserted when the batch was closed
+        batch_id = int(request.match_info['batch_id'])
+        self.closed[batch_id] = self.jobs[batch_id]
+        return web.json_response({})
+
+
+async def submit(url, token, n_jobs, parallelism):
+    session = aiohttp.ClientSession(raise_for_status=True)
+    client = BatchClient(session, url=url, token=token)
+    try:
+        builder = client.create_batch(attributes={'name': 'submit-benchmark'})
+        for _ in range(n_jobs):
+            builder.create_job('alpine', ['true'])
+        start = time.time()
+        batch = await builder.submit(parallelism=parallelism)
+        return batch.id, time.time() - start
+    finally:
+        await client.close()
+
+
+async def run(args):
+    service = StandInService(args.request_latency)
+    runner = web.AppRunner(service.app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    url = f'http://127.0.0.1:{port}'
+    token = hj.JWTClient(hj.JWTClient.generate_key()).encode({'bucket_name': 'submit-benchmark'})
+
+    try:
+        for parallelism in (1, args.parallelism):
+            batch_id, elapsed = await submit(url, token, args.jobs, parallelism)
+            assert service.closed.get(batch_id) == args.jobs, (service.closed.get(batch_id), args.jobs)
+            print(f'parallelism {parallelism}: {args.jobs} jobs in {elapsed:.2f}s, '
+                  f'{args.jobs / elapsed:.0f} jobs/s')
+    finally:
+        await runner.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure batch client job submission throughput.')
+    parser.add_argument('--jobs', type=int, default=100000)
+    parser.add_argument('--parallelism', type=int, default=8,
+                        help='number of chunks in flight in the concurrent run')
+    parser.add_argument('--request-latency', type=float, default=0.05,
+                        help='seconds the stand-in service takes to answer a request')
+    args = parser.parse_args()
+
+    loop = asyncio.get_event_loop()
+    loop.run_until_complete(run(args))
+
+
+if __name__ == '__main__':
+    main()
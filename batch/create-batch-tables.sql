@@ -4,6 +4,7 @@ CREATE TABLE IF NOT EXISTS `batch` (
   `user` VARCHAR(100) NOT NULL,
   `attributes` TEXT(65535),
   `callback` TEXT(65535),
+  `coalesce_callbacks` BOOLEAN NOT NULL default false,
   `deleted` BOOLEAN NOT NULL default false,
   `cancelled` BOOLEAN NOT NULL default false,
   `closed` BOOLEAN NOT NULL default false,
@@ -12,12 +13,29 @@ CREATE TABLE IF NOT EXISTS `batch` (
   `n_succeeded` INT NOT NULL default 0,
   `n_failed` INT NOT NULL default 0,
   `n_cancelled` INT NOT NULL default 0,
+  `version` BIGINT NOT NULL default 0,
   `time_created` TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
   PRIMARY KEY (`id`)
 ) ENGINE = InnoDB;
-CREATE INDEX `batch_user` ON `batch` (`user`);
+CREATE INDEX `batch_user_deleted` ON `batch` (`user`, `deleted`, `id`);
 CREATE INDEX `batch_deleted` ON `batch` (`deleted`);
 
+CREATE TABLE IF NOT EXISTS `batch-attributes` (
+  `batch_id` BIGINT NOT NULL,
+  `key` VARCHAR(100) NOT NULL,
+  `value` TEXT(65535),
+  PRIMARY KEY (`batch_id`, `key`),
+  FOREIGN KEY (`batch_id`) REFERENCES batch(id) ON DELETE CASCADE
+) ENGINE = InnoDB;
+CREATE INDEX `batch_attributes_key_value` ON `batch-attributes` (`key`, `value`(256));
+
+CREATE TABLE IF NOT EXISTS `batch-job-chunks` (
+  `batch_id` BIGINT NOT NULL,
+  `chunk_id` INT NOT NULL,
+  PRIMARY KEY (`batch_id`, `chunk_id`),
+  FOREIGN KEY (`batch_id`) REFERENCES batch(id) ON DELETE CASCADE
+) ENGINE = InnoDB;
+
 CREATE TABLE IF NOT EXISTS `jobs` (
   `batch_id` BIGINT NOT NULL,
   `job_id` INT NOT NULL,
@@ -30,6 +48,10 @@ CREATE TABLE IF NOT EXISTS `jobs` (
   `callback` TEXT(65535),
   `task_idx` INT NOT NULL,
   `always_run` BOOLEAN NOT NULL,
+  `n_pending_parents` INT NOT NULL default 0,
+  `parents_failed` BOOLEAN NOT NULL default false,
+  `children_released` BOOLEAN NOT NULL default false,
+  `version` BIGINT NOT NULL default 0,
   `time_created` TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
   `duration` BIGINT,
   `attributes` TEXT(65535),
@@ -44,6 +66,7 @@ CREATE TABLE IF NOT EXISTS `jobs` (
   FOREIGN KEY (`batch_id`) REFERENCES batch(id) ON DELETE CASCADE
 ) ENGINE = InnoDB;
 CREATE INDEX `jobs_state` ON `jobs` (`state`);
+CREATE INDEX `jobs_batch_id_version` ON `jobs` (`batch_id`, `version`);
 
 CREATE TABLE IF NOT EXISTS `jobs-parents` (
   `batch_id` BIGINT NOT NULL,
@@ -56,6 +79,25 @@ CREATE INDEX jobs_parents_parent_id ON `jobs-parents` (batch_id, parent_id);
 
 DELIMITER $$
 
+# every job insertion and state change is given the next version of its
+# batch; the batch row stays locked until commit, so versions are visible in
+# order
+CREATE TRIGGER trigger_jobs_before_insert BEFORE INSERT ON jobs
+    FOR EACH ROW BEGIN
+        UPDATE batch SET version = version + 1 WHERE id = NEW.batch_id;
+        SET NEW.version = (SELECT version FROM batch WHERE id = NEW.batch_id);
+    END;
+$$
+
+CREATE TRIGGER trigger_jobs_before_update BEFORE UPDATE ON jobs
+    FOR EACH ROW BEGIN
+        IF (OLD.state NOT LIKE NEW.state) THEN
+            UPDATE batch SET version = version + 1 WHERE id = NEW.batch_id;
+            SET NEW.version = (SELECT version FROM batch WHERE id = NEW.batch_id);
+        END IF;
+    END;
+$$
+
 CREATE TRIGGER trigger_jobs_insert AFTER INSERT ON jobs
     FOR EACH ROW BEGIN
         UPDATE batch SET n_jobs = n_jobs + 1 WHERE id = new.batch_id;
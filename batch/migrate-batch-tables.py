@@ -0,0 +1,193 @@
+"""Brings the tables of a batch database created by an earlier
+create-batch-tables.sql up to date.
+
+CREATE TABLE IF NOT EXISTS leaves existing tables unchanged, so every
+change to the schema of a released database is also a migration here.
+Applied migrations are recorded in the batch-migrations table and are not
+run again.  On a new database they find nothing to change or backfill.
+
+    python3 migrate-batch-tables.py sql-config.json
+"""
+import json
+import sys
+
+import pymysql
+
+MIGRATIONS = []
+
+
+def migration(f):
+    MIGRATIONS.append(f)
+    return f
+
+
+def has_table(cursor, table):
+    cursor.execute("""SELECT 1 FROM information_schema.tables
+                      WHERE table_schema = DATABASE() AND table_name = %s""", (table,))
+    return cursor.fetchone() is not None
+
+
+def has_column(cursor, table, column):
+    cursor.execute("""SELECT 1 FROM information_schema.columns
+                      WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s""",
+                   (table, column))
+    return cursor.fetchone() is not None
+
+
+def has_index(cursor, table, index):
+    cursor.execute("""SELECT 1 FROM information_schema.statistics
+                      WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s""",
+                   (table, index))
+    return cursor.fetchone() is not None
+
+
+@migration
+def batch_attributes(cursor):
+    # batches are filtered by attribute in SQL, from their own table
+    if not has_table(cursor, 'batch-attributes'):
+        cursor.execute("""CREATE TABLE `batch-attributes` (
+                            `batch_id` BIGINT NOT NULL,
+                            `key` VARCHAR(100) NOT NULL,
+                            `value` TEXT(65535),
+                            PRIMARY KEY (`batch_id`, `key`),
+                            FOREIGN KEY (`batch_id`) REFERENCES batch(id) ON DELETE CASCADE
+                          ) ENGINE = InnoDB""")
+        cursor.execute("CREATE INDEX `batch_attributes_key_value` ON `batch-attributes` (`key`, `value`(256))")
+    if not has_index(cursor, 'batch', 'batch_user_deleted'):
+        cursor.execute("CREATE INDEX `batch_user_deleted` ON `batch` (`user`, `deleted`, `id`)")
+    if has_index(cursor, 'batch', 'batch_user'):
+        cursor.execute("DROP INDEX `batch_user` ON `batch`")
+
+    cursor.execute("SELECT id, attributes FROM `batch` WHERE attributes IS NOT NULL")
+    records = [(record['id'], k, v)
+               for record in cursor.fetchall()
+               for k, v in (json.loads(record['attributes']) or {}).items()
+               if v is not None]
+    cursor.executemany("INSERT IGNORE INTO `batch-attributes` (batch_id, `key`, `value`) VALUES (%s, %s, %s)",
+                       records)
+
+
+@migration
+def job_parent_counts(cursor):
+    # readiness is tracked by each job's count of parents that have not
+    # released their children
+    for column, definition in [('n_pending_parents', 'INT NOT NULL default 0'),
+                               ('parents_failed', 'BOOLEAN NOT NULL default false'),
+                               ('children_released', 'BOOLEAN NOT NULL default false')]:
+        if not has_column(cursor, 'jobs', column):
+            cursor.execute(f"ALTER TABLE `jobs` ADD COLUMN `{column}` {definition} AFTER `always_run`")
+
+    # the children of jobs that are already complete were handled when
+    # they completed
+    cursor.execute("""UPDATE `jobs` SET children_released = TRUE
+                      WHERE state IN ('Cancelled', 'Error', 'Failed', 'Success')""")
+    cursor.execute("""UPDATE `jobs` INNER JOIN
+                      (SELECT `jobs-parents`.batch_id, `jobs-parents`.job_id,
+                       SUM(NOT parents.children_released) AS n_pending,
+                       SUM(parents.children_released AND parents.state != 'Success') AS n_failed
+                       FROM `jobs-parents`
+                       INNER JOIN `jobs` AS parents
+                       ON `jobs-parents`.batch_id = parents.batch_id AND `jobs-parents`.parent_id = parents.job_id
+                       GROUP BY `jobs-parents`.batch_id, `jobs-parents`.job_id) AS counts
+                      ON `jobs`.batch_id = counts.batch_id AND `jobs`.job_id = counts.job_id
+                      SET `jobs`.n_pending_parents = counts.n_pending,
+                      `jobs`.parents_failed = counts.n_failed > 0""")
+
+
+def has_trigger(cursor, trigger):
+    cursor.execute("""SELECT 1 FROM information_schema.triggers
+                      WHERE trigger_schema = DATABASE() AND trigger_name = %s""", (trigger,))
+    return cursor.fetchone() is not None
+
+
+@migration
+def job_versions(cursor):
+    # the change feed orders job insertions and state changes by a version
+    # per batch
+    if not has_column(cursor, 'batch', 'version'):
+        cursor.execute("ALTER TABLE `batch` ADD COLUMN `version` BIGINT NOT NULL default 0 AFTER `n_cancelled`")
+    if not has_column(cursor, 'jobs', 'version'):
+        cursor.execute("ALTER TABLE `jobs` ADD COLUMN `version` BIGINT NOT NULL default 0 AFTER `children_released`")
+    if not has_index(cursor, 'jobs', 'jobs_batch_id_version'):
+        cursor.execute("CREATE INDEX `jobs_batch_id_version` ON `jobs` (`batch_id`, `version`)")
+
+    # existing jobs are numbered as if inserted in job id order, before the
+    # triggers start counting from their batch's version
+    cursor.execute("UPDATE `jobs` SET version = job_id WHERE version = 0")
+    cursor.execute("""UPDATE `batch` SET version =
+                      (SELECT COALESCE(MAX(job_id), 0) FROM `jobs` WHERE `jobs`.batch_id = `batch`.id)
+                      WHERE version = 0""")
+
+    if not has_trigger(cursor, 'trigger_jobs_before_insert'):
+        cursor.execute("""CREATE TRIGGER trigger_jobs_before_insert BEFORE INSERT ON jobs
+                          FOR EACH ROW BEGIN
+                              UPDATE batch SET version = version + 1 WHERE id = NEW.batch_id;
+                              SET NEW.version = (SELECT version FROM batch WHERE id = NEW.batch_id);
+                          END""")
+    if not has_trigger(cursor, 'trigger_jobs_before_update'):
+        cursor.execute("""CREATE TRIGGER trigger_jobs_before_update BEFORE UPDATE ON jobs
+                          FOR EACH ROW BEGIN
+                              IF (OLD.state NOT LIKE NEW.state) THEN
+                                  UPDATE batch SET version = version + 1 WHERE id = NEW.batch_id;
+                                  SET NEW.version = (SELECT version FROM batch WHERE id = NEW.batch_id);
+                              END IF;
+                          END""")
+
+
+@migration
+def job_chunks(cursor):
+    # chunks of jobs that were inserted, so that a retried chunk is not
+    # inserted twice
+    cursor.execute("""CREATE TABLE IF NOT EXISTS `batch-job-chunks` (
+                        `batch_id` BIGINT NOT NULL,
+                        `chunk_id` INT NOT NULL,
+                        PRIMARY KEY (`batch_id`, `chunk_id`),
+                        FOREIGN KEY (`batch_id`) REFERENCES batch(id) ON DELETE CASCADE
+                      ) ENGINE = InnoDB""")
+
+
+@migration
+def batch_coalesce_callbacks(cursor):
+    if not has_column(cursor, 'batch', 'coalesce_callbacks'):
+        cursor.execute("""ALTER TABLE `batch` ADD COLUMN `coalesce_callbacks` BOOLEAN NOT NULL default false
+                          AFTER `callback`""")
+
+
+def migrate(config_file):
+    with open(config_file, 'r') as f:
+        config = json.loads(f.read().strip())
+
+    conn = pymysql.connect(host=config['host'],
+                           port=config['port'],
+                           db=config['db'],
+                           user=config['user'],
+                           password=config['password'],
+                           charset='utf8',
+                           cursorclass=pymysql.cursors.DictCursor,
+                           autocommit=False)
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("""CREATE TABLE IF NOT EXISTS `batch-migrations` (
+                                `name` VARCHAR(100) NOT NULL,
+                                `time_applied` TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                                PRIMARY KEY (`name`)
+                              ) ENGINE = InnoDB""")
+            cursor.execute("SELECT name FROM `batch-migrations`")
+            applied = {record['name'] for record in cursor.fetchall()}
+            conn.commit()
+
+            for f in MIGRATIONS:
+                if f.__name__ in applied:
+                    continue
+                print(f'applying migration {f.__name__}')
+                # schema changes commit implicitly, so each migration checks
+                # what is already there and may be run again if it fails
+                f(cursor)
+                cursor.execute("INSERT INTO `batch-migrations` (name) VALUES (%s)", (f.__name__,))
+                conn.commit()
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    migrate(sys.argv[1])
@@ -1,7 +1,7 @@
 import random
 import math
 import collections
-from hailtop.batch_client.client import BatchClient
+from hailtop.batch_client.client import BatchClient, async_to_blocking
 import json
 import os
 import pkg_resources
@@ -125,6 +125,103 @@ class Test(unittest.TestCase):
 
         assert_batch_ids({b2.id}, attributes={'tag': tag, 'name': 'b2'})
 
+    def test_pagination(self):
+        tag = secrets.token_urlsafe(64)
+        batch_ids = []
+        for i in range(3):
+            b = self.client.create_batch(attributes={'tag': tag, 'name': f'b{i}'})
+            batch_ids.append(b.submit().id)
+
+        b = self.client.create_batch(attributes={'tag': tag, 'name': 'jobs'})
+        for i in range(5):
+            b.create_job('alpine', ['true'])
+        b = b.submit()
+
+        async_client = self.client._async_client
+
+        def get(path, params):
+            return async_to_blocking(async_client._get(path, params=params))
+
+        params = {'a:tag': tag, 'limit': '2'}
+        pages = []
+        while True:
+            page = get('/api/v1alpha/batches', params)
+            pages.append([batch['id'] for batch in page['batches']])
+            if 'last_batch_id' not in page:
+                break
+            params['last_batch_id'] = str(page['last_batch_id'])
+        self.assertEqual(pages[0], [b.id, batch_ids[2]])
+        self.assertEqual([id for page in pages for id in page], [b.id] + batch_ids[::-1])
+
+        params = {'limit': '2'}
+        job_ids = []
+        while True:
+            page = get(f'/api/v1alpha/batches/{b.id}/jobs', params)
+            self.assertLessEqual(len(page['jobs']), 2)
+            job_ids.extend(j['job_id'] for j in page['jobs'])
+            if 'last_job_id' not in page:
+                break
+            params['last_job_id'] = str(page['last_job_id'])
+        self.assertEqual(job_ids, [1, 2, 3, 4, 5])
+
+        self.assertEqual([j['job_id'] for j in b.status()['jobs']], [1, 2, 3, 4, 5])
+
+    def test_wait_many(self):
+        b = self.client.create_batch()
+        jobs = [b.create_job('alpine', ['sleep', str(i)]) for i in range(3)]
+        b.submit()
+        statuses = self.client.wait_many(jobs)
+        self.assertEqual([s['job_id'] for s in statuses], [j.job_id for j in jobs])
+        self.assertTrue(all(s['state'] == 'Success' for s in statuses), statuses)
+
+    def test_batch_changes(self):
+        b = self.client.create_batch()
+        j = b.create_job('alpine', ['sleep', '5'])
+        b = b.submit()
+
+        async_client = self.client._async_client
+        version = 0
+        states = []
+        while True:
+            changes = async_to_blocking(async_client._get(f'/api/v1alpha/batches/{b.id}/changes',
+                                                          params={'version': str(version)}))
+            self.assertGreaterEqual(changes['version'], version)
+            version = changes['version']
+            states.extend(s['state'] for s in changes['jobs'] if s['job_id'] == j.job_id)
+            if changes['complete']:
+                break
+        self.assertEqual(states[-1], 'Success')
+
+    def test_duplicate_chunk_is_ignored(self):
+        async_client = self.client._async_client
+
+        def post(path, **kwargs):
+            return async_to_blocking(async_client._post(path, **kwargs))
+
+        b = post('/api/v1alpha/batches/create', json={})
+        job = {'job_id': 1, 'spec': {'containers': [{'image': 'alpine', 'name': 'main', 'command': ['true']}],
+                                     'restartPolicy': 'Never'}}
+        for _ in range(2):
+            post(f"/api/v1alpha/batches/{b['id']}/jobs/create",
+                 data=json.dumps(job),
+                 params={'chunk_id': '0'},
+                 headers={'Content-Type': 'application/x-ndjson'})
+        async_to_blocking(async_client._patch(f"/api/v1alpha/batches/{b['id']}/close"))
+
+        status = self.client.get_batch(b['id']).wait()
+        self.assertEqual([j['job_id'] for j in status['jobs']], [1])
+
+    def test_job_changes(self):
+        b = self.client.create_batch()
+        j = b.create_job('alpine', ['sleep', '5'])
+        b.create_job('alpine', ['true'])
+        b = b.submit()
+
+        changes = async_to_blocking(self.client._async_client._get(
+            f'/api/v1alpha/batches/{b.id}/changes', params={'version': '0', 'job_id': str(j.job_id)}))
+        self.assertEqual([s['job_id'] for s in changes['jobs']], [j.job_id])
+        self.assertEqual(j.wait()['state'], 'Success')
+
     def test_fail(self):
         b = self.client.create_batch()
         j = b.create_job('alpine', ['false'])
@@ -303,6 +400,8 @@ class Test(unittest.TestCase):
             (requests.get, '/api/v1alpha/batches/0/jobs/0'),
             (requests.get, '/api/v1alpha/batches/0/jobs/0/log'),
             (requests.get, '/api/v1alpha/batches/0/jobs/0/pod_status'),
+            (requests.get, '/api/v1alpha/batches/0/jobs'),
+            (requests.get, '/api/v1alpha/batches/0/changes'),
             (requests.get, '/api/v1alpha/batches'),
             (requests.post, '/api/v1alpha/batches/create'),
             (requests.post, '/api/v1alpha/batches/0/jobs/create'),
@@ -340,6 +439,17 @@ class Test(unittest.TestCase):
         finally:
             bc.close()
 
+    def test_write_flush_metrics(self):
+        b = self.client.create_batch()
+        b.create_job('alpine', ['true'])
+        b = b.submit()
+        b.wait()
+
+        r = requests.get(f'{os.environ.get("BATCH_URL")}/metrics')
+        assert r.status_code == 200
+        assert 'batch_db_write_flush_latency_seconds_count' in r.text, r.text
+        assert 'batch_db_write_flush_size_bucket' in r.text, r.text
+
     def test_ui_batches(self):
         with open(os.environ['HAIL_TOKEN_FILE']) as f:
             token = f.read()
@@ -0,0 +1,123 @@
+import asyncio
+import logging
+
+import aiohttp
+from aiohttp import web
+
+from batch.callbacks import CallbackDelivery, CALLBACKS, CALLBACK_RETRIES, CALLBACKS_PENDING
+
+log = logging.getLogger('test_callbacks')
+
+
+class Receiver:
+    def __init__(self, statuses=None):
+        self.statuses = list(statuses or [])
+        self.bodies = []
+        self.max_in_flight = 0
+        self._in_flight = 0
+        self.app = web.Application()
+        self.app.add_routes([web.post('/callback', self.callback)])
+
+    async def callback(self, request):
+        self._in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self._in_flight)
+        try:
+            body = await request.json()
+            await asyncio.sleep(0.01)
+            status = self.statuses.pop(0) if self.statuses else 200
+            if status == 200:
+                self.bodies.append(body)
+            return web.Response(status=status)
+        finally:
+            self._in_flight -= 1
+
+
+def run(receiver, test, **kwargs):
+    async def run_test():
+        runner = web.AppRunner(receiver.app)
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        session = aiohttp.ClientSession()
+        try:
+            callbacks = CallbackDelivery(session, log, **kwargs)
+            await test(callbacks, f'http://127.0.0.1:{port}/callback')
+            for _ in range(1000):
+                if CALLBACKS_PENDING._value.get() == 0:
+                    break
+                await asyncio.sleep(0.01)
+        finally:
+            await session.close()
+            await runner.cleanup()
+
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(run_test())
+    finally:
+        loop.close()
+
+
+def count(outcome):
+    return CALLBACKS.labels(outcome=outcome)._value.get()
+
+
+def test_concurrency_is_bounded():
+    receiver = Receiver()
+
+    async def test(callbacks, url):
+        for i in range(50):
+            callbacks.post(url, {'job_id': i}, f'job {i}')
+
+    run(receiver, test, max_concurrency=4)
+    assert sorted(body['job_id'] for body in receiver.bodies) == list(range(50))
+    assert receiver.max_in_flight <= 4
+
+
+def test_retries_server_errors_but_not_client_errors():
+    receiver = Receiver(statuses=[503, 500, 200, 404])
+    n_delivered = count('delivered')
+    n_rejected = count('rejected')
+    n_retries = CALLBACK_RETRIES._value.get()
+
+    async def test(callbacks, url):
+        callbacks.post(url, {'job_id': 1}, 'job 1')
+        while count('delivered') == n_delivered:
+            await asyncio.sleep(0.01)
+        callbacks.post(url, {'job_id': 2}, 'job 2')
+
+    run(receiver, test, max_backoff=0.01)
+    assert receiver.bodies == [{'job_id': 1}]
+    assert count('delivered') == n_delivered + 1
+    assert count('rejected') == n_rejected + 1
+    assert CALLBACK_RETRIES._value.get() == n_retries + 2
+
+
+def test_gives_up_after_max_attempts():
+    receiver = Receiver(statuses=[500] * 3)
+    n_failed = count('failed')
+
+    async def test(callbacks, url):
+        callbacks.post(url, {'job_id': 1}, 'job 1')
+
+    run(receiver, test, max_attempts=3, max_backoff=0.01)
+    assert receiver.bodies == []
+    assert receiver.statuses == []
+    assert count('failed') == n_failed + 1
+
+
+def test_job_callbacks_are_coalesced_per_batch():
+    receiver = Receiver()
+
+    async def test(callbacks, url):
+        for batch_id in (1, 2):
+            for job_id in range(1, 6):
+                callbacks.post_job(url, batch_id, {'batch_id': batch_id, 'job_id': job_id})
+        await asyncio.sleep(0.1)
+
+    run(receiver, test, coalesce_delay=0.05, max_coalesced=3)
+    bodies = sorted(receiver.bodies, key=lambda body: (body['batch_id'], len(body['jobs'])))
+    assert [(body['batch_id'], len(body['jobs'])) for body in bodies] == [(1, 2), (1, 3), (2, 2), (2, 3)]
+    for batch_id in (1, 2):
+        jobs = [job for body in bodies if body['batch_id'] == batch_id for job in body['jobs']]
+        assert sorted(job['job_id'] for job in jobs) == list(range(1, 6))
@@ -74,6 +74,17 @@ def test_dag(client):
         assert status['exit_code']['main'] == 0
 
 
+def test_wide_dag(client):
+    batch = client.create_batch()
+    heads = [batch.create_job('alpine:3.8', command=['echo', f'head{i}']) for i in range(4)]
+    tails = [batch.create_job('alpine:3.8', command=['echo', f'tail{i}'], parents=heads) for i in range(4)]
+    batch = batch.submit()
+    status = batch.wait()
+    assert batch_status_job_counter(status, 'Success') == 8, status
+    for node in heads + tails:
+        assert node.status()['state'] == 'Success'
+
+
 def test_cancel_tail(client):
     batch = client.create_batch()
     head = batch.create_job('alpine:3.8', command=['echo', 'head'])
@@ -160,6 +171,42 @@ def test_callback(client):
             server.join()
 
 
+def test_coalesced_callback(client):
+    from flask import Flask, request
+    app = Flask('test-client')
+    output = []
+
+    @app.route('/test', methods=['POST'])
+    def test():
+        output.append(request.get_json())
+        return Response(status=200)
+
+    try:
+        server = ServerThread(app)
+        server.start()
+        batch = client.create_batch(callback=server.url_for('/test'), coalesce_callbacks=True)
+        jobs = [batch.create_job('alpine:3.8', command=['echo', str(i)]) for i in range(4)]
+        batch = batch.submit()
+        batch_status = batch.wait()
+
+        i = 0
+        while sum(len(body['jobs']) for body in output) != 4:
+            time.sleep(0.100 * (3/2) ** i)
+            i += 1
+            if i > 14:
+                break
+
+        assert all(body['batch_id'] == batch.id for body in output), output
+        job_results = [job_result for body in output for job_result in body['jobs']]
+        assert (sorted(job_result['job_id'] for job_result in job_results)
+                == sorted(j.job_id for j in jobs)), (output, batch_status)
+        assert all(job_result['state'] == 'Success' for job_result in job_results), (output, batch_status)
+    finally:
+        if server:
+            server.shutdown()
+            server.join()
+
+
 def test_no_parents_allowed_in_other_batches(client):
     b1 = client.create_batch()
     b2 = client.create_batch()
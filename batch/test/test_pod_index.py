@@ -0,0 +1,172 @@
+import asyncio
+import logging
+
+import kubernetes as kube
+
+from batch.pod_index import PodIndex
+
+log = logging.getLogger('test_pod_index')
+
+
+class FakeK8s:
+    """Serves pod lists and watches from an in-memory event history, like
+    the Kubernetes API does from etcd."""
+
+    def __init__(self):
+        self.version = 0
+        self.pods = {}
+        self.events = []
+        self.compacted_version = 0
+        self.paused = False
+        self.n_lists = 0
+        self.watch_versions = []
+
+    def put_pod(self, name, phase):
+        self.version += 1
+        pod = kube.client.V1Pod(
+            metadata=kube.client.V1ObjectMeta(name=name, resource_version=str(self.version)),
+            status=kube.client.V1PodStatus(phase=phase))
+        event_type = 'MODIFIED' if name in self.pods else 'ADDED'
+        self.pods[name] = pod
+        self.events.append((self.version, event_type, pod))
+
+    def delete_pod(self, name):
+        self.version += 1
+        pod = self.pods.pop(name)
+        pod = kube.client.V1Pod(
+            metadata=kube.client.V1ObjectMeta(name=name, resource_version=str(self.version)),
+            status=pod.status)
+        self.events.append((self.version, 'DELETED', pod))
+
+    def compact(self):
+        self.compacted_version = self.version
+        self.events = []
+
+    async def list_pods(self, label_selector):
+        self.n_lists += 1
+        return (kube.client.V1PodList(
+            items=list(self.pods.values()),
+            metadata=kube.client.V1ListMeta(resource_version=str(self.version))), None)
+
+    async def watch_pods(self, resource_version, timeout_seconds, label_selector):
+        self.watch_versions.append(resource_version)
+        version = int(resource_version)
+        deadline = asyncio.get_event_loop().time() + timeout_seconds
+        while asyncio.get_event_loop().time() < deadline:
+            if not self.paused:
+                if version < self.compacted_version:
+                    raise kube.client.rest.ApiException(status=410, reason='Gone')
+                for event_version, event_type, pod in self.events:
+                    if event_version > version:
+                        version = event_version
+                        yield {'type': event_type, 'object': pod}
+            await asyncio.sleep(0.001)
+
+
+class Recorder:
+    def __init__(self):
+        self.pod_events = []
+        self.relists = []
+
+    async def pod_changed(self, pod):
+        self.pod_events.append((pod.metadata.name, pod.status.phase))
+
+    async def pods_changed(self, pods):
+        self.relists.append(sorted(pod.metadata.name for pod in pods))
+
+
+async def wait_until(condition):
+    for _ in range(1000):
+        if condition():
+            return
+        await asyncio.sleep(0.001)
+    assert False, 'timed out'
+
+
+def run(test):
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(test())
+    finally:
+        loop.close()
+
+
+def test_watch_keeps_index_current_without_relisting():
+    async def test():
+        k8s = FakeK8s()
+        k8s.put_pod('a', 'Pending')
+        k8s.put_pod('b', 'Running')
+        index = PodIndex(k8s, 'app=batch-job', log, watch_timeout=0.05)
+        recorder = Recorder()
+        task = asyncio.ensure_future(index.run(recorder.pod_changed, recorder.pods_changed))
+        try:
+            await wait_until(lambda: index.synced)
+            assert recorder.relists == [['a', 'b']]
+
+            k8s.put_pod('a', 'Running')
+            k8s.put_pod('c', 'Pending')
+            k8s.delete_pod('b')
+            await wait_until(lambda: len(recorder.pod_events) == 3)
+
+            assert recorder.pod_events == [('a', 'Running'), ('c', 'Pending'), ('b', 'Running')]
+            assert sorted(index.pods) == ['a', 'c']
+            assert index.resource_version == str(k8s.version)
+
+            # watches time out and resume from the last version seen
+            await wait_until(lambda: len(k8s.watch_versions) >= 3)
+            assert k8s.watch_versions[0] == '2'
+            assert k8s.watch_versions[-1] == str(k8s.version)
+            assert k8s.n_lists == 1
+        finally:
+            task.cancel()
+
+    run(test)
+
+
+def test_expired_version_relists_and_reports_changes():
+    async def test():
+        k8s = FakeK8s()
+        for name in ['a', 'b', 'c']:
+            k8s.put_pod(name, 'Running')
+        index = PodIndex(k8s, 'app=batch-job', log, watch_timeout=0.05)
+        recorder = Recorder()
+        task = asyncio.ensure_future(index.run(recorder.pod_changed, recorder.pods_changed))
+        try:
+            await wait_until(lambda: index.synced)
+
+            k8s.paused = True
+            k8s.put_pod('a', 'Succeeded')
+            k8s.delete_pod('b')
+            k8s.put_pod('d', 'Pending')
+            k8s.compact()
+            k8s.paused = False
+
+            await wait_until(lambda: len(recorder.relists) == 2)
+            assert recorder.relists[1] == ['a', 'd']
+            assert recorder.pod_events == []
+            assert sorted(index.pods) == ['a', 'c', 'd']
+            assert k8s.n_lists == 2
+
+            k8s.put_pod('c', 'Succeeded')
+            await wait_until(lambda: recorder.pod_events == [('c', 'Succeeded')])
+        finally:
+            task.cancel()
+
+    run(test)
+
+
+def test_periodic_relist():
+    async def test():
+        k8s = FakeK8s()
+        k8s.put_pod('a', 'Running')
+        index = PodIndex(k8s, 'app=batch-job', log, relist_interval=0, watch_timeout=0.01)
+        recorder = Recorder()
+        task = asyncio.ensure_future(index.run(recorder.pod_changed, recorder.pods_changed))
+        try:
+            await wait_until(lambda: len(recorder.relists) >= 3)
+            # unchanged pods are not reported again
+            assert recorder.relists[:3] == [['a'], [], []]
+        finally:
+            task.cancel()
+
+    run(test)
@@ -1,11 +1,14 @@
 import abc
+import asyncio
+import hashlib
 import os.path
 import json
+import time
 from shlex import quote as shq
 import yaml
 import jinja2
 from .log import log
-from .utils import flatten, generate_token
+from .utils import CalledProcessError, check_shell_output, flatten, generate_token
 from .constants import BUCKET
 from .environment import GCP_PROJECT, DOMAIN, IP, CI_UTILS_IMAGE
 
@@ -37,6 +40,62 @@ def get_namespace(value, config):
     return v['name']
 
 
+# fingerprinted images are reused by test builds for one period of this
+# many days, and untagged once they were pushed two periods ago, so builds
+# that started in the previous period can still pull them
+IMAGE_RETENTION_DAYS = 7
+
+
+def image_period():
+    return int(time.time() // (IMAGE_RETENTION_DAYS * 24 * 60 * 60))
+
+
+def fingerprint(inputs):
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+async def git_object_hash(repo_dir, path):
+    """Hash of the tree or file at `path` in the commit checked out in `repo_dir`."""
+    path = os.path.normpath(path)
+    if path == '.':
+        path = ''
+    out, _ = await check_shell_output(f'git -C {shq(repo_dir)} rev-parse {shq(f"HEAD:{path}")}')
+    return out.decode('utf-8').strip()
+
+
+def render_template(s, config):
+    template = jinja2.Template(s, undefined=jinja2.StrictUndefined, trim_blocks=True, lstrip_blocks=True)
+    return template.render(**config)
+
+
+async def successful_steps(batch_client, attributes, max_batches=20):
+    """Returns the fingerprints of the steps that succeeded in the latest
+    `max_batches` batches with `attributes`, mapped to the token of the batch
+    whose artifacts hold their outputs."""
+    # batches are listed newest first, so this reads the first page only
+    batches = []
+    async for batch in batch_client.batches(attributes=attributes):
+        batches.append(batch)
+        if len(batches) == max_batches:
+            break
+
+    async def batch_steps(batch):
+        return [j async for j in batch.jobs()
+                if j['state'] == 'Success' and 'fingerprint' in (j.get('attributes') or {})]
+
+    steps = {}
+    for batch, jobs in zip(batches, await asyncio.gather(*[batch_steps(b) for b in batches])):
+        for j in jobs:
+            fp = j['attributes']['fingerprint']
+            if fp not in steps:
+                steps[fp] = {
+                    'token': batch.attributes['token'],
+                    'batch_id': batch.id,
+                    'job_id': j['job_id']
+                }
+    return steps
+
+
 class Code(abc.ABC):
     @abc.abstractmethod
     def short_str(self):
@@ -74,7 +133,21 @@ class BuildConfiguration:
             self.steps.append(step)
             name_step[step.name] = step
 
+    async def find_cached_steps(self, code, cache):
+        """Computes the fingerprints of the steps of a test build and marks
+        the steps whose fingerprint is in `cache`, as returned by
+        :func:`successful_steps`, as cached.  Deploys do not call this, so
+        they always run every step.
+        """
+        for step in self.steps:
+            if step.scopes is None or 'test' in step.scopes:
+                step.fingerprint = await step.compute_fingerprint(code, False)
+                if cache and step.fingerprint in cache:
+                    step.cached = cache[step.fingerprint]
+
     def build(self, batch, code, deploy):
+        """Adds the jobs of the steps to `batch`, except those of cached
+        steps, whose outputs are reused."""
         if deploy:
             scope = 'deploy'
         else:
@@ -82,7 +155,11 @@ class BuildConfiguration:
 
         for step in self.steps:
             if step.scopes is None or scope in step.scopes:
-                step.build(batch, code, deploy)
+                if step.cached:
+                    log.info(f'step {step.name} is cached by batch {step.cached["batch_id"]} '
+                             f'job {step.cached["job_id"]}')
+                else:
+                    step.build(batch, code, deploy)
 
         parents = set()
         for step in self.steps:
@@ -98,6 +175,9 @@ class BuildConfiguration:
             if step.scopes is None or scope in step.scopes:
                 step.cleanup(batch, deploy, sink)
 
+        if any(isinstance(step, BuildImageStep) and step.fingerprint is not None for step in self.steps):
+            BuildImageStep.cleanup_expired_images(batch, sink)
+
 
 class Step(abc.ABC):
     def __init__(self, params):
@@ -111,6 +191,10 @@ class Step(abc.ABC):
         self.scopes = json.get('scopes')
 
         self.token = generate_token()
+        # hash of the inputs of the step, None if it cannot be reused
+        self.fingerprint = None
+        # the successful step of a previous build with the same fingerprint
+        self.cached = None
 
     def input_config(self, code, deploy):
         config = {}
@@ -132,6 +216,40 @@ class Step(abc.ABC):
             return None
         return flatten([d.wrapped_job() for d in self.deps])
 
+    def deps_fingerprints(self):
+        if not self.deps:
+            return []
+        fingerprints = [d.fingerprint for d in self.deps]
+        if any(fp is None for fp in fingerprints):
+            return None
+        return fingerprints
+
+    def input_token(self, batch, path):
+        """Token of the batch whose artifacts hold the output `path` of a
+        dependency of this step."""
+        visited = set()
+        deps = list(self.deps or [])
+        while deps:
+            d = deps.pop()
+            if d.name in visited:
+                continue
+            visited.add(d.name)
+            if d.cached and any(o['to'] == path for o in getattr(d, 'outputs', None) or []):
+                return d.cached['token']
+            deps.extend(d.deps or [])
+        return batch.attributes['token']
+
+    def job_attributes(self):
+        attributes = {'name': self.name}
+        if self.fingerprint is not None:
+            attributes['fingerprint'] = self.fingerprint
+        return attributes
+
+    async def compute_fingerprint(self, code, deploy):  # pylint: disable=unused-argument,no-self-use
+        """Returns a hash of the inputs of the step, or None if the step
+        must always run."""
+        return None
+
     @staticmethod
     def from_json(params):
         kind = params.json['kind']
@@ -163,9 +281,13 @@ class BuildImageStep(Step):
             self.base_image = f'gcr.io/{GCP_PROJECT}/{self.publish_as}'
         else:
             self.base_image = f'gcr.io/{GCP_PROJECT}/ci-intermediate'
-        self.image = f'{self.base_image}:{self.token}'
         self.job = None
 
+    @property
+    def image(self):
+        # images of fingerprinted steps are kept for later builds to reuse
+        return f'{self.base_image}:{self.fingerprint or self.token}'
+
     def wrapped_job(self):
         if self.job:
             return [self.job]
@@ -186,11 +308,34 @@ class BuildImageStep(Step):
             'image': self.image
         }
 
+    async def compute_fingerprint(self, code, deploy):
+        deps_fingerprints = self.deps_fingerprints()
+        if deps_fingerprints is None:
+            return None
+        try:
+            with open(f'{code.repo_dir()}/{self.dockerfile}', 'r', encoding='utf-8') as f:
+                dockerfile = render_template(f.read(), self.input_config(code, deploy))
+            if self.context_path:
+                context = await git_object_hash(code.repo_dir(), self.context_path)
+            else:
+                context = None
+        except (OSError, UnicodeDecodeError, jinja2.TemplateError, CalledProcessError) as e:
+            log.info(f'step {self.name} cannot be cached due to {e}')
+            return None
+        return fingerprint({
+            'kind': 'buildImage',
+            'period': image_period(),
+            'dockerfile': dockerfile,
+            'context': context,
+            'inputs': self.inputs,
+            'deps': deps_fingerprints
+        })
+
     def build(self, batch, code, deploy):
         if self.inputs:
             input_files = []
             for i in self.inputs:
-                input_files.append((f'{BUCKET}/build/{batch.attributes["token"]}{i["from"]}', f'/io/{os.path.basename(i["to"])}'))
+                input_files.append((f'{BUCKET}/build/{self.input_token(batch, i["from"])}{i["from"]}', f'/io/{os.path.basename(i["to"])}'))
         else:
             input_files = None
 
@@ -301,13 +446,13 @@ date
                                             'cpu': '1'
                                         }
                                     },
-                                    attributes={'name': self.name},
+                                    attributes=self.job_attributes(),
                                     volumes=volumes,
                                     input_files=input_files,
                                     parents=self.deps_parents())
 
     def cleanup(self, batch, deploy, sink):
-        if deploy and self.publish_as:
+        if (deploy and self.publish_as) or self.fingerprint is not None:
             return
 
         volumes = [{
@@ -345,11 +490,57 @@ true
                                     parents=[sink],
                                     always_run=True)
 
+    @staticmethod
+    def cleanup_expired_images(batch, sink):
+        """Untags the images of fingerprinted steps pushed more than two
+        periods ago, which no build reuses any more."""
+        volumes = [{
+            'volume': {
+                'name': 'gcr-push-service-account-key',
+                'secret': {
+                    'optional': False,
+                    'secretName': 'gcr-push-service-account-key'
+                }
+            },
+            'volume_mount': {
+                'mountPath': '/secrets/gcr-push-service-account-key',
+                'name': 'gcr-push-service-account-key',
+                'readOnly': True
+            }
+        }]
+
+        image = f'gcr.io/{GCP_PROJECT}/ci-intermediate'
+        expired = f'timestamp.datetime < -P{2 * IMAGE_RETENTION_DAYS}D'
+        script = f'''
+set -x
+date
+
+gcloud -q auth activate-service-account \
+  --key-file=/secrets/gcr-push-service-account-key/gcr-push-service-account-key.json
+
+for tag in $(gcloud -q container images list-tags {shq(image)} --limit=unlimited \
+               --filter={shq(expired)} --format='value(tags)' \
+             | tr ';,' '\\n\\n' | grep -E '^[0-9a-f]{{64}}$'); do
+  gcloud -q container images untag {shq(image)}:$tag
+done
+
+date
+true
+'''
+
+        batch.create_job(CI_UTILS_IMAGE,
+                         command=['bash', '-c', script],
+                         attributes={'name': 'cleanup_expired_images'},
+                         volumes=volumes,
+                         parents=[sink],
+                         always_run=True)
+
 
 class RunImageStep(Step):
     def __init__(self, params, image, script, inputs, outputs, resources, service_account, secrets, always_run):  # pylint: disable=unused-argument
         super().__init__(params)
-        self.image = expand_value_from(image, self.input_config(params.code, params.deploy))
+        # the image of a dependency is known once it is built
+        self.image = image
         self.script = script
         self.inputs = inputs
         self.outputs = outputs
@@ -382,16 +573,39 @@ class RunImageStep(Step):
             'token': self.token
         }
 
+    async def compute_fingerprint(self, code, deploy):
+        # secrets, service accounts and cleanup steps act on the world
+        if self.secrets or self.service_account or self.always_run:
+            return None
+        deps_fingerprints = self.deps_fingerprints()
+        if deps_fingerprints is None:
+            return None
+        config = self.input_config(code, deploy)
+        try:
+            rendered_script = render_template(self.script, config)
+        except jinja2.TemplateError as e:
+            log.info(f'step {self.name} cannot be cached due to {e}')
+            return None
+        return fingerprint({
+            'kind': 'runImage',
+            'image': expand_value_from(self.image, config),
+            'script': rendered_script,
+            'inputs': self.inputs,
+            'outputs': self.outputs,
+            'resources': self.resources,
+            'deps': deps_fingerprints
+        })
+
     def build(self, batch, code, deploy):
-        template = jinja2.Template(self.script, undefined=jinja2.StrictUndefined, trim_blocks=True, lstrip_blocks=True)
-        rendered_script = template.render(**self.input_config(code, deploy))
+        config = self.input_config(code, deploy)
+        rendered_script = render_template(self.script, config)
 
         log.info(f'step {self.name}, rendered script:\n{rendered_script}')
 
         if self.inputs:
             input_files = []
             for i in self.inputs:
-                input_files.append((f'{BUCKET}/build/{batch.attributes["token"]}{i["from"]}', i["to"]))
+                input_files.append((f'{BUCKET}/build/{self.input_token(batch, i["from"])}{i["from"]}', i["to"]))
         else:
             input_files = None
 
@@ -422,10 +636,10 @@ class RunImageStep(Step):
                 })
 
         self.job = batch.create_job(
-            self.image,
+            expand_value_from(self.image, config),
             command=['bash', '-c', rendered_script],
             resources=self.resources,
-            attributes={'name': self.name},
+            attributes=self.job_attributes(),
             input_files=input_files,
             output_files=output_files,
             volumes=volumes,
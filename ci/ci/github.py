@@ -11,7 +11,7 @@ from .log import log
 from .constants import GITHUB_CLONE_URL, AUTHORIZED_USERS
 from .environment import SELF_HOSTNAME
 from .utils import check_shell, check_shell_output
-from .build import BuildConfiguration, Code
+from .build import BuildConfiguration, Code, successful_steps
 
 repos_lock = asyncio.Lock()
 
@@ -333,6 +333,21 @@ mkdir -p {shq(repo_dir)}
                     'target_sha': self.target_branch.sha
                 },
                 callback=f'http://{SELF_HOSTNAME}/api/v1alpha/batch_callback')
+
+            try:
+                cache = await successful_steps(
+                    batch_client,
+                    attributes={
+                        'test': '1',
+                        'target_branch': self.target_branch.branch.short_str()
+                    })
+            except concurrent.futures.CancelledError:
+                raise
+            except Exception as e:  # pylint: disable=broad-except
+                log.exception(f'could not find the steps of previous builds due to {e}, running every step')
+                cache = None
+
+            await config.find_cached_steps(self, cache)
             config.build(batch, self, deploy=False)
             batch = await batch.submit()
             self.batch = batch
@@ -0,0 +1,261 @@
+import asyncio
+import os
+import subprocess
+import tempfile
+
+import hailtop.gear.auth as hj
+
+
+def secret_file(contents):
+    with tempfile.NamedTemporaryFile('wb', delete=False) as f:
+        f.write(contents)
+    return f.name
+
+
+# the configuration ci reads when imported
+secret_key = hj.JWTClient.generate_key()
+os.environ.setdefault('HAIL_JWT_SECRET_KEY_FILE', secret_file(secret_key))
+os.environ.setdefault('HAIL_TOKEN_FILE', secret_file(
+    hj.JWTClient(secret_key).encode({'bucket_name': 'ci-test-bucket'}).encode('utf-8')))
+os.environ.setdefault('HAIL_CI_OAUTH_TOKEN', secret_file(b'oauth-token'))
+os.environ.setdefault('HAIL_WATCHED_BRANCHES', '[]')
+os.environ.setdefault('HAIL_GCP_PROJECT', 'test-project')
+os.environ.setdefault('HAIL_DOMAIN', 'hail.is')
+os.environ.setdefault('HAIL_IP', '127.0.0.1')
+os.environ.setdefault('HAIL_CI_UTILS_IMAGE', 'ci-utils')
+os.environ.setdefault('HAIL_SELF_HOSTNAME', 'ci')
+
+from ci.build import BuildConfiguration, Code, image_period, successful_steps  # noqa: E402 pylint: disable=wrong-import-position
+
+BUILD_YAML = '''
+steps:
+ - kind: createNamespace
+   name: default_ns
+   namespaceName: default
+ - kind: buildImage
+   name: base_image
+   dockerFile: docker/Dockerfile.base
+   contextPath: docker
+ - kind: buildImage
+   name: service_image
+   dockerFile: service/Dockerfile
+   contextPath: service
+   dependsOn:
+    - base_image
+ - kind: runImage
+   name: build_service
+   image:
+     valueFrom: base_image.image
+   script: |
+     make
+   outputs:
+    - from: /io/service.jar
+      to: /service.jar
+   dependsOn:
+    - base_image
+ - kind: runImage
+   name: test_service
+   image:
+     valueFrom: service_image.image
+   script: |
+     make test
+   inputs:
+    - from: /service.jar
+      to: /io/service.jar
+   dependsOn:
+    - service_image
+    - build_service
+ - kind: runImage
+   name: create_accounts
+   image:
+     valueFrom: base_image.image
+   script: |
+     kubectl -n {{ default_ns.name }} create secret generic jwt
+   serviceAccount: ci-agent
+   dependsOn:
+    - default_ns
+    - base_image
+'''
+
+
+class FakeCode(Code):
+    def __init__(self, repo_dir):
+        self._repo_dir = repo_dir
+
+    def short_str(self):
+        return 'pr-1'
+
+    def config(self):
+        sha = subprocess.check_output(['git', '-C', self._repo_dir, 'rev-parse', 'HEAD']).decode('utf-8').strip()
+        return {'checkout_script': 'true', 'sha': sha}
+
+    def repo_dir(self):
+        return self._repo_dir
+
+    def checkout_script(self):
+        return 'true'
+
+
+class FakeJob:
+    def __init__(self, job_id, image, attributes, input_files, parents):
+        self.job_id = job_id
+        self.image = image
+        self.attributes = attributes
+        self.input_files = input_files
+        self.parents = parents
+
+
+class FakeBatch:
+    def __init__(self, id, token):
+        self.id = id
+        self.attributes = {'token': token}
+        self.created = []
+
+    def create_job(self, image, attributes=None, input_files=None, parents=None, **kwargs):
+        job = FakeJob(len(self.created) + 1, image, attributes, input_files, parents)
+        self.created.append(job)
+        return job
+
+    def step_jobs(self):
+        return {j.attributes['name']: j for j in self.created if not j.attributes['name'].startswith('cleanup_')}
+
+    async def jobs(self):
+        for j in self.created:
+            yield {'batch_id': self.id, 'job_id': j.job_id, 'state': 'Success', 'attributes': j.attributes}
+
+
+class FakeBatchClient:
+    def __init__(self, batches):
+        self._batches = batches
+        self.n_listed = 0
+
+    async def batches(self, complete=None, success=None, attributes=None):
+        for batch in sorted(self._batches, key=lambda b: b.id, reverse=True):
+            self.n_listed += 1
+            yield batch
+
+
+def commit(repo_dir, path, contents):
+    os.makedirs(os.path.dirname(os.path.join(repo_dir, path)), exist_ok=True)
+    with open(os.path.join(repo_dir, path), 'w', encoding='utf-8') as f:
+        f.write(contents)
+    subprocess.check_call(['git', '-C', repo_dir, 'add', path])
+    subprocess.check_call(['git', '-C', repo_dir, '-c', 'user.name=ci', '-c', 'user.email=ci@hail.is',
+                           'commit', '-q', '-m', f'update {path}'])
+
+
+def create_repo():
+    repo_dir = tempfile.mkdtemp()
+    subprocess.check_call(['git', 'init', '-q', repo_dir])
+    commit(repo_dir, 'docker/Dockerfile.base', 'FROM ubuntu:18.04\n')
+    commit(repo_dir, 'service/Dockerfile', 'FROM {{ base_image.image }}\nCOPY . /service\n')
+    commit(repo_dir, 'service/main.py', 'print("hello")\n')
+    return repo_dir
+
+
+def run(coro):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+
+def build(repo_dir, batch, previous_batches):
+    code = FakeCode(repo_dir)
+    cache = run(successful_steps(FakeBatchClient(previous_batches), {'test': '1'}))
+    config = BuildConfiguration(code, BUILD_YAML, deploy=False)
+    run(config.find_cached_steps(code, cache))
+    config.build(batch, code, deploy=False)
+    return {step.name: step for step in config.steps}
+
+
+def test_unchanged_steps_are_reused():
+    repo_dir = create_repo()
+    first = FakeBatch(1, 'first')
+    build(repo_dir, first, [])
+    assert set(first.step_jobs()) == {'default_ns', 'base_image', 'service_image', 'build_service',
+                                      'test_service', 'create_accounts', 'sink'}
+
+    second = FakeBatch(2, 'second')
+    steps = build(repo_dir, second, [first])
+    # steps with side effects always run
+    assert set(second.step_jobs()) == {'default_ns', 'create_accounts', 'sink'}
+    # reused images are the ones built by the first build
+    assert steps['service_image'].image == first.step_jobs()['test_service'].image
+    assert second.step_jobs()['create_accounts'].image == first.step_jobs()['build_service'].image
+
+
+def test_changed_context_rebuilds_dependents():
+    repo_dir = create_repo()
+    first = FakeBatch(1, 'first')
+    build(repo_dir, first, [])
+
+    commit(repo_dir, 'service/main.py', 'print("hello, world")\n')
+    second = FakeBatch(2, 'second')
+    steps = build(repo_dir, second, [first])
+    jobs = second.step_jobs()
+    assert 'base_image' not in jobs and 'build_service' not in jobs
+    assert {'service_image', 'test_service'} <= set(jobs)
+    assert jobs['test_service'].image == steps['service_image'].image
+    # the output of the reused step is read from the artifacts of the first build
+    assert jobs['test_service'].input_files == [('gs://ci-test-bucket/build/first/service.jar', '/io/service.jar')]
+
+
+def test_failed_steps_are_not_reused():
+    repo_dir = create_repo()
+    first = FakeBatch(1, 'first')
+    build(repo_dir, first, [])
+
+    async def failed_jobs():
+        for j in first.created:
+            yield {'batch_id': first.id, 'job_id': j.job_id, 'state': 'Failed', 'attributes': j.attributes}
+    first.jobs = failed_jobs
+
+    second = FakeBatch(2, 'second')
+    build(repo_dir, second, [first])
+    assert set(second.step_jobs()) == set(first.step_jobs())
+
+
+def test_deploys_run_every_step():
+    repo_dir = create_repo()
+    first = FakeBatch(1, 'first')
+    build(repo_dir, first, [])
+
+    code = FakeCode(repo_dir)
+    deploy = FakeBatch(2, 'deploy')
+    config = BuildConfiguration(code, BUILD_YAML, deploy=True)
+    config.build(deploy, code, deploy=True)
+    assert set(deploy.step_jobs()) == set(first.step_jobs())
+    assert all('fingerprint' not in j.attributes for j in deploy.created)
+
+
+def test_only_latest_batches_are_read():
+    repo_dir = create_repo()
+    first = FakeBatch(1, 'first')
+    build(repo_dir, first, [])
+    commit(repo_dir, 'service/main.py', 'print("hello, world")\n')
+    second = FakeBatch(2, 'second')
+    steps = build(repo_dir, second, [first])
+
+    client = FakeBatchClient([first, second])
+    cache = run(successful_steps(client, {'test': '1'}, max_batches=1))
+    assert client.n_listed == 1
+    # the steps reused by the second build are not in its batch
+    assert set(cache) == {steps['service_image'].fingerprint, steps['test_service'].fingerprint}
+    assert {step['token'] for step in cache.values()} == {'second'}
+
+
+def test_images_expire_after_a_period(monkeypatch):
+    repo_dir = create_repo()
+    first = FakeBatch(1, 'first')
+    build(repo_dir, first, [])
+    cleanup = [j for j in first.created if j.attributes['name'] == 'cleanup_expired_images']
+    assert len(cleanup) == 1 and cleanup[0].parents == [first.step_jobs()['sink']]
+
+    # the next period rebuilds the images, so the old ones can be untagged
+    period = image_period()
+    monkeypatch.setattr('ci.build.image_period', lambda: period + 1)
+    second = FakeBatch(2, 'second')
+    build(repo_dir, second, [first])
+    assert {'base_image', 'service_image'} <= set(second.step_jobs())
@@ -1,4 +1,5 @@
 import abc
+import collections
 import os
 
 from hail.utils.java import *
@@ -7,6 +8,9 @@ from hail.expr.table_type import *
 from hail.expr.matrix_type import *
 from hail.expr.blockmatrix_type import *
 from hail.ir.renderer import Renderer
+from hail.ir.base_ir import BaseIR
+from hail.ir.ir import NDArrayWrite, TableWrite, MatrixWrite, MatrixMultiWrite, BlockMatrixWrite, \
+    BlockMatrixMultiWrite, MatrixToValueApply
 from hail.table import Table
 from hail.matrixtable import MatrixTable
 
@@ -15,6 +19,24 @@ import requests
 import pyspark
 
 
+def _binary_results_mode(typ):
+    # binary_results='numpy' also returns numeric arrays as NumPy arrays
+    from hail.experimental.codec import can_decode
+    mode = Env.hc()._jhc.flags().get('binary_results')
+    if mode is not None and can_decode(typ):
+        return mode
+    return None
+
+
+def _execute_encoded(jbackend, jir, typ, timed, mode):
+    from hail.experimental.codec import decode_unblocked_uncompressed
+    result = jbackend.executeEncode(jir, 'unblockedUncompressed')
+    value = decode_unblocked_uncompressed(typ, result._2(), numpy_arrays=(mode == 'numpy'))
+    timings = json.loads(result._3())
+
+    return (value, timings) if timed else value
+
+
 class Backend(abc.ABC):
     @abc.abstractmethod
     def execute(self, ir, timed=False):
@@ -99,12 +121,16 @@ class SparkBackend(Backend):
 
     def _to_java_ir(self, ir):
         if not hasattr(ir, '_jir'):
-            r = Renderer(stop_at_jir=True)
+            r = Renderer(stop_at_jir=True, cse=True)
             # FIXME parse should be static
             ir._jir = ir.parse(r(ir), ir_map=r.jirs)
         return ir._jir
 
     def execute(self, ir, timed=False):
+        binary_mode = _binary_results_mode(ir.typ)
+        if binary_mode is not None:
+            return _execute_encoded(Env.hc()._jhc.backend(), self._to_java_ir(ir), ir.typ, timed, binary_mode)
+
         result = json.loads(Env.hc()._jhc.backend().executeJSON(self._to_java_ir(ir)))
         value = ir.typ._from_json(result['value'])
         timings = result['timings']
@@ -193,12 +219,16 @@ class LocalBackend(Backend):
 
     def _to_java_ir(self, ir):
         if not hasattr(ir, '_jir'):
-            r = Renderer(stop_at_jir=True)
+            r = Renderer(stop_at_jir=True, cse=True)
             # FIXME parse should be static
             ir._jir = ir.parse(r(ir), ir_map=r.jirs)
         return ir._jir
 
     def execute(self, ir, timed=False):
+        binary_mode = _binary_results_mode(ir.typ)
+        if binary_mode is not None:
+            return _execute_encoded(Env.hail().expr.ir.LocalBackend, self._to_java_ir(ir), ir.typ, timed, binary_mode)
+
         result = json.loads(Env.hail().expr.ir.LocalBackend.executeJSON(self._to_java_ir(ir)))
         value = ir.typ._from_json(result['value'])
         timings = result['timings']
@@ -206,7 +236,14 @@ class LocalBackend(Backend):
 
 
 class ServiceBackend(Backend):
-    def __init__(self, url, token=None, token_file=None):
+    _type_parsers = {
+        'value': dtype,
+        'table': ttable._from_json,
+        'matrix': tmatrix._from_json,
+        'blockmatrix': tblockmatrix._from_json
+    }
+
+    def __init__(self, url, token=None, token_file=None, type_cache_size=1024):
         if token_file is not None and token is not None:
             raise ValueError('set only one of token_file and token')
         self.url = url
@@ -222,6 +259,11 @@ class ServiceBackend(Backend):
             with open(token_file) as f:
                 token = f.read()
         self.cookies = {'user': token}
+        self._session = requests.Session()
+
+        # (kind, rendered IR) to type, least recently used first
+        self._type_cache = collections.OrderedDict()
+        self._type_cache_size = type_cache_size
 
         self._fs = None
 
@@ -233,13 +275,36 @@ class ServiceBackend(Backend):
         return self._fs
 
     def _render(self, ir):
-        r = Renderer()
+        r = Renderer(cse=True)
         assert len(r.jirs) == 0
         return r(ir)
 
+    _writers = (NDArrayWrite, TableWrite, MatrixWrite, MatrixMultiWrite, BlockMatrixWrite, BlockMatrixMultiWrite)
+    _writing_functions = {'MatrixWriteBlockMatrix', 'MatrixExportEntriesByCol'}
+
+    @staticmethod
+    def _writes(ir):
+        visited = set()
+        stack = [ir]
+        while stack:
+            x = stack.pop()
+            if isinstance(x, ServiceBackend._writers):
+                return True
+            if isinstance(x, MatrixToValueApply) and x.config['name'] in ServiceBackend._writing_functions:
+                return True
+            for c in x.children:
+                if isinstance(c, BaseIR) and id(c) not in visited:
+                    visited.add(id(c))
+                    stack.append(c)
+        return False
+
     def execute(self, ir, timed=False):
         code = self._render(ir)
-        resp = requests.post(f'{self.url}/execute', json=code, cookies=self.cookies)
+        if ServiceBackend._writes(ir):
+            # cached types are keyed by path, and those of the paths
+            # written may change
+            self._type_cache.clear()
+        resp = self._session.post(f'{self.url}/execute', json=code, cookies=self.cookies)
         if resp.status_code == 400:
             resp_json = resp.json()
             raise FatalError(resp_json['message'])
@@ -253,41 +318,54 @@ class ServiceBackend(Backend):
 
         return (value, timings) if timed else value
 
+    def _cached_type(self, key):
+        typ = self._type_cache.get(key)
+        if typ is not None:
+            self._type_cache.move_to_end(key)
+        return typ
+
+    def _cache_type(self, key, typ):
+        self._type_cache[key] = typ
+        self._type_cache.move_to_end(key)
+        if len(self._type_cache) > self._type_cache_size:
+            self._type_cache.popitem(last=False)
+
     def _request_type(self, ir, kind):
         code = self._render(ir)
-        resp = requests.post(f'{self.url}/type/{kind}', json=code, cookies=self.cookies)
-        if resp.status_code == 400:
-            resp_json = resp.json()
-            raise FatalError(resp_json['message'])
-        resp.raise_for_status()
-
-        return resp.json()
+        key = (kind, code)
+        typ = self._cached_type(key)
+        if typ is None:
+            resp = self._session.post(f'{self.url}/type/{kind}', json=code, cookies=self.cookies)
+            if resp.status_code == 400:
+                resp_json = resp.json()
+                raise FatalError(resp_json['message'])
+            resp.raise_for_status()
+
+            typ = ServiceBackend._type_parsers[kind](resp.json())
+            self._cache_type(key, typ)
+        return typ
 
     def value_type(self, ir):
-        resp = self._request_type(ir, 'value')
-        return dtype(resp)
+        return self._request_type(ir, 'value')
 
     def table_type(self, tir):
-        resp = self._request_type(tir, 'table')
-        return ttable._from_json(resp)
+        return self._request_type(tir, 'table')
 
     def matrix_type(self, mir):
-        resp = self._request_type(mir, 'matrix')
-        return tmatrix._from_json(resp)
+        return self._request_type(mir, 'matrix')
 
     def blockmatrix_type(self, bmir):
-        resp = self._request_type(bmir, 'blockmatrix')
-        return tblockmatrix._from_json(resp)
+        return self._request_type(bmir, 'blockmatrix')
 
     def add_reference(self, config):
-        resp = requests.post(f'{self.url}/references/create', json=config, cookies=self.cookies)
+        resp = self._session.post(f'{self.url}/references/create', json=config, cookies=self.cookies)
         if resp.status_code == 400:
             resp_json = resp.json()
             raise FatalError(resp_json['message'])
         resp.raise_for_status()
 
     def from_fasta_file(self, name, fasta_file, index_file, x_contigs, y_contigs, mt_contigs, par):
-        resp = requests.post(f'{self.url}/references/create/fasta', json={
+        resp = self._session.post(f'{self.url}/references/create/fasta', json={
             'name': name,
             'fasta_file': fasta_file,
             'index_file': index_file,
@@ -302,18 +380,20 @@ class ServiceBackend(Backend):
         resp.raise_for_status()
 
     def remove_reference(self, name):
-        resp = requests.delete(f'{self.url}/references/delete',
-                               json={'name': name},
-                               cookies=self.cookies)
+        resp = self._session.delete(f'{self.url}/references/delete',
+                                    json={'name': name},
+                                    cookies=self.cookies)
         if resp.status_code == 400:
             resp_json = resp.json()
             raise FatalError(resp_json['message'])
         resp.raise_for_status()
+        # cached types may refer to the removed reference
+        self._type_cache.clear()
 
     def get_reference(self, name):
-        resp = requests.get(f'{self.url}/references/get',
-                            json={'name': name},
-                            cookies=self.cookies)
+        resp = self._session.get(f'{self.url}/references/get',
+                                 json={'name': name},
+                                 cookies=self.cookies)
         if resp.status_code == 400:
             resp_json = resp.json()
             raise FatalError(resp_json['message'])
@@ -321,46 +401,46 @@ class ServiceBackend(Backend):
         return resp.json()
 
     def add_sequence(self, name, fasta_file, index_file):
-        resp = requests.post(f'{self.url}/references/sequence/set',
-                             json={'name': name, 'fasta_file': fasta_file, 'index_file': index_file},
-                             cookies=self.cookies)
+        resp = self._session.post(f'{self.url}/references/sequence/set',
+                                  json={'name': name, 'fasta_file': fasta_file, 'index_file': index_file},
+                                  cookies=self.cookies)
         if resp.status_code == 400:
             resp_json = resp.json()
             raise FatalError(resp_json['message'])
         resp.raise_for_status()
 
     def remove_sequence(self, name):
-        resp = requests.delete(f'{self.url}/references/sequence/delete',
-                               json={'name': name},
-                               cookies=self.cookies)
+        resp = self._session.delete(f'{self.url}/references/sequence/delete',
+                                    json={'name': name},
+                                    cookies=self.cookies)
         if resp.status_code == 400:
             resp_json = resp.json()
             raise FatalError(resp_json['message'])
         resp.raise_for_status()
 
     def add_liftover(self, name, chain_file, dest_reference_genome):
-        resp = requests.post(f'{self.url}/references/liftover/add',
-                             json={'name': name, 'chain_file': chain_file,
-                                   'dest_reference_genome': dest_reference_genome},
-                             cookies=self.cookies)
+        resp = self._session.post(f'{self.url}/references/liftover/add',
+                                  json={'name': name, 'chain_file': chain_file,
+                                        'dest_reference_genome': dest_reference_genome},
+                                  cookies=self.cookies)
         if resp.status_code == 400:
             resp_json = resp.json()
             raise FatalError(resp_json['message'])
         resp.raise_for_status()
 
     def remove_liftover(self, name, dest_reference_genome):
-        resp = requests.delete(f'{self.url}/references/liftover/remove',
-                               json={'name': name, 'dest_reference_genome': dest_reference_genome},
-                               cookies=self.cookies)
+        resp = self._session.delete(f'{self.url}/references/liftover/remove',
+                                    json={'name': name, 'dest_reference_genome': dest_reference_genome},
+                                    cookies=self.cookies)
         if resp.status_code == 400:
             resp_json = resp.json()
             raise FatalError(resp_json['message'])
         resp.raise_for_status()
 
     def parse_vcf_metadata(self, path):
-        resp = requests.post(f'{self.url}/parse-vcf-metadata',
-                             json={'path': path},
-                             cookies=self.cookies)
+        resp = self._session.post(f'{self.url}/parse-vcf-metadata',
+                                  json={'path': path},
+                                  cookies=self.cookies)
         if resp.status_code == 400:
             resp_json = resp.json()
             raise FatalError(resp_json['message'])
@@ -1,4 +1,10 @@
+import struct
+
+import numpy as np
+
 from hail.utils.java import Env
+from hail.expr.types import tint32, tint64, tfloat32, tfloat64, tbool, tstr, tcall, \
+    tarray, tset, tdict, tstruct, ttuple, tlocus, tinterval
 
 
 def encode(expression, codec='default'):
@@ -9,3 +15,386 @@ def encode(expression, codec='default'):
 def decode(typ, ptype_string, bytes, codec='default'):
     return typ._from_json(
         Env.hc()._jhc.backend().decodeToJSON(ptype_string, bytes, codec))
+
+
+_int32 = struct.Struct('<i')
+_int64 = struct.Struct('<q')
+_float32 = struct.Struct('<f')
+_float64 = struct.Struct('<d')
+
+_primitive_dtypes = {
+    tint32: (np.dtype('<i4'), 4),
+    tint64: (np.dtype('<i8'), 8),
+    tfloat32: (np.dtype('<f4'), 4),
+    tfloat64: (np.dtype('<f8'), 8),
+    tbool: (np.dtype('?'), 1)
+}
+
+
+def _is_missing(buf, off, i):
+    return (buf[off + (i >> 3)] >> (i & 7)) & 1
+
+
+def _missing_mask(buf, off, n):
+    bits = np.unpackbits(np.frombuffer(buf, np.uint8, (n + 7) >> 3, off))
+    return bits.reshape(-1, 8)[:, ::-1].ravel()[:n].astype(bool)
+
+
+def _unpacker(s):
+    unpack_from = s.unpack_from
+    size = s.size
+
+    def read(buf, off):
+        return unpack_from(buf, off)[0], off + size
+    return read
+
+
+def _read_float32(buf, off):
+    # the shortest decimal that rounds to the value, as in the JSON results,
+    # rather than its exact widening to a double
+    return float(str(np.float32(_float32.unpack_from(buf, off)[0]))), off + 4
+
+
+def _float32_list(a):
+    return a.astype(str).astype(np.float64).tolist()
+
+
+def _read_bool(buf, off):
+    return buf[off] != 0, off + 1
+
+
+def _read_str(buf, off):
+    n = _int32.unpack_from(buf, off)[0]
+    off += 4
+    return bytes(buf[off:off + n]).decode('utf-8'), off + n
+
+
+def _fields_reader(readers):
+    n_missing_bytes = (len(readers) + 7) >> 3
+
+    def read(buf, off):
+        missing_off = off
+        off += n_missing_bytes
+        values = []
+        for i, r in enumerate(readers):
+            if _is_missing(buf, missing_off, i):
+                values.append(None)
+            else:
+                v, off = r(buf, off)
+                values.append(v)
+        return values, off
+    return read
+
+
+def _primitive_array_reader(dtype, size, numpy_arrays):
+    def read(buf, off):
+        n = _int32.unpack_from(buf, off)[0]
+        off += 4
+        n_missing_bytes = (n + 7) >> 3
+        missing_off = off
+        off += n_missing_bytes
+        tolist = _float32_list if dtype == np.float32 else np.ndarray.tolist
+        if not any(buf[missing_off:off]):
+            a = np.frombuffer(buf, dtype, n, off)
+            return (a.copy() if numpy_arrays else tolist(a)), off + n * size
+        mask = _missing_mask(buf, missing_off, n)
+        n_defined = n - int(mask.sum())
+        defined = np.frombuffer(buf, dtype, n_defined, off)
+        off += n_defined * size
+        if numpy_arrays:
+            a = np.zeros(n, dtype)
+            a[~mask] = defined
+            return np.ma.masked_array(a, mask), off
+        values = iter(tolist(defined))
+        return [None if m else next(values) for m in mask.tolist()], off
+    return read
+
+
+def _array_reader(element_reader):
+    def read(buf, off):
+        n = _int32.unpack_from(buf, off)[0]
+        off += 4
+        missing_off = off
+        off += (n + 7) >> 3
+        values = []
+        for i in range(n):
+            if _is_missing(buf, missing_off, i):
+                values.append(None)
+            else:
+                v, off = element_reader(buf, off)
+                values.append(v)
+        return values, off
+    return read
+
+
+def _reader(typ, numpy_arrays):
+    from hail.utils import Struct, Interval
+    from hail.genetics import Call, Locus
+
+    if typ in _primitive_dtypes:
+        if typ == tbool:
+            return _read_bool
+        if typ == tfloat32:
+            return _read_float32
+        return _unpacker({tint32: _int32, tint64: _int64, tfloat64: _float64}[typ])
+    if typ == tstr:
+        return _read_str
+    if typ == tcall:
+        def read_call(buf, off):
+            return Call._from_java(_int32.unpack_from(buf, off)[0]), off + 4
+        return read_call
+    if isinstance(typ, tlocus):
+        rg = typ.reference_genome
+
+        def read_locus(buf, off):
+            contig, off = _read_str(buf, off)
+            return Locus(contig, _int32.unpack_from(buf, off)[0], reference_genome=rg), off + 4
+        return read_locus
+    if isinstance(typ, tarray):
+        if typ.element_type in _primitive_dtypes:
+            return _primitive_array_reader(*_primitive_dtypes[typ.element_type], numpy_arrays)
+        return _array_reader(_reader(typ.element_type, numpy_arrays))
+    if isinstance(typ, tset):
+        read_elements = _array_reader(_reader(typ.element_type, numpy_arrays))
+
+        def read_set(buf, off):
+            values, off = read_elements(buf, off)
+            return set(values), off
+        return read_set
+    if isinstance(typ, tdict):
+        # dict entries are required structs, so there are no entry missing bits
+        read_entry = _fields_reader([_reader(typ.key_type, numpy_arrays), _reader(typ.value_type, numpy_arrays)])
+
+        def read_dict(buf, off):
+            n = _int32.unpack_from(buf, off)[0]
+            off += 4
+            d = {}
+            for _ in range(n):
+                (k, v), off = read_entry(buf, off)
+                d[k] = v
+            return d, off
+        return read_dict
+    if isinstance(typ, tstruct):
+        names = list(typ)
+        read_fields = _fields_reader([_reader(t, numpy_arrays) for t in typ.values()])
+
+        def read_struct(buf, off):
+            values, off = read_fields(buf, off)
+            return Struct(**dict(zip(names, values))), off
+        return read_struct
+    if isinstance(typ, ttuple):
+        read_fields = _fields_reader([_reader(t, numpy_arrays) for t in typ.types])
+
+        def read_tuple(buf, off):
+            values, off = read_fields(buf, off)
+            return tuple(values), off
+        return read_tuple
+    if isinstance(typ, tinterval):
+        point_type = typ.point_type
+        read_bounds = _fields_reader([_reader(point_type, numpy_arrays)] * 2)
+
+        def read_interval(buf, off):
+            (start, end), off = read_bounds(buf, off)
+            return Interval(start, end, buf[off] != 0, buf[off + 1] != 0, point_type=point_type), off + 2
+        return read_interval
+    raise NotImplementedError(f'cannot decode values of type {typ}')
+
+
+def can_decode(typ):
+    """Whether values of `typ` can be decoded by :func:`.decode_unblocked_uncompressed`."""
+    try:
+        _reader(typ, False)
+        return True
+    except NotImplementedError:
+        return False
+
+
+def decode_unblocked_uncompressed(typ, bytes, numpy_arrays=False):
+    """Decode a value of type `typ` without a round trip through the JVM.
+
+    `bytes` must hold a single-field tuple encoded with the
+    ``unblockedUncompressed`` codec and the all-optional physical type of
+    `typ`, as produced by ``Backend.executeEncode``.
+
+    Parameters
+    ----------
+    typ : :class:`.HailType`
+    bytes : :obj:`bytes`
+    numpy_arrays : :obj:`bool`
+        If ``True``, arrays of numeric or boolean elements are returned as
+        NumPy arrays (masked arrays if any element is missing) instead of
+        lists.
+
+    Other 32-bit floats are decoded to the shortest decimal that rounds to
+    them, as in JSON results, so ``1.1`` is returned as ``1.1`` rather than
+    ``1.100000023841858``.  NumPy arrays of 32-bit floats hold the values
+    themselves.
+    """
+    value, off = _fields_reader([_reader(typ, numpy_arrays)])(memoryview(bytes), 0)
+    assert off == len(bytes), (off, len(bytes))
+    return value[0]
+
+
+def _set_missing(missing, i):
+    missing[i >> 3] |= 1 << (i & 7)
+
+
+def _fields_writer(writers):
+    n_missing_bytes = (len(writers) + 7) >> 3
+
+    def write(values, out):
+        missing = bytearray(n_missing_bytes)
+        start = len(out)
+        out += missing
+        for i, (w, v) in enumerate(zip(writers, values)):
+            if v is None:
+                _set_missing(missing, i)
+            else:
+                w(v, out)
+        out[start:start + n_missing_bytes] = missing
+    return write
+
+
+def _write_str(v, out):
+    b = v.encode('utf-8')
+    out += _int32.pack(len(b))
+    out += b
+
+
+def _primitive_array_writer(dtype):
+    def write(values, out):
+        n = len(values)
+        out += _int32.pack(n)
+        missing = bytearray((n + 7) >> 3)
+        if any(v is None for v in values):
+            for i, v in enumerate(values):
+                if v is None:
+                    _set_missing(missing, i)
+            values = [v for v in values if v is not None]
+        out += missing
+        out += np.asarray(values, dtype).tobytes()
+    return write
+
+
+def _write_str_array(values, out):
+    n = len(values)
+    out += _int32.pack(n)
+    missing = bytearray((n + 7) >> 3)
+    for i, v in enumerate(values):
+        if v is None:
+            _set_missing(missing, i)
+    out += missing
+    encoded = [v.encode('utf-8') for v in values if v is not None]
+    pack = _int32.pack
+    out += b''.join([b for e in encoded for b in (pack(len(e)), e)])
+
+
+def _array_writer(element_writer):
+    def write(values, out):
+        n = len(values)
+        out += _int32.pack(n)
+        missing = bytearray((n + 7) >> 3)
+        start = len(out)
+        out += missing
+        for i, v in enumerate(values):
+            if v is None:
+                _set_missing(missing, i)
+            else:
+                element_writer(v, out)
+        out[start:start + len(missing)] = missing
+    return write
+
+
+def _writer(typ):
+    if typ in _primitive_dtypes:
+        if typ == tbool:
+            def write_bool(v, out):
+                out.append(1 if v else 0)
+            return write_bool
+        s = {tint32: _int32, tint64: _int64, tfloat32: _float32, tfloat64: _float64}[typ]
+        pack = s.pack
+        convert = float if typ in (tfloat32, tfloat64) else int
+
+        def write_primitive(v, out):
+            out += pack(convert(v))
+        return write_primitive
+    if typ == tstr:
+        return _write_str
+    if typ == tcall:
+        def write_call(v, out):
+            out += _int32.pack(v._call)
+        return write_call
+    if isinstance(typ, tlocus):
+        def write_locus(v, out):
+            _write_str(v.contig, out)
+            out += _int32.pack(v.position)
+        return write_locus
+    if isinstance(typ, (tarray, tset)):
+        if typ.element_type in _primitive_dtypes:
+            write_elements = _primitive_array_writer(_primitive_dtypes[typ.element_type][0])
+        elif typ.element_type == tstr:
+            write_elements = _write_str_array
+        else:
+            write_elements = _array_writer(_writer(typ.element_type))
+        if isinstance(typ, tset):
+            def write_set(v, out):
+                write_elements(list(v), out)
+            return write_set
+        return write_elements
+    if isinstance(typ, tdict):
+        write_entry = _fields_writer([_writer(typ.key_type), _writer(typ.value_type)])
+
+        def write_dict(v, out):
+            out += _int32.pack(len(v))
+            for entry in v.items():
+                write_entry(entry, out)
+        return write_dict
+    if isinstance(typ, tstruct):
+        names = list(typ)
+        write_fields = _fields_writer([_writer(t) for t in typ.values()])
+
+        def write_struct(v, out):
+            write_fields([v[name] for name in names], out)
+        return write_struct
+    if isinstance(typ, ttuple):
+        return _fields_writer([_writer(t) for t in typ.types])
+    if isinstance(typ, tinterval):
+        write_bounds = _fields_writer([_writer(typ.point_type)] * 2)
+
+        def write_interval(v, out):
+            write_bounds((v.start, v.end), out)
+            out.append(1 if v.includes_start else 0)
+            out.append(1 if v.includes_end else 0)
+        return write_interval
+    raise NotImplementedError(f'cannot encode values of type {typ}')
+
+
+def can_encode(typ):
+    """Whether values of `typ` can be encoded by :func:`.encode_unblocked_uncompressed`."""
+    try:
+        _writer(typ)
+        return True
+    except NotImplementedError:
+        return False
+
+
+def encode_unblocked_uncompressed(typ, value):
+    """Encode a value of type `typ` without a round trip through the JVM.
+
+    The inverse of :func:`.decode_unblocked_uncompressed`: the result holds a
+    single-field tuple encoded with the ``unblockedUncompressed`` codec and
+    the all-optional physical type of `typ`.
+
+    Parameters
+    ----------
+    typ : :class:`.HailType`
+    value
+        A value of type `typ`, as accepted by :func:`.literal`.
+
+    Returns
+    -------
+    :obj:`bytearray`
+    """
+    out = bytearray()
+    _fields_writer([_writer(typ)])([value], out)
+    return out
@@ -51,4 +51,4 @@ class DB:
             else:
                 t = hl.read_table(url)
                 mt = mt.annotate_rows(**{name:t[mt.row_key]})
-    return mt
+        return mt
@@ -75,6 +75,26 @@ class ExprCoercer(TypeChecker):
         except ExpressionException as e:
             raise TypecheckFailure from e
 
+    def compile(self, caller: str, param: str):
+        check = self.check
+        can_coerce = self.can_coerce
+        requires_conversion = self._requires_conversion
+        coerce = self._coerce
+
+        def f(x):
+            if isinstance(x, Expression):
+                t = x.dtype
+                if not can_coerce(t):
+                    raise TypecheckFailure
+                if not requires_conversion(t):
+                    return x
+                try:
+                    return coerce(x)
+                except ExpressionException as e:
+                    raise TypecheckFailure from e
+            return check(x, caller, param)
+        return f
+
     def format(self, arg):
         if isinstance(arg, Expression):
             return str(arg)
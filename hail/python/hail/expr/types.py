@@ -1227,7 +1227,7 @@ class _tcall(HailType):
         return "Call"
 
     def _convert_from_json(self, x):
-        return hl.Call._from_java(hl.Call._call_jobject().parse(x))
+        return hl.Call._parse(x)
 
     def _convert_to_json(self, x):
         return str(x)
@@ -1,5 +1,36 @@
+import math
+
 from hail.typecheck import *
-from hail.utils.java import *
+from hail.utils.java import FatalError
+
+
+def _diploid_gt_index(j, k):
+    return k * (k + 1) // 2 + j
+
+
+def _allele_pair(i):
+    # inverse of _diploid_gt_index, as Genotype.allelePairSqrt
+    k = int(math.sqrt(8 * i + 1) / 2 - 0.5)
+    return i - k * (k + 1) // 2, k
+
+
+def _encode(alleles, phased):
+    # same layout as is.hail.variant.Call: bit 0 is phased, bits 1-2 hold the
+    # ploidy and the rest the allele representation
+    ploidy = len(alleles)
+    if any(a < 0 for a in alleles):
+        raise FatalError(f"allele indices must be >= 0. Found {alleles}.")
+    if ploidy == 0:
+        ar = 0
+    elif ploidy == 1:
+        ar = alleles[0]
+    elif phased:
+        ar = _diploid_gt_index(alleles[0], alleles[0] + alleles[1])
+    else:
+        ar = _diploid_gt_index(min(alleles), max(alleles))
+    if ar >> 29:
+        raise FatalError(f"invalid allele representation: {ar}. Max value is 2^29 - 1")
+    return (ar << 3) | (ploidy << 1) | phased
 
 
 class Call(object):
@@ -15,36 +46,48 @@ class Call(object):
         `alleles`.
     """
 
-    _cached_jobject = None
-
-    @staticmethod
-    def _call_jobject():
-        if not Call._cached_jobject:
-            Call._cached_jobject = scala_object(Env.hail().variant, 'Call')
-        return Call._cached_jobject
+    __slots__ = ('_call', '_alleles')
 
     @typecheck_method(alleles=sequenceof(int),
                       phased=bool)
     def __init__(self, alleles, phased=False):
         if len(alleles) > 2:
             raise NotImplementedError("Calls with greater than 2 alleles are not supported.")
-        self._phased = phased
-        self._alleles = alleles
-        self._ploidy = len(alleles)
-        self._call = scala_object(Env.hail().variant, 'CallN').apply(alleles, phased)
+        self._alleles = list(alleles)
+        self._call = _encode(self._alleles, phased)
 
     @classmethod
     def _from_java(cls, jc):
+        """Make a call from its integer encoding in the JVM."""
         c = Call.__new__(cls)
         c._call = jc
         c._alleles = None
-        c._phased = None
-        c._ploidy = None
-        super(Call, c).__init__()
         return c
 
+    @classmethod
+    def _parse(cls, s):
+        """Parse the string format of :meth:`__str__`, as in Hail's JSON."""
+        if s == '-' or s == '|-':
+            return cls._from_java(int(s == '|-'))
+        phased = '|' in s
+        try:
+            alleles = [int(a) for a in (s[1:] if s.startswith('|') else s).split('|' if phased else '/')]
+        except ValueError:
+            raise FatalError(f"invalid call expression: '{s}'") from None
+        if len(alleles) > 2:
+            raise NotImplementedError("Calls with greater than 2 alleles are not supported.")
+        return cls._from_java(_encode(alleles, phased))
+
     def __str__(self):
-        return Call._call_jobject().toString(self._call)
+        ploidy = self.ploidy
+        phased = self.phased
+        if ploidy == 0:
+            return '|-' if phased else '-'
+        if ploidy == 1:
+            a = self._call >> 3
+            return f'|{a}' if phased else str(a)
+        j, k = self._diploid_alleles()
+        return f'{j}{"|" if phased else "/"}{k}'
 
     def __repr__(self):
         return 'Call(alleles=%s, phased=%s)' % (self.alleles, self.phased)
@@ -56,6 +99,12 @@ class Call(object):
         # hash('Call') = 0x16f6c8bfbd18ab94
         return hash(self._call) ^ 0x16f6c8bfbd18ab94
 
+    def _diploid_alleles(self):
+        j, k = _allele_pair(self._call >> 3)
+        if self.phased:
+            return j, k - j
+        return j, k
+
     def __getitem__(self, item):
         """Get the i*th* allele.
 
@@ -75,7 +124,13 @@ class Call(object):
         """
 
         if self._alleles is None:
-            self._alleles = jarray_to_list(Call._call_jobject().alleles(self._call))
+            ploidy = self.ploidy
+            if ploidy == 0:
+                self._alleles = []
+            elif ploidy == 1:
+                self._alleles = [self._call >> 3]
+            else:
+                self._alleles = list(self._diploid_alleles())
         return self._alleles
 
     @property
@@ -87,9 +142,7 @@ class Call(object):
         :obj:`int`
         """
 
-        if not self._ploidy:
-            self._ploidy = Call._call_jobject().ploidy(self._call)
-        return self._ploidy
+        return (self._call >> 1) & 0x3
 
     @property
     def phased(self):
@@ -100,9 +153,7 @@ class Call(object):
         :obj:`bool`
         """
 
-        if not self._phased:
-            self._phased = Call._call_jobject().isPhased(self._call)
-        return self._phased
+        return bool(self._call & 0x1)
 
     def is_haploid(self):
         """True if the ploidy == 1.
@@ -110,7 +161,7 @@ class Call(object):
         :rtype: bool
         """
 
-        return Call._call_jobject().isHaploid(self._call)
+        return self.ploidy == 1
 
     def is_diploid(self):
         """True if the ploidy == 2.
@@ -118,7 +169,7 @@ class Call(object):
         :rtype: bool
         """
 
-        return Call._call_jobject().isDiploid(self._call)
+        return self.ploidy == 2
 
     def is_hom_ref(self):
         """True if the call has no alternate alleles.
@@ -126,7 +177,7 @@ class Call(object):
         :rtype: bool
         """
 
-        return Call._call_jobject().isHomRef(self._call)
+        return self.ploidy > 0 and self._call >> 3 == 0
 
     def is_het(self):
         """True if the call contains two different alleles.
@@ -134,7 +185,10 @@ class Call(object):
         :rtype: bool
         """
 
-        return Call._call_jobject().isHet(self._call)
+        if self.ploidy != 2:
+            return False
+        j, k = self._diploid_alleles()
+        return j != k
 
     def is_hom_var(self):
         """True if the call contains two identical alternate alleles.
@@ -142,7 +196,13 @@ class Call(object):
         :rtype: bool
         """
 
-        return Call._call_jobject().isHomVar(self._call)
+        ploidy = self.ploidy
+        if ploidy == 1:
+            return self._call >> 3 > 0
+        if ploidy == 2:
+            j, k = self._diploid_alleles()
+            return j == k > 0
+        return False
 
     def is_non_ref(self):
         """True if the call contains any non-reference alleles.
@@ -150,7 +210,7 @@ class Call(object):
         :rtype: bool
         """
 
-        return Call._call_jobject().isNonRef(self._call)
+        return self.ploidy > 0 and self._call >> 3 > 0
 
     def is_het_non_ref(self):
         """True if the call contains two different alternate alleles.
@@ -158,7 +218,10 @@ class Call(object):
         :rtype: bool
         """
 
-        return Call._call_jobject().isHetNonRef(self._call)
+        if self.ploidy != 2:
+            return False
+        j, k = self._diploid_alleles()
+        return j > 0 and k > 0 and j != k
 
     def is_het_ref(self):
         """True if the call contains one reference and one alternate allele.
@@ -166,7 +229,10 @@ class Call(object):
         :rtype: bool
         """
 
-        return Call._call_jobject().isHetRef(self._call)
+        if self.ploidy != 2:
+            return False
+        j, k = self._diploid_alleles()
+        return (j == 0) != (k == 0)
 
     def n_alt_alleles(self):
         """Returns the count of non-reference alleles.
@@ -174,7 +240,7 @@ class Call(object):
         :rtype: int
         """
 
-        return Call._call_jobject().nNonRefAlleles(self._call)
+        return sum(a != 0 for a in self.alleles)
 
     @typecheck_method(n_alleles=int)
     def one_hot_alleles(self, n_alleles):
@@ -211,7 +277,11 @@ class Call(object):
         -------
         :obj:`list` of :obj:`int`
         """
-        return jiterable_to_list(Call._call_jobject().oneHotAlleles(self._call, n_alleles))
+        one_hot = [0] * n_alleles
+        for a in self.alleles:
+            if a < n_alleles:
+                one_hot[a] += 1
+        return one_hot
 
     def unphased_diploid_gt_index(self):
         """Return the genotype index for unphased, diploid calls.
@@ -224,4 +294,4 @@ class Call(object):
         if self.ploidy != 2 or self.phased:
             raise FatalError(
                 "'unphased_diploid_gt_index' is only valid for unphased, diploid calls. Found {}.".format(repr(self)))
-        return Call._call_jobject().unphasedDiploidGtIndex(self._call)
+        return self._call >> 3
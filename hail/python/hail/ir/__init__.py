@@ -11,3 +11,4 @@ from .blockmatrix_reader import *
 from .matrix_writer import *
 from .table_writer import *
 from .blockmatrix_writer import *
+from .cse import eliminate_common_subexpressions
@@ -10,11 +10,21 @@ class BaseIR(Renderable):
     def __init__(self, *children):
         super().__init__()
         self._type = None
+        self._rendered = None
+        self._rendered_cse = None
+        self._rendered_jir = None
+        self._rendered_jir_cse = None
+        self._hash = None
         self.children = children
 
     def __str__(self):
+        if self._rendered is not None:
+            return self._rendered
         r = Renderer(stop_at_jir=False)
-        return r(self)
+        rendered = r(self)
+        if r.count == 0:
+            self._rendered = rendered
+        return rendered
 
     def render_head(self, r):
         head_str = self.head_str()
@@ -68,8 +78,39 @@ class BaseIR(Renderable):
         """
         return True
 
+    def _hash_head(self):
+        """Hash of the non-child attributes of the BaseIR.
+
+        Must agree with :meth:`._eq`: BaseIRs that compare equal must have
+        equal head hashes.
+
+        Returns
+        -------
+        int
+        """
+        return hash(self.head_str())
+
     def __hash__(self):
-        return 31 + hash(str(self))
+        # Structural hash, computed bottom-up without recursion and cached on
+        # every node so that hashing a tree after extending it is linear in
+        # the number of new nodes.
+        if self._hash is not None:
+            return self._hash
+        stack = [self]
+        while stack:
+            x = stack[-1]
+            pending = [c for c in x.children
+                       if isinstance(c, BaseIR) and c._hash is None and not c._overrides_hash()]
+            if pending:
+                stack.extend(pending)
+                continue
+            stack.pop()
+            if x._hash is None:
+                x._hash = hash((31, x.__class__.__name__, x._hash_head(), tuple(hash(c) for c in x.children)))
+        return self._hash
+
+    def _overrides_hash(self):
+        return type(self).__hash__ is not BaseIR.__hash__
 
 
 class IR(BaseIR):
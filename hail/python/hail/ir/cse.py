@@ -0,0 +1,191 @@
+from hail.utils.java import Env
+from .base_ir import IR
+from .ir import Let, Ref, Literal, I32, I64, F32, F64, Str, TrueIR, FalseIR, NA, Void, If, Coalesce, Apply, \
+    ApplySeeded, Die, In, JavaIR, BaseApplyAggOp, AggFilter, AggExplode, AggGroupBy, AggArrayPerElement, \
+    TableAggregate, MatrixAggregate
+
+# child attributes evaluated in a scope that binds new names
+_binder_bodies = {
+    'Let': ('body',),
+    'ArrayMap': ('body',),
+    'ArrayFilter': ('body',),
+    'ArrayFlatMap': ('body',),
+    'ArrayFold': ('body',),
+    'ArrayScan': ('body',),
+    'ArrayFor': ('body',),
+    'ArraySort': ('compare',),
+    'ArrayLeftJoinDistinct': ('compare', 'join'),
+    'NDArrayMap': ('body',),
+    'Uniroot': ('function',),
+}
+
+_agg_nodes = (BaseApplyAggOp, AggFilter, AggExplode, AggGroupBy, AggArrayPerElement)
+
+_leaves = (Ref, I32, I64, F32, F64, Str, TrueIR, FalseIR, NA, Void, JavaIR)
+
+_STRICT = 0
+_REGION = 1
+_SCOPE = 2
+_OPAQUE = 3
+
+
+def _child_kinds(x):
+    """How each child of `x` is evaluated.
+
+    Strict children are evaluated whenever `x` is, in the scope of `x`. Region
+    children are evaluated conditionally, in a scope with new bindings, or in
+    the aggregation scope, so nothing may be hoisted out of them; they are
+    optimized on their own instead. Scope children, such as the query of an
+    aggregation over a table, are evaluated in the scope of a relational
+    child and are optimized on their own as well; their aggregations are
+    not those of `x`. Opaque children are not value IR.
+    """
+    if isinstance(x, (TableAggregate, MatrixAggregate)):
+        return [_OPAQUE, _SCOPE]
+    if isinstance(x, _agg_nodes):
+        return [_REGION if isinstance(c, IR) else _OPAQUE for c in x.children]
+    if isinstance(x, If):
+        return [_STRICT, _REGION, _REGION]
+    if isinstance(x, Coalesce):
+        return [_STRICT] + [_REGION] * (len(x.children) - 1)
+    if isinstance(x, Apply) and x.function in ('&&', '||'):
+        return [_STRICT, _REGION]
+    bodies = _binder_bodies.get(type(x).__name__)
+    if bodies is not None:
+        body_ids = {id(getattr(x, b)) for b in bodies}
+        return [_REGION if id(c) in body_ids else _STRICT if isinstance(c, IR) else _OPAQUE for c in x.children]
+    return [_STRICT if isinstance(c, IR) else _OPAQUE for c in x.children]
+
+
+def _has_aggregations(x):
+    """True if `x` aggregates in its own aggregation scope. Unlike
+    ``x.aggregations``, this does not descend into relational children."""
+    stack = [x]
+    while stack:
+        y = stack.pop()
+        if isinstance(y, _agg_nodes):
+            return True
+        stack.extend(c for c, kind in zip(y.children, _child_kinds(y)) if kind in (_STRICT, _REGION))
+    return False
+
+
+class _Optimizer(object):
+    def __init__(self):
+        self._pure = {}
+
+    def _is_pure(self, x):
+        """True if every node under `x` is a deterministic value IR, so that
+        evaluating `x` once in place of several times is unobservable."""
+        result = self._pure.get(id(x))
+        if result is None:
+            stack = [x]
+            while stack:
+                y = stack[-1]
+                if not isinstance(y, IR):
+                    stack.pop()
+                    self._pure[id(y)] = False
+                    continue
+                pending = [c for c in y.children if id(c) not in self._pure]
+                if pending:
+                    stack.extend(pending)
+                    continue
+                stack.pop()
+                self._pure[id(y)] = (not isinstance(y, (ApplySeeded, Die, In) + _agg_nodes)
+                                     and all(self._pure[id(c)] for c in y.children))
+            result = self._pure[id(x)]
+        return result
+
+    def _is_candidate(self, x):
+        if not isinstance(x, IR) or isinstance(x, _leaves) or not self._is_pure(x):
+            return False
+        # binding a node whose children are all leaves rarely shortens the
+        # text or saves work, except for literals
+        if not isinstance(x, Literal) and all(isinstance(c, _leaves) for c in x.children):
+            return False
+        try:
+            hash(x)
+        except TypeError:
+            return False
+        return True
+
+    def region(self, root):
+        if _has_aggregations(root):
+            # Let bindings cannot be placed around aggregations, but the
+            # subexpressions and aggregation arguments below can be optimized.
+            return self._rebuild(root, {}, transparent=True)
+
+        counts = {}
+        order = []
+        stack = [(root, False)]
+        while stack:
+            x, done = stack.pop()
+            if done:
+                if x is not root and self._is_candidate(x):
+                    order.append(x)
+                continue
+            if x is not root and self._is_candidate(x):
+                n = counts.get(x, 0)
+                counts[x] = n + 1
+                if n > 0:
+                    continue
+            stack.append((x, True))
+            for c, kind in zip(reversed(x.children), reversed(_child_kinds(x))):
+                if kind == _STRICT:
+                    stack.append((c, False))
+
+        hoisted = {}
+        bindings = []
+        for x in order:
+            if counts.get(x, 0) > 1 and x not in hoisted:
+                value = self._rebuild(x, hoisted)
+                name = Env.get_uid()
+                hoisted[x] = name
+                bindings.append((name, value))
+
+        if not bindings:
+            return self._rebuild(root, hoisted)
+
+        body = self._rebuild(root, hoisted)
+        for name, value in reversed(bindings):
+            body = Let(name, value, body)
+        return body
+
+    def _rebuild(self, x, hoisted, transparent=False):
+        new_children = []
+        changed = False
+        for c, kind in zip(x.children, _child_kinds(x)):
+            if kind == _STRICT and transparent:
+                new_c = self.region(c)
+            elif kind == _STRICT:
+                name = hoisted.get(c) if self._is_candidate(c) else None
+                new_c = Ref(name) if name is not None else self._rebuild(c, hoisted)
+            elif kind in (_REGION, _SCOPE):
+                new_c = self.region(c)
+            else:
+                new_c = c
+            changed |= new_c is not c
+            new_children.append(new_c)
+        if not changed:
+            return x
+        return x.copy(*new_children)
+
+
+def eliminate_common_subexpressions(x):
+    """Bind pure subexpressions that occur more than once in `x` with
+    :class:`.Let` and refer to them by name.
+
+    Only subexpressions that are evaluated unconditionally and in the same
+    scope are shared, so the result has the same semantics as `x`.
+
+    Parameters
+    ----------
+    x : :class:`.IR`
+
+    Returns
+    -------
+    :class:`.IR`
+    """
+    try:
+        return _Optimizer().region(x)
+    except (RecursionError, NotImplementedError):
+        return x
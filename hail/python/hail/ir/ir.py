@@ -1,4 +1,5 @@
 import copy
+import hashlib
 from collections import defaultdict
 
 import decorator
@@ -7,6 +8,7 @@ import hail
 from hail.expr.types import *
 from hail.ir.blockmatrix_writer import BlockMatrixWriter, BlockMatrixMultiWriter
 from hail.typecheck import *
+from hail.utils.java import Env
 from hail.utils.misc import escape_str, dump_json, parsable_strings, escape_id
 from .base_ir import *
 from .matrix_writer import MatrixWriter, MatrixNativeMultiWriter
@@ -689,7 +691,7 @@ class ArraySort(IR):
     def bound_variables(self):
         return {self.l_name, self.r_name} | super().bound_variables
 
-    def __eq__(self, other):
+    def _eq(self, other):
         return other.l_name == self.l_name and other.r_name == self.r_name
 
     def _compute_type(self, env, agg_env):
@@ -1345,6 +1347,8 @@ class InsertFields(IR):
                other.fields == self.fields and \
                other.field_order == self.field_order
 
+    __hash__ = IR.__hash__
+
     def _compute_type(self, env, agg_env):
         self.old._compute_type(env, agg_env)
         for f, x in self.fields:
@@ -1694,6 +1698,8 @@ class MatrixAggregate(IR):
                other.child == self.child and \
                other.query == self.query
 
+    __hash__ = IR.__hash__
+
     def _compute_type(self, env, agg_env):
         self.query._compute_type(self.child.typ.global_env(), self.child.typ.entry_env())
         self._type = self.query.typ
@@ -1882,6 +1888,11 @@ class BlockMatrixToValueApply(IR):
         self._type = tfloat64
 
 
+# Literal collections with at least this many elements are sent to the JVM
+# encoded, beside the IR text, rather than as JSON inside it.
+_OUT_OF_BAND_LITERAL_SIZE = 1024
+
+
 class Literal(IR):
     @typecheck_method(typ=hail_type,
                       value=anytype)
@@ -1889,6 +1900,8 @@ class Literal(IR):
         super(Literal, self).__init__()
         self._typ: 'hail.HailType' = typ
         self.value = value
+        self._digest = None
+        self._java_literal = None
 
     def copy(self):
         return Literal(self._typ, self.value)
@@ -1896,6 +1909,52 @@ class Literal(IR):
     def head_str(self):
         return f'{self._typ._parsable_string()} {dump_json(self._typ._convert_to_json_na(self.value))}'
 
+    def render_head(self, r):
+        if r.stop_at_jir and self._out_of_band():
+            return f'(JavaIR {r.add_jir(self._to_java())}'
+        return super().render_head(r)
+
+    def _out_of_band(self):
+        from hail.experimental.codec import can_encode
+        return (isinstance(self.value, (list, set, frozenset, dict))
+                and len(self.value) >= _OUT_OF_BAND_LITERAL_SIZE
+                and can_encode(self._typ))
+
+    def _encode(self):
+        from hail.experimental.codec import encode_unblocked_uncompressed
+        encoded = bytes(encode_unblocked_uncompressed(self._typ, self.value))
+        self._digest = hashlib.sha256(encoded).hexdigest()
+        return encoded
+
+    def _value_digest(self):
+        if self._digest is None:
+            self._encode()
+        return self._digest
+
+    def _to_java(self):
+        # The JVM keeps recently sent literals by digest, so a value used by
+        # several queries is only transferred and decoded once.
+        if self._java_literal is None:
+            jbackend = Env.hail().backend.Backend
+            typ = self._typ._parsable_string()
+            if self._digest is None:
+                encoded = self._encode()
+                jir = None
+            else:
+                encoded = None
+                jir = jbackend.cachedLiteral(typ, self._digest)
+            if jir is None:
+                if encoded is None:
+                    encoded = self._encode()
+                jir = jbackend.decodeLiteral(typ, encoded, self._digest)
+            self._java_literal = jir
+        return self._java_literal
+
+    def _hash_head(self):
+        if self._out_of_band():
+            return hash((self._typ._parsable_string(), self._value_digest()))
+        return super()._hash_head()
+
     def _eq(self, other):
         return other._typ == self._typ and \
                other.value == self.value
@@ -37,6 +37,13 @@ class MatrixRead(MatrixIR):
         return self.reader == other.reader and self.drop_cols == other.drop_cols and self.drop_rows == other.drop_rows
 
     def _compute_type(self):
+        from .matrix_reader import MatrixNativeReader
+        from .native_metadata import native_metadata_type
+        if isinstance(self.reader, MatrixNativeReader):
+            typ = native_metadata_type(self.reader.path)
+            if isinstance(typ, hl.tmatrix):
+                self._type = typ
+                return
         self._type = Env.backend().matrix_type(self)
 
 
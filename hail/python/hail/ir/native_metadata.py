@@ -0,0 +1,251 @@
+import gzip
+import json
+import re
+import zlib
+from functools import lru_cache
+
+from hail.expr.types import tbool, tint32, tint64, tfloat32, tfloat64, tstr, tcall, tlocus, \
+    tarray, tndarray, tset, tdict, ttuple, tstruct, tunion, tinterval
+from hail.expr.table_type import ttable
+from hail.expr.matrix_type import tmatrix
+from hail.utils.java import Env, FatalError, unescape_parsable
+
+# supported native file format, see is.hail.variant.FileFormat
+_file_format_major = 1
+_file_format_minor = 1
+
+_token_re = re.compile(r'\s*(?:(`(?:[^`\\]|\\.)*`)|("(?:[^"\\]|\\.)*")|(\d+)|(\w+)|(\S))')
+
+_primitive_types = {
+    'Boolean': tbool,
+    'Int32': tint32,
+    'Int': tint32,
+    'Int64': tint64,
+    'Float32': tfloat32,
+    'Float64': tfloat64,
+    'String': tstr,
+    'Call': tcall
+}
+
+
+class _TypeParser(object):
+    """Parses the types written in native metadata files, in the format of
+    is.hail.expr.ir.IRParser.type_expr."""
+
+    def __init__(self, s):
+        self.tokens = []
+        pos = 0
+        s = s.rstrip()
+        while pos < len(s):
+            m = _token_re.match(s, pos)
+            backtick, string, integer, identifier, punctuation = m.groups()
+            if backtick is not None:
+                self.tokens.append(('identifier', unescape_parsable(backtick[1:-1])))
+            elif string is not None:
+                self.tokens.append(('string', string))
+            elif integer is not None:
+                self.tokens.append(('integer', int(integer)))
+            elif identifier is not None:
+                self.tokens.append(('identifier', identifier))
+            else:
+                self.tokens.append(('punctuation', punctuation))
+            pos = m.end()
+        self.i = 0
+
+    def _peek(self):
+        return self.tokens[self.i] if self.i < len(self.tokens) else (None, None)
+
+    def _next(self, kind, value=None):
+        token_kind, token_value = self._peek()
+        if token_kind != kind or (value is not None and token_value != value):
+            raise ValueError(f'expected {value or kind} but found {token_value!r}')
+        self.i += 1
+        return token_value
+
+    def _punctuation(self, value):
+        return self._next('punctuation', value)
+
+    def _at(self, value):
+        return self._peek() == ('punctuation', value)
+
+    def _sep_until(self, parse, end):
+        values = []
+        while not self._at(end):
+            if values:
+                self._punctuation(',')
+            values.append(parse())
+        return values
+
+    def _field(self):
+        name = self._next('identifier')
+        self._punctuation(':')
+        typ = self.type()
+        while self._at('@'):
+            self._punctuation('@')
+            self._next('identifier')
+            self._punctuation('=')
+            self._next('string')
+        return name, typ
+
+    def type(self):
+        if self._at('+'):
+            self._punctuation('+')
+        name = self._next('identifier')
+        if name in _primitive_types:
+            return _primitive_types[name]
+        if name == 'Locus':
+            self._punctuation('(')
+            rg = self._next('identifier')
+            self._punctuation(')')
+            return tlocus(rg)
+        if name in ('Array', 'Set', 'Interval'):
+            self._punctuation('[')
+            element_type = self.type()
+            self._punctuation(']')
+            return {'Array': tarray, 'Set': tset, 'Interval': tinterval}[name](element_type)
+        if name == 'NDArray':
+            self._punctuation('[')
+            element_type = self.type()
+            self._punctuation(',')
+            n_dims = self._next('integer')
+            self._punctuation(']')
+            return tndarray(element_type, n_dims)
+        if name == 'Dict':
+            self._punctuation('[')
+            key_type = self.type()
+            self._punctuation(',')
+            value_type = self.type()
+            self._punctuation(']')
+            return tdict(key_type, value_type)
+        if name == 'Tuple':
+            self._punctuation('[')
+            types = self._sep_until(self.type, ']')
+            self._punctuation(']')
+            return ttuple(*types)
+        if name in ('Struct', 'Union'):
+            self._punctuation('{')
+            fields = self._sep_until(self._field, '}')
+            self._punctuation('}')
+            return (tstruct if name == 'Struct' else tunion)(**dict(fields))
+        raise ValueError(f'unsupported type {name}')
+
+    def _keys(self):
+        self._punctuation('[')
+        keys = self._sep_until(lambda: self._next('identifier'), ']')
+        self._punctuation(']')
+        return keys
+
+    def _labeled(self, label, parse):
+        self._next('identifier', label)
+        self._punctuation(':')
+        return parse()
+
+    def table_type(self):
+        self._next('identifier', 'Table')
+        self._punctuation('{')
+        global_type = self._labeled('global', self.type)
+        self._punctuation(',')
+        key = self._labeled('key', lambda: self._keys() if self._at('[') else [])
+        self._punctuation(',')
+        row_type = self._labeled('row', self.type)
+        self._punctuation('}')
+        self._end()
+        return ttable(global_type, row_type, key)
+
+    def _row_key(self):
+        # a partition key followed by the rest of the key
+        self._punctuation('[')
+        key = self._keys()
+        while self._at(','):
+            self._punctuation(',')
+            key.append(self._next('identifier'))
+        self._punctuation(']')
+        return key
+
+    def matrix_type(self):
+        self._next('identifier', 'Matrix')
+        self._punctuation('{')
+        global_type = self._labeled('global', self.type)
+        self._punctuation(',')
+        col_key = self._labeled('col_key', self._keys)
+        self._punctuation(',')
+        col_type = self._labeled('col', self.type)
+        self._punctuation(',')
+        row_key = self._labeled('row_key', self._row_key)
+        self._punctuation(',')
+        row_type = self._labeled('row', self.type)
+        self._punctuation(',')
+        entry_type = self._labeled('entry', self.type)
+        self._punctuation('}')
+        self._end()
+        return tmatrix(global_type, col_type, col_key, row_type, row_key, entry_type)
+
+    def _end(self):
+        if self.i != len(self.tokens):
+            raise ValueError(f'unexpected {self.tokens[self.i][1]!r}')
+
+
+def _parse_metadata_type(metadata):
+    """Returns the :class:`.ttable` or :class:`.tmatrix` of the parsed
+    ``metadata.json.gz`` of a native table or matrix table, or ``None`` if the
+    metadata is not in a supported format."""
+    if not isinstance(metadata, dict):
+        return None
+    version = metadata.get('file_version')
+    if not isinstance(version, int):
+        return None
+    if (version >> 16) != _file_format_major or ((version >> 8) & 0xff) > _file_format_minor:
+        return None
+
+    name = metadata.get('name')
+    if name == 'TableSpec':
+        return _TypeParser(metadata['table_type']).table_type()
+    if name == 'MatrixTableSpec':
+        return _TypeParser(metadata['matrix_type']).matrix_type()
+    return None
+
+
+def _read_metadata_type(path):
+    with Env.fs().open(path + '/metadata.json.gz', 'rb') as f:
+        data = f.read()
+    # the file system may or may not decompress the file
+    if data[:2] == b'\x1f\x8b':
+        data = gzip.decompress(data)
+    return _parse_metadata_type(json.loads(data.decode('utf-8')))
+
+
+@lru_cache(maxsize=1024)
+def _cached_metadata_type(path, modification_time):
+    return _read_metadata_type(path)
+
+
+def native_metadata_type(path):
+    """Returns the type of the native table or matrix table at `path`, read
+    from its metadata without a round trip through the JVM.
+
+    Types are cached by path and modification time of the metadata file.
+    Returns ``None`` if the type cannot be determined this way, for example
+    if the file does not exist, is written in an unsupported format or uses
+    a reference genome that has not been loaded; the type should then be
+    requested from the backend, which reports the error.
+
+    Parameters
+    ----------
+    path : :obj:`str`
+
+    Returns
+    -------
+    :class:`.ttable` or :class:`.tmatrix` or ``None``
+    """
+    try:
+        modification_time = Env.fs().stat(path + '/metadata.json.gz').get('modification_time')
+        if modification_time is None:
+            return _read_metadata_type(path)
+        return _cached_metadata_type(path, modification_time)
+    except (OSError, EOFError, zlib.error, FatalError):
+        # the file is missing, unreadable or not gzipped
+        return None
+    except (ValueError, KeyError):
+        # the metadata or its types do not parse, or refer to a reference
+        # genome that has not been loaded
+        return None
@@ -50,11 +50,13 @@ class ParensRenderer(Renderable):
 
 
 class RenderableQueue(object):
-    def __init__(self, elements: Sequence[Renderable], tail: str):
+    def __init__(self, elements: Sequence[Renderable], tail: str, node=None):
         self._elements = elements
         self._elements_len = len(elements)
         self.tail = tail
         self._idx = 0
+        # the relational node whose children these are, if any
+        self.node = node
 
     def exhausted(self):
         return self._elements_len == self._idx
@@ -89,10 +91,26 @@ class RQStack(object):
 
 
 class Renderer(object):
-    def __init__(self, stop_at_jir=False):
+    def __init__(self, stop_at_jir=False, cse=False):
         self.stop_at_jir = stop_at_jir
+        self.cse = cse
         self.count = 0
         self.jirs = {}
+        # text rendered in one mode must not be reused in another: only
+        # renders that stop at Java IRs send large literals out of band
+        self._cache_attr = '_rendered' + ('_jir' if stop_at_jir else '') + ('_cse' if cse else '')
+
+    def _optimize(self, x):
+        # value IRs are optimized where they are rooted: at the top of the
+        # render or directly under a relational node
+        if self.stop_at_jir and hasattr(x, '_jir'):
+            return x
+        optimized = getattr(x, '_cse', None)
+        if optimized is None:
+            from hail.ir.cse import eliminate_common_subexpressions
+            optimized = eliminate_common_subexpressions(x)
+            x._cse = optimized
+        return optimized
 
     def add_jir(self, jir):
         jir_id = f'm{self.count}'
@@ -103,6 +121,11 @@ class Renderer(object):
     def __call__(self, x: 'Renderable'):
         stack = RQStack()
         builder = []
+        root = x
+        jir_count = self.count
+
+        if self.cse and isinstance(x, ir.IR):
+            x = self._optimize(x)
 
         while x is not None or stack.non_empty():
             if x is not None:
@@ -118,11 +141,16 @@ class Renderer(object):
                     else:
                         assert isinstance(x, ir.IR)
                         builder.append(f'(JavaIR {jir_id})')
+                elif getattr(x, self._cache_attr, None) is not None:
+                    builder.append(getattr(x, self._cache_attr))
                 else:
                     head = x.render_head(self)
                     if head != '':
-                        builder.append(x.render_head(self))
-                    stack.push(RenderableQueue(x.render_children(self), x.render_tail(self)))
+                        builder.append(head)
+                    if isinstance(x, (ir.TableIR, ir.MatrixIR, ir.BlockMatrixIR)):
+                        stack.push(RenderableQueue(x.render_children(self), x.render_tail(self), node=x))
+                    else:
+                        stack.push(RenderableQueue(x.render_children(self), x.render_tail(self)))
                 x = None
             else:
                 top = stack.peek()
@@ -132,5 +160,14 @@ class Renderer(object):
                 else:
                     builder.append(' ')
                     x = top.pop()
-
-        return ''.join(builder)
+                    if self.cse and top.node is not None and isinstance(x, ir.IR):
+                        x = self._optimize(x)
+
+        rendered = ''.join(builder)
+        # Relational nodes are immutable, so their text can be reused by later
+        # renders of any tree containing them, provided it does not refer to
+        # Java IRs registered with this renderer. Only the root keeps its
+        # text: caching every subtree would hold text quadratic in the depth.
+        if isinstance(root, (ir.TableIR, ir.MatrixIR, ir.BlockMatrixIR)) and jir_count == self.count:
+            setattr(root, self._cache_attr, rendered)
+        return rendered
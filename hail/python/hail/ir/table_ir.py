@@ -198,6 +198,13 @@ class TableRead(TableIR):
         return self.reader == other.reader and self.drop_rows == other.drop_rows
 
     def _compute_type(self):
+        from .table_reader import TableNativeReader
+        from .native_metadata import native_metadata_type
+        if isinstance(self.reader, TableNativeReader):
+            typ = native_metadata_type(self.reader.path)
+            if isinstance(typ, hl.ttable):
+                self._type = typ
+                return
         self._type = Env.backend().table_type(self)
 
 
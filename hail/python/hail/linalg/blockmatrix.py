@@ -1113,8 +1113,9 @@ class BlockMatrix(object):
         writer = BlockMatrixBinaryWriter(uri)
         Env.backend().execute(BlockMatrixWrite(self._bmir, writer))
 
-    @typecheck_method(_force_blocking=bool)
-    def to_numpy(self, _force_blocking=False):
+    @typecheck_method(memmap_path=nullable(str),
+                      _force_blocking=bool)
+    def to_numpy(self, memmap_path=None, _force_blocking=False):
         """Collects the block matrix into a `NumPy ndarray
         <https://docs.scipy.org/doc/numpy/reference/generated/numpy.ndarray.html>`__.
 
@@ -1127,6 +1128,15 @@ class BlockMatrix(object):
         -----
         The resulting ndarray will have the same shape as the block matrix.
 
+        If `memmap_path` is set, the result is a :class:`numpy.memmap` backed
+        by a new file at that local path, so matrices larger than memory can
+        be collected.
+
+        Parameters
+        ----------
+        memmap_path: :obj:`str`, optional
+            Local path of a file to back the result.
+
         Returns
         -------
         :class:`numpy.ndarray`
@@ -1135,7 +1145,11 @@ class BlockMatrix(object):
         if self.n_rows * self.n_cols > 1 << 31 or _force_blocking:
             path = new_temp_file()
             self.export_blocks(path, binary=True)
-            return BlockMatrix.rectangles_to_numpy(path, binary=True)
+            return BlockMatrix.rectangles_to_numpy(path, binary=True, memmap_path=memmap_path)
+
+        if memmap_path is not None:
+            self.tofile(local_path_uri(memmap_path))
+            return np.memmap(memmap_path, dtype=np.float64, mode='r+', shape=(self.n_rows, self.n_cols))
 
         path = new_local_temp_file()
         uri = local_path_uri(path)
@@ -2014,6 +2028,11 @@ class BlockMatrix(object):
         If exporting to binary files, note that they are not platform independent. No byte-order
         or data-type information is saved.
 
+        Rectangle files are fetched and read concurrently on `n_threads`
+        threads. Binary rectangles are read directly into the result. If
+        `memmap_path` is set, the result is a :class:`numpy.memmap` backed by a
+        new file at that local path.
+
         See Also
         --------
         :meth:`.rectangles_to_numpy`
@@ -2053,8 +2072,11 @@ class BlockMatrix(object):
         self.export_rectangles(path_out, rectangles, delimiter, binary)
 
     @staticmethod
-    @typecheck(path=str, binary=bool)
-    def rectangles_to_numpy(path, binary=False):
+    @typecheck(path=str,
+               binary=bool,
+               n_threads=int,
+               memmap_path=nullable(str))
+    def rectangles_to_numpy(path, binary=False, n_threads=8, memmap_path=None):
         """Instantiates a NumPy ndarray from files of rectangles written out using
         :meth:`.export_rectangles` or :meth:`.export_blocks`. For any given
         dimension, the ndarray will have length equal to the upper bound of that dimension
@@ -2085,6 +2107,11 @@ class BlockMatrix(object):
         If exporting to binary files, note that they are not platform independent. No byte-order
         or data-type information is saved.
 
+        Rectangle files are fetched and read concurrently on `n_threads`
+        threads. Binary rectangles are read directly into the result. If
+        `memmap_path` is set, the result is a :class:`numpy.memmap` backed by a
+        new file at that local path.
+
         See Also
         --------
         :meth:`.export_rectangles`
@@ -2096,11 +2123,20 @@ class BlockMatrix(object):
             Path to directory where rectangles were written.
         binary: :obj:`bool`
             If true, reads the files as binary, otherwise as text delimited.
+        n_threads: :obj:`int`
+            Number of rectangle files to fetch and read at once.
+        memmap_path: :obj:`str`, optional
+            Local path of a file to back the result.
 
         Returns
         -------
         :class:`numpy.ndarray`
         """
+        from concurrent.futures import ThreadPoolExecutor
+
+        if n_threads < 1:
+            raise ValueError(f'rectangles_to_numpy: n_threads must be positive, found {n_threads}')
+
         def parse_rects(fname):
             rect_idx_and_bounds = [int(i) for i in re.findall(r'\d+', fname)]
             if len(rect_idx_and_bounds) != 5:
@@ -2113,17 +2149,29 @@ class BlockMatrix(object):
         n_rows = max(rects, key=lambda r: r[2])[2]
         n_cols = max(rects, key=lambda r: r[4])[4]
 
-        nd = np.zeros(shape=(n_rows, n_cols))
-        f = new_local_temp_file()
-        uri = local_path_uri(f)
-        for rect, file_path in zip(rects, rect_files):
-            hl.utils.hadoop_copy(file_path, uri)
-            if binary:
-                rect_data = np.reshape(np.fromfile(f), (rect[2]-rect[1], rect[4]-rect[3]))
-            else:
-                rect_data = np.loadtxt(f, ndmin=2)
-            nd[rect[1]:rect[2], rect[3]:rect[4]] = rect_data
+        if memmap_path is None:
+            nd = np.zeros(shape=(n_rows, n_cols))
+        else:
+            # a new file reads as zeros
+            nd = np.memmap(memmap_path, dtype=np.float64, mode='w+', shape=(n_rows, n_cols))
+
+        def load(rect, file_path):
+            f = new_local_temp_file()
+            hl.utils.hadoop_copy(file_path, local_path_uri(f))
+            try:
+                if binary:
+                    _read_rectangle_into(f, nd[rect[1]:rect[2], rect[3]:rect[4]])
+                else:
+                    nd[rect[1]:rect[2], rect[3]:rect[4]] = np.loadtxt(f, ndmin=2)
+            finally:
+                os.remove(f)
 
+        with ThreadPoolExecutor(max_workers=n_threads) as pool:
+            for result in [pool.submit(load, rect, file_path) for rect, file_path in zip(rects, rect_files)]:
+                result.result()
+
+        if memmap_path is not None:
+            nd.flush()
         return nd
 
     @typecheck_method(compute_uv=bool,
@@ -2399,6 +2447,24 @@ def _breeze_fromfile(uri, n_rows, n_cols):
     return Env.hail().utils.richUtils.RichDenseMatrixDouble.importFromDoubles(Env.hc()._jhc, uri, n_rows, n_cols, True)
 
 
+def _read_rectangle_into(path, out):
+    """Reads a binary rectangle file into the 2-dimensional float64 view
+    `out` without an intermediate array."""
+    size = os.path.getsize(path)
+    if size != out.nbytes:
+        raise ValueError(f'rectangle file {path} has {size} bytes, expected {out.nbytes}')
+    with open(path, 'rb', buffering=0) as f:
+        rows = [out] if out.flags.c_contiguous else out
+        for row in rows:
+            buf = memoryview(row).cast('B')
+            n = 0
+            while n < len(buf):
+                n_read = f.readinto(buf[n:])
+                if not n_read:
+                    raise ValueError(f'unexpected end of rectangle file {path}')
+                n += n_read
+
+
 def _check_entries_size(n_rows, n_cols):
     n_entries = n_rows * n_cols
     if n_entries >= 1 << 31:
@@ -62,27 +62,22 @@ def array_windows(a, radius):
     if a[-1] + radius < a[-1]:
         raise ValueError('array_windows: overflow for a[-1] + radius')
 
-    starts, stops = np.zeros(size, dtype=np.int64),  np.zeros(size, dtype=np.int64)
-    j, k = 0, 0
-    for i in range(size):
-        min_val = a[i] - radius
-        while j < size and a[j] < min_val:
-            j += 1
-        starts[i] = j
-
-        max_val = a[i] + radius
-        while k < size and a[k] <= max_val:
-            k += 1
-        stops[i] = k
+    return _array_windows(a, radius)
 
+
+def _array_windows(a, radius):
+    # a is non-empty, ascending and free of nan
+    starts = np.searchsorted(a, a - radius, side='left').astype(np.int64, copy=False)
+    stops = np.searchsorted(a, a + radius, side='right').astype(np.int64, copy=False)
     return starts, stops
 
 
 @typecheck(locus_expr=expr_locus(),
            radius=oneof(int, float),
            coord_expr=nullable(expr_float64),
-           _localize=bool)
-def locus_windows(locus_expr, radius, coord_expr=None, _localize=True):
+           _localize=bool,
+           _stream=bool)
+def locus_windows(locus_expr, radius, coord_expr=None, _localize=True, _stream=False):
     """Returns start and stop indices for window around each locus.
 
     Examples
@@ -148,6 +143,13 @@ def locus_windows(locus_expr, radius, coord_expr=None, _localize=True):
     especially useful in conjunction with
     :meth:`.BlockMatrix.sparsify_row_intervals`.
 
+    Windows are computed on the driver one contig at a time. With `_stream`
+    set, this function instead returns an iterator of ``(contig, starts,
+    stops)`` tuples, one per contig in reference genome order. The
+    coordinates of each contig are then aggregated only when its windows are
+    needed, so neither the coordinates nor the windows of all rows are held
+    at once.
+
     Parameters
     ----------
     locus_expr : :class:`.LocusExpression`
@@ -171,31 +173,38 @@ def locus_windows(locus_expr, radius, coord_expr=None, _localize=True):
         check_row_indexed('locus_windows', coord_expr)
 
     src = locus_expr._indices.source
-    if locus_expr not in src._fields_inverse:
+    annotate_fields = {}
+    if locus_expr in src._fields_inverse:
+        locus = src._fields_inverse[locus_expr]
+    else:
         locus = Env.get_uid()
-        annotate_fields = {locus: locus_expr}
-
-        if coord_expr is not None:
-            if coord_expr not in src._fields_inverse:
-                coords = Env.get_uid()
-                annotate_fields[coords] = coord_expr
-            else:
-                coords = src._fields_inverse[coord_expr]
+        annotate_fields[locus] = locus_expr
+    coords = None
+    if coord_expr is not None:
+        if coord_expr in src._fields_inverse:
+            coords = src._fields_inverse[coord_expr]
+        else:
+            coords = Env.get_uid()
+            annotate_fields[coords] = coord_expr
 
+    if annotate_fields:
         if isinstance(src, hl.MatrixTable):
-            new_src = src.annotate_rows(**annotate_fields)
+            src = src.annotate_rows(**annotate_fields)
         else:
-            new_src = src.annotate(**annotate_fields)
-
-        locus_expr = new_src[locus]
+            src = src.annotate(**annotate_fields)
+        locus_expr = src[locus]
         if coord_expr is not None:
-            coord_expr = new_src[coords]
+            coord_expr = src[coords]
 
     if coord_expr is None:
         coord_expr = locus_expr.position
+    elif _localize:
+        coord_expr = _checked_coord(coord_expr)
 
     rg = locus_expr.dtype.reference_genome
-    contig_group_expr = hl.agg.group_by(hl.locus(locus_expr.contig, 1, reference_genome=rg), hl.agg.collect(coord_expr))
+    # streamed windows read the coordinates of each contig separately
+    contig_agg = hl.agg.count() if _stream else hl.agg.collect(coord_expr)
+    contig_group_expr = hl.agg.group_by(hl.locus(locus_expr.contig, 1, reference_genome=rg), contig_agg)
 
     # check loci are in sorted order
     last_pos = hl.fold(lambda a, elt: (hl.case()
@@ -211,14 +220,62 @@ def locus_windows(locus_expr, radius, coord_expr=None, _localize=True):
 
     contig_groups = locus_expr._aggregation_method()(checked_contig_groups, _localize=False)
 
-    coords = hl.sorted(hl.array(contig_groups)).map(lambda t: t[1])
-    starts_and_stops = hl._locus_windows_per_contig(coords, radius)
-
     if not _localize:
-        return starts_and_stops
+        coords = hl.sorted(hl.array(contig_groups)).map(lambda t: t[1])
+        return hl._locus_windows_per_contig(coords, radius)
+
+    if _stream:
+        contigs = hl.eval(hl.sorted(hl.array(contig_groups)).map(lambda t: t[0].contig))
+        return _locus_windows_by_contig(_coords_by_contig(src, locus, coords, contigs), radius)
+
+    groups = hl.eval(hl.sorted(hl.array(contig_groups)).map(lambda t: (t[0].contig, _checked_ascending(t[1]))))
+    sizes = [len(contig_coords) for _, contig_coords in groups]
+    starts, stops = np.zeros(sum(sizes), dtype=np.int64), np.zeros(sum(sizes), dtype=np.int64)
+    offset = 0
+    for size, (_, contig_starts, contig_stops) in zip(sizes, _locus_windows_by_contig(groups, radius)):
+        starts[offset:offset + size] = contig_starts
+        stops[offset:offset + size] = contig_stops
+        offset += size
+    return starts, stops
+
+
+def _checked_coord(coord_expr):
+    return (hl.case()
+              .when(hl.is_defined(coord_expr), coord_expr)
+              .or_error("locus_windows: missing value for 'coord_expr'."))
+
 
-    starts, stops = hl.eval(starts_and_stops)
-    return np.array(starts), np.array(stops)
+def _checked_ascending(coords):
+    return (hl.case()
+              .when(hl.all(lambda i: coords[i] <= coords[i + 1], hl.range(0, hl.len(coords) - 1)), coords)
+              .or_error("locus_windows: 'coord_expr' must be in ascending order within each contig."))
+
+
+def _coords_by_contig(src, locus, coords, contigs):
+    """Yields each contig with the coordinates of its rows, aggregating one
+    contig at a time. When the locus is the first key, the filter on its
+    contig is pushed down and only that contig's partitions are read."""
+    for contig in contigs:
+        if isinstance(src, hl.MatrixTable):
+            rows = src.filter_rows(src[locus].contig == contig)
+            aggregate = rows.aggregate_rows
+        else:
+            rows = src.filter(src[locus].contig == contig)
+            aggregate = rows.aggregate
+        coord_expr = rows[locus].position if coords is None else _checked_coord(rows[coords])
+        yield contig, aggregate(_checked_ascending(hl.agg.collect(coord_expr)))
+
+
+def _locus_windows_by_contig(groups, radius):
+    """Yields contig, starts and stops for each contig and its coordinates in
+    `groups`, with row indices counted from the first contig."""
+    offset = 0
+    for contig, coords in groups:
+        a = np.array(coords, dtype=np.float64)
+        del coords
+        starts, stops = _array_windows(a, radius)
+        yield contig, starts + offset, stops + offset
+        offset += a.size
 
 
 def _check_dims(a, name, ndim, min_size=1):
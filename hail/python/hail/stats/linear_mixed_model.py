@@ -743,16 +743,26 @@ class LinearMixedModel(object):
 
         return Table._from_java(self._scala_model.fit(jpa_t, maybe_ja_t))
 
-    @typecheck_method(pa=np.ndarray, a=nullable(np.ndarray), return_pandas=bool)
-    def fit_alternatives_numpy(self, pa, a=None, return_pandas=False):
+    @typecheck_method(pa=np.ndarray,
+                      a=nullable(np.ndarray),
+                      return_pandas=bool,
+                      block_size=int,
+                      n_threads=int)
+    def fit_alternatives_numpy(self, pa, a=None, return_pandas=False, block_size=1024, n_threads=1):
         r"""Fit and test alternative model for each augmented design matrix.
 
         Notes
         -----
-        This Python-only implementation runs serially on master. See
+        This Python-only implementation runs on master. See
         the scalable implementation :meth:`fit_alternatives` for documentation
         of the returned table.
 
+        Alternatives are fit in blocks of `block_size` columns: the
+        statistics for a block are computed with matrix products and the
+        resulting :math:`(p + 1) \times (p + 1)` systems are solved together.
+        With `n_threads` greater than one, blocks are fit concurrently on a
+        thread pool.
+
         Parameters
         ----------
         pa: :class:`ndarray`
@@ -764,6 +774,10 @@ class LinearMixedModel(object):
             Required for low-rank inference.
         return_pandas: :obj:`bool`
             If true, return pandas dataframe. If false, return Hail table.
+        block_size: :obj:`int`
+            Number of alternatives to fit at once.
+        n_threads: :obj:`int`
+            Number of threads used to fit blocks of alternatives.
 
         Returns
         -------
@@ -774,23 +788,95 @@ class LinearMixedModel(object):
 
         if not self._fitted:
             raise Exception("null model is not fit. Run 'fit' first.")
+        if block_size < 1:
+            raise ValueError(f'block_size must be positive, found {block_size}')
+        if n_threads < 1:
+            raise ValueError(f'n_threads must be positive, found {n_threads}')
 
         n_cols = pa.shape[1]
         assert pa.shape[0] == self.r
 
         if self.low_rank:
             assert a.shape[0] == self.n and a.shape[1] == n_cols
-            data = [(i,) + self._fit_alternative_numpy(pa[:, i], a[:, i]) for i in range(n_cols)]
+
+        def fit_block(start):
+            stop = min(start + block_size, n_cols)
+            return self._fit_alternatives_block(pa[:, start:stop], a[:, start:stop] if self.low_rank else None)
+
+        starts = range(0, n_cols, block_size)
+        if n_threads > 1 and len(starts) > 1:
+            from concurrent.futures import ThreadPoolExecutor
+
+            with ThreadPoolExecutor(max_workers=n_threads) as pool:
+                blocks = list(pool.map(fit_block, starts))
         else:
-            data = [(i,) + self._fit_alternative_numpy(pa[:, i], None) for i in range(n_cols)]
+            blocks = [fit_block(start) for start in starts]
 
-        df = pd.DataFrame.from_records(data, columns=['idx', 'beta', 'sigma_sq', 'chi_sq', 'p_value'])
+        if blocks:
+            beta, sigma_sq, chi_sq, p_value = (np.concatenate(stat) for stat in zip(*blocks))
+        else:
+            beta, sigma_sq, chi_sq, p_value = 4 * [np.zeros(0)]
+
+        df = pd.DataFrame({'idx': np.arange(n_cols),
+                           'beta': beta,
+                           'sigma_sq': sigma_sq,
+                           'chi_sq': chi_sq,
+                           'p_value': p_value},
+                          columns=['idx', 'beta', 'sigma_sq', 'chi_sq', 'p_value'])
 
         if return_pandas:
             return df
         else:
             return Table.from_pandas(df, key='idx')
 
+    def _fit_alternatives_block(self, pa, a):
+        from scipy.linalg import solve, LinAlgError
+        from scipy.stats.distributions import chi2
+
+        gamma = self.gamma
+        k = pa.shape[1]
+        dpa = self._d_alt[:, np.newaxis] * pa
+
+        # xdx[j] and xdy[j] are the statistics of the alternative with column j;
+        # fixed effects are shared, and, as in solve, only the upper triangle
+        # of the null statistics is used
+        xdx_null = np.triu(self._xdx_alt[1:, 1:])
+        xdx_null = xdx_null + np.triu(xdx_null, 1).T
+
+        xdy = np.empty((k, self.f + 1))
+        xdx = np.empty((k, self.f + 1, self.f + 1))
+
+        xdy[:, 0] = self.py @ dpa
+        xdy[:, 1:] = self._xdy_alt[1:]
+        xdx[:, 0, 0] = np.einsum('ij,ij->j', pa, dpa)
+        xdx[:, 0, 1:] = (self.px.T @ dpa).T
+        if self.low_rank:
+            xdy[:, 0] += gamma * (self.y @ a)
+            xdx[:, 0, 0] += gamma * np.einsum('ij,ij->j', a, a)
+            xdx[:, 0, 1:] += gamma * (self.x.T @ a).T
+        xdx[:, 1:, 0] = xdx[:, 0, 1:]
+        xdx[:, 1:, 1:] = xdx_null
+
+        try:
+            np.linalg.cholesky(xdx)
+            beta = np.linalg.solve(xdx, xdy[:, :, np.newaxis])[:, :, 0]
+        except np.linalg.LinAlgError:
+            # some system is not positive definite; solve one at a time so
+            # that only those alternatives have missing results
+            beta = np.empty((k, self.f + 1))
+            for j in range(k):
+                try:
+                    beta[j] = solve(xdx[j], xdy[j], assume_a='pos')
+                except LinAlgError:
+                    beta[j] = float('nan')
+
+        residual_sq = self._ydy_alt - np.einsum('ij,ij->i', xdy, beta)
+        sigma_sq = residual_sq / self._dof_alt
+        chi_sq = self.n * np.log(self._residual_sq / residual_sq)  # division => precision
+        p_value = chi2.sf(chi_sq, 1)
+
+        return beta[:, 0], sigma_sq, chi_sq, p_value
+
     def _fit_alternative_numpy(self, pa, a):
         from scipy.linalg import solve, LinAlgError
         from scipy.stats.distributions import chi2
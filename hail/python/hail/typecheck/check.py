@@ -2,7 +2,9 @@ import re
 import inspect
 import abc
 import collections
-from decorator import decorator
+import contextlib
+import contextvars
+from decorator import decorate
 
 
 class TypecheckFailure(Exception):
@@ -23,6 +25,10 @@ def extract(t):
 class TypeChecker(object):
     __metaclass__ = abc.ABCMeta
 
+    # True if check never transforms its argument, so it may be skipped for
+    # trusted callers (see skip_validation)
+    validates_only = False
+
     def __init__(self):
         pass
 
@@ -30,6 +36,16 @@ class TypeChecker(object):
     def check(self, x, caller, param):
         ...
 
+    def compile(self, caller, param):
+        """Returns a function of one argument equivalent to :meth:`check` for
+        `caller` and `param`. Checkers on hot paths override this to avoid
+        the generic dispatch."""
+        check = self.check
+
+        def f(x):
+            return check(x, caller, param)
+        return f
+
     @abc.abstractmethod
     def expects(self):
         ...
@@ -48,6 +64,7 @@ class MultipleTypeChecker(TypeChecker):
             else:
                 flat_checkers.append(c)
         self.checkers = flat_checkers
+        self.validates_only = all(c.validates_only for c in flat_checkers)
         super(MultipleTypeChecker, self).__init__()
 
     def check(self, x, caller, param):
@@ -58,6 +75,32 @@ class MultipleTypeChecker(TypeChecker):
                 pass
         raise TypecheckFailure()
 
+    def compile(self, caller, param):
+        first = self.checkers[0]
+        if isinstance(first, ExactlyTypeChecker) and first.reference_equality and first.v is None:
+            # nullable
+            if len(self.checkers) == 2:
+                rest = self.checkers[1].compile(caller, param)
+            else:
+                rest = MultipleTypeChecker(self.checkers[1:]).compile(caller, param)
+
+            def check_nullable(x):
+                if x is None:
+                    return x
+                return rest(x)
+            return check_nullable
+
+        compiled = [c.compile(caller, param) for c in self.checkers]
+
+        def check(x):
+            for f in compiled:
+                try:
+                    return f(x)
+                except TypecheckFailure:
+                    pass
+            raise TypecheckFailure()
+        return check
+
     def expects(self):
         return '(' + ' or '.join([c.expects() for c in self.checkers]) + ')'
 
@@ -78,6 +121,15 @@ class SequenceChecker(TypeChecker):
             x_.append(elt_)
         return x_
 
+    def compile(self, caller, param):
+        ec = self.ec.compile(caller, param)
+
+        def check(x):
+            if not isinstance(x, collections.abc.Sequence) or isinstance(x, str):
+                raise TypecheckFailure
+            return [ec(elt) for elt in x]
+        return check
+
     def expects(self):
         return 'Sequence[%s]' % (self.ec.expects())
 
@@ -187,6 +239,8 @@ class SliceChecker(TypeChecker):
 
 
 class LinkedListChecker(TypeChecker):
+    validates_only = True
+
     def __init__(self, type):
         self.type = type
         super(LinkedListChecker, self).__init__()
@@ -204,17 +258,24 @@ class LinkedListChecker(TypeChecker):
 
 
 class AnyChecker(TypeChecker):
+    validates_only = True
+
     def __init__(self):
         super(AnyChecker, self).__init__()
 
     def check(self, x, caller, param):
         return x
 
+    def compile(self, caller, param):
+        return identity
+
     def expects(self):
         return 'any'
 
 
 class CharChecker(TypeChecker):
+    validates_only = True
+
     def __init__(self):
         super(CharChecker, self).__init__()
 
@@ -229,6 +290,8 @@ class CharChecker(TypeChecker):
 
 
 class LiteralChecker(TypeChecker):
+    validates_only = True
+
     def __init__(self, t):
         self.t = t
         super(LiteralChecker, self).__init__()
@@ -239,11 +302,22 @@ class LiteralChecker(TypeChecker):
         else:
             raise TypecheckFailure
 
+    def compile(self, caller, param):
+        t = self.t
+
+        def check(x):
+            if isinstance(x, t):
+                return x
+            raise TypecheckFailure
+        return check
+
     def expects(self):
         return extract(self.t)
 
 
 class LazyChecker(TypeChecker):
+    validates_only = True
+
     def __init__(self):
         self.t = None
         super(LazyChecker, self).__init__()
@@ -266,6 +340,8 @@ class LazyChecker(TypeChecker):
 
 
 class ExactlyTypeChecker(TypeChecker):
+    validates_only = True
+
     def __init__(self, v, reference_equality=False):
         self.v = v
         self.reference_equality = reference_equality
@@ -310,6 +386,8 @@ class CoercionChecker(TypeChecker):
 
 
 class AnyFuncChecker(TypeChecker):
+    validates_only = True
+
     def __init__(self):
         super(AnyFuncChecker, self).__init__()
 
@@ -568,6 +646,101 @@ def check_all(f, args, kwargs, checks, is_method):
     return args_, kwargs_
 
 
+class CheckPlan(object):
+    """The checks for one decorated function, prepared once from its
+    signature.
+
+    Arguments arrive normalized by :func:`decorator.decorate`: every
+    positional-or-keyword parameter is passed positionally with defaults
+    filled in, and keyword-only parameters are passed by keyword. Calls of
+    that shape are checked with compiled checkers; anything else, and any
+    failure, goes through :func:`check_all`, which produces the error
+    messages.
+    """
+
+    def __init__(self, f, checks, is_method, skip_validation=False):
+        self.f = f
+        self.checks = checks
+        self.is_method = is_method
+        self.error = None
+
+        spec = get_signature(f)
+        params = list(spec.parameters.values())
+        if is_method:
+            params = params[1:]
+        try:
+            check_meta(f, checks, is_method)
+        except RuntimeError as e:
+            self.error = e
+            return
+
+        name = f.__name__
+        offset = 1 if is_method else 0
+
+        def compile_checker(param):
+            checker = checks[param.name]
+            if skip_validation and checker.validates_only:
+                return None
+            compiled = checker.compile(name, param.name)
+            return None if compiled is identity else compiled
+
+        self.n_pos = offset
+        self.positional = []
+        self.varargs = None
+        self.has_varargs = False
+        self.keyword = []
+        self.has_varkw = False
+        self.varkw = None
+        for param in params:
+            if param.kind in (param.POSITIONAL_ONLY, param.POSITIONAL_OR_KEYWORD):
+                compiled = compile_checker(param)
+                if compiled is not None:
+                    self.positional.append((self.n_pos, compiled))
+                self.n_pos += 1
+            elif param.kind == param.VAR_POSITIONAL:
+                self.has_varargs = True
+                self.varargs = compile_checker(param)
+            elif param.kind == param.KEYWORD_ONLY:
+                self.keyword.append((param.name, compile_checker(param)))
+            else:
+                self.has_varkw = True
+                self.varkw = compile_checker(param)
+        self.keyword_names = frozenset(name for name, _ in self.keyword)
+
+    def check(self, args, kwargs):
+        if self.error is not None:
+            raise self.error
+        n = len(args)
+        if n < self.n_pos or (n > self.n_pos and not self.has_varargs) \
+                or not self.keyword_names.issubset(kwargs) \
+                or (not self.has_varkw and len(kwargs) != len(self.keyword_names)):
+            return check_all(self.f, args, kwargs, self.checks, self.is_method)
+
+        try:
+            args_ = list(args)
+            for i, check in self.positional:
+                args_[i] = check(args_[i])
+            check = self.varargs
+            if check is not None:
+                for i in range(self.n_pos, n):
+                    args_[i] = check(args_[i])
+
+            if not kwargs:
+                return args_, kwargs
+            kwargs_ = dict(kwargs)
+            for name, check in self.keyword:
+                if check is not None:
+                    kwargs_[name] = check(kwargs_[name])
+            check = self.varkw
+            if check is not None:
+                for name, arg in kwargs.items():
+                    if name not in self.keyword_names:
+                        kwargs_[name] = check(arg)
+            return args_, kwargs_
+        except TypecheckFailure:
+            return check_all(self.f, args, dict(kwargs), self.checks, self.is_method)
+
+
 def typecheck_method(**checkers):
     return _make_dec(checkers, is_method=True)
 
@@ -576,12 +749,44 @@ def typecheck(**checkers):
     return _make_dec(checkers, is_method=False)
 
 
+_skip_validation = contextvars.ContextVar('skip_validation', default=False)
+
+
+@contextlib.contextmanager
+def skip_validation():
+    """Within this context, typechecked functions skip the checks that only
+    validate their argument, e.g. of Python types. Checks that convert their
+    argument, such as expression coercions, still run.
+
+    For internal callers whose arguments are known to be valid; calls from
+    outside the context, including those of other threads, are checked as
+    usual.
+    """
+    token = _skip_validation.set(True)
+    try:
+        yield
+    finally:
+        _skip_validation.reset(token)
+
+
 def _make_dec(checkers, is_method):
     checkers = {k: only(v) for k, v in checkers.items()}
 
-    @decorator
-    def wrapper(__original_func, *args, **kwargs):
-        args_, kwargs_ = check_all(__original_func, args, kwargs, checkers, is_method=is_method)
-        return __original_func(*args_, **kwargs_)
+    def dec(f):
+        plan = CheckPlan(f, checkers, is_method)
+        # built on the first call made within skip_validation
+        trusted_plan = None
+
+        def wrapper(__original_func, *args, **kwargs):
+            nonlocal trusted_plan
+            if _skip_validation.get():
+                if trusted_plan is None:
+                    trusted_plan = CheckPlan(f, checkers, is_method, skip_validation=True)
+                args_, kwargs_ = trusted_plan.check(args, kwargs)
+            else:
+                args_, kwargs_ = plan.check(args, kwargs)
+            return __original_func(*args_, **kwargs_)
+
+        return decorate(f, wrapper)
 
-    return wrapper
+    return dec
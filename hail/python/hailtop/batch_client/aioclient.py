@@ -1,14 +1,30 @@
 import os
 import math
-import time
+import json
 import random
+import asyncio
+import aiohttp
 
 import hailtop.gear.auth as hj
 
 from .globals import complete_states
 
 
-job_array_size = 20
+job_array_size = 100
+max_parallel_job_array_submits = 8
+max_job_array_attempts = 5
+
+
+async def sleep_and_backoff(i):
+    j = random.randrange(math.floor(1.1 ** i))
+    await asyncio.sleep(0.100 * j)
+    # max 44.5s
+    return min(i + 1, 64)
+
+
+def changes_unavailable(err):
+    # servers without the changes endpoint answer 404 for it
+    return err.status == 404
 
 
 def filter_params(complete, success, attributes):
@@ -179,15 +195,28 @@ class SubmittedJob:
         return self._status
 
     async def wait(self):
+        try:
+            version = 0
+            while True:
+                # the server holds the request until this job changes
+                changes = await self._batch._client._get(
+                    f'/api/v1alpha/batches/{self.batch_id}/changes',
+                    params={'version': str(version), 'job_id': str(self.job_id)})
+                for status in changes['jobs']:
+                    if status['job_id'] == self.job_id and status['state'] in complete_states:
+                        self._status = status
+                        return status
+                version = changes['version']
+        except aiohttp.ClientResponseError as err:
+            if not changes_unavailable(err):
+                raise
+        return await self._poll()
+
+    async def _poll(self):
         i = 0
-        while True:
-            if await self.is_complete():
-                return self._status
-            j = random.randrange(math.floor(1.1 ** i))
-            time.sleep(0.100 * j)
-            # max 44.5s
-            if i < 64:
-                i = i + 1
+        while not await self.is_complete():
+            i = await sleep_and_backoff(i)
+        return self._status
 
     async def log(self):
         return await self._batch._client._get(f'/api/v1alpha/batches/{self.batch_id}/jobs/{self.job_id}/log')
@@ -205,27 +234,73 @@ class Batch:
     async def cancel(self):
         await self._client._patch(f'/api/v1alpha/batches/{self.id}/cancel')
 
-    async def status(self):
+    async def jobs(self):
+        params = {}
+        while True:
+            page = await self._client._get(f'/api/v1alpha/batches/{self.id}/jobs', params=params)
+            for j in page['jobs']:
+                yield j
+            if 'last_job_id' not in page:
+                break
+            params['last_job_id'] = str(page['last_job_id'])
+
+    async def _summary(self):
         return await self._client._get(f'/api/v1alpha/batches/{self.id}')
 
+    async def status(self):
+        status = await self._summary()
+        status['jobs'] = [j async for j in self.jobs()]
+        return status
+
+    async def changes(self, version=0):
+        """Yields the changes to the jobs of the batch after `version`.
+
+        Each change lists the jobs that were created or changed state since
+        the previous one, and whether the batch is complete.  The server
+        holds each request until there is a change, so iterating does not
+        busy-poll.
+        """
+        while True:
+            changes = await self._client._get(f'/api/v1alpha/batches/{self.id}/changes',
+                                              params={'version': str(version)})
+            yield changes
+            version = changes['version']
+
+    async def _wait_jobs(self, jobs):
+        pending = {j.job_id: j for j in jobs}
+        try:
+            async for changes in self.changes():
+                for status in changes['jobs']:
+                    job = pending.get(status['job_id'])
+                    if job is not None and status['state'] in complete_states:
+                        job._status = status
+                        del pending[job.job_id]
+                if not pending:
+                    return
+        except aiohttp.ClientResponseError as err:
+            if not changes_unavailable(err):
+                raise
+        await asyncio.gather(*[j._poll() for j in pending.values()])
+
     async def wait(self):
+        try:
+            async for changes in self.changes():
+                if changes['complete']:
+                    return await self.status()
+        except aiohttp.ClientResponseError as err:
+            if not changes_unavailable(err):
+                raise
         i = 0
-        while True:
-            status = await self.status()
-            if status['complete']:
-                return status
-            j = random.randrange(math.floor(1.1 ** i))
-            time.sleep(0.100 * j)
-            # max 44.5s
-            if i < 64:
-                i = i + 1
+        while not (await self._summary())['complete']:
+            i = await sleep_and_backoff(i)
+        return await self.status()
 
     async def delete(self):
         await self._client._delete(f'/api/v1alpha/batches/{self.id}')
 
 
 class BatchBuilder:
-    def __init__(self, client, attributes, callback):
+    def __init__(self, client, attributes, callback, coalesce_callbacks=False):
         self._client = client
         self._job_idx = 0
         self._job_docs = []
@@ -233,6 +308,7 @@ class BatchBuilder:
         self._submitted = False
         self.attributes = attributes
         self.callback = callback
+        self.coalesce_callbacks = coalesce_callbacks
 
     def create_job(self, image, command=None, args=None, env=None, ports=None,
                    resources=None, tolerations=None, volumes=None, security_context=None,
@@ -342,7 +418,27 @@ class BatchBuilder:
         self._jobs.append(j)
         return j
 
-    async def submit(self):
+    async def _submit_jobs(self, batch, chunk_id, docs):
+        # the chunk id makes retries idempotent: the server ignores a chunk
+        # it has already inserted
+        data = '\n'.join(json.dumps(doc) for doc in docs)
+        i = 0
+        attempt = 1
+        while True:
+            try:
+                await self._client._post(f'/api/v1alpha/batches/{batch.id}/jobs/create',
+                                         data=data,
+                                         params={'chunk_id': str(chunk_id)},
+                                         headers={'Content-Type': 'application/x-ndjson'})
+                return
+            except (aiohttp.ClientConnectionError, aiohttp.ClientResponseError, asyncio.TimeoutError) as err:
+                retryable = not isinstance(err, aiohttp.ClientResponseError) or err.status >= 500
+                if not retryable or attempt == max_job_array_attempts:
+                    raise
+            attempt += 1
+            i = await sleep_and_backoff(i)
+
+    async def submit(self, parallelism=max_parallel_job_array_submits):
         if self._submitted:
             raise ValueError("cannot submit an already submitted batch")
         self._submitted = True
@@ -352,22 +448,23 @@ class BatchBuilder:
             batch_doc['attributes'] = self.attributes
         if self.callback:
             batch_doc['callback'] = self.callback
+        if self.coalesce_callbacks:
+            batch_doc['coalesce_callbacks'] = True
 
         b = await self._client._post('/api/v1alpha/batches/create', json=batch_doc)
         batch = Batch(self._client, b['id'], b.get('attributes'))
 
-        docs = []
-        n = 0
-        for jdoc in self._job_docs:
-            n += 1
-            docs.append(jdoc)
-            if n == job_array_size:
-                await self._client._post(f'/api/v1alpha/batches/{batch.id}/jobs/create', json={'jobs': docs})
-                n = 0
-                docs = []
+        # chunks are inserted in any order; the server releases a job when
+        # its parents complete, whichever chunk they arrive in
+        semaphore = asyncio.Semaphore(parallelism)
+
+        async def submit_chunk(chunk_id, docs):
+            async with semaphore:
+                await self._submit_jobs(batch, chunk_id, docs)
 
-        if docs:
-            await self._client._post(f'/api/v1alpha/batches/{batch.id}/jobs/create', json={'jobs': docs})
+        await asyncio.gather(*[
+            submit_chunk(chunk_id, self._job_docs[start:start + job_array_size])
+            for chunk_id, start in enumerate(range(0, len(self._job_docs), job_array_size))])
 
         await self._client._patch(f'/api/v1alpha/batches/{batch.id}/close')
 
@@ -412,9 +509,13 @@ class BatchClient:
             self.url + path, params=params, cookies=self._cookies, headers=self._headers)
         return await response.json()
 
-    async def _post(self, path, json=None):
+    async def _post(self, path, json=None, data=None, params=None, headers=None):
+        if headers is not None:
+            headers = {**self._headers, **headers}
+        else:
+            headers = self._headers
         response = await self._session.post(
-            self.url + path, json=json, cookies=self._cookies, headers=self._headers)
+            self.url + path, json=json, data=data, params=params, cookies=self._cookies, headers=headers)
         return await response.json()
 
     async def _patch(self, path):
@@ -428,13 +529,33 @@ class BatchClient:
     async def _refresh_k8s_state(self):
         await self._post('/refresh_k8s_state')
 
+    async def batches(self, complete=None, success=None, attributes=None):
+        params = filter_params(complete, success, attributes) or {}
+        while True:
+            page = await self._get('/api/v1alpha/batches', params=params)
+            for b in page['batches']:
+                yield Batch(self,
+                            b['id'],
+                            attributes=b.get('attributes'))
+            if 'last_batch_id' not in page:
+                break
+            params['last_batch_id'] = str(page['last_batch_id'])
+
     async def list_batches(self, complete=None, success=None, attributes=None):
-        params = filter_params(complete, success, attributes)
-        batches = await self._get('/api/v1alpha/batches', params=params)
-        return [Batch(self,
-                      b['id'],
-                      attributes=b.get('attributes'))
-                for b in batches]
+        return [b async for b in self.batches(complete=complete, success=success, attributes=attributes)]
+
+    async def wait_many(self, jobs):
+        """Wait for all of `jobs` to complete.
+
+        The jobs of each batch are watched with a single long-polling
+        request at a time.  Returns the statuses of the jobs, in order.
+        """
+        by_batch = {}
+        for j in jobs:
+            job = j._job if isinstance(j, Job) else j
+            by_batch.setdefault(job.batch_id, (job._batch, []))[1].append(job)
+        await asyncio.gather(*[batch._wait_jobs(batch_jobs) for batch, batch_jobs in by_batch.values()])
+        return [(j._job if isinstance(j, Job) else j)._status for j in jobs]
 
     async def get_job(self, batch_id, job_id):
         b = await self.get_batch(batch_id)
@@ -452,8 +573,8 @@ class BatchClient:
                      b['id'],
                      attributes=b.get('attributes'))
 
-    def create_batch(self, attributes=None, callback=None):
-        return BatchBuilder(self, attributes, callback)
+    def create_batch(self, attributes=None, callback=None, coalesce_callbacks=False):
+        return BatchBuilder(self, attributes, callback, coalesce_callbacks)
 
     async def close(self):
         await self._session.close()
@@ -100,8 +100,8 @@ class BatchBuilder:
         b._async_builder = builder
         return b
 
-    def __init__(self, client, attributes, callback):
-        self._async_builder = aioclient.BatchBuilder(client, attributes, callback)
+    def __init__(self, client, attributes, callback, coalesce_callbacks=False):
+        self._async_builder = aioclient.BatchBuilder(client, attributes, callback, coalesce_callbacks)
 
     @property
     def attributes(self):
@@ -128,8 +128,8 @@ class BatchBuilder:
 
         return Job.from_async_job(async_job)
 
-    def submit(self):
-        async_batch = async_to_blocking(self._async_builder.submit())
+    def submit(self, parallelism=aioclient.max_parallel_job_array_submits):
+        async_batch = async_to_blocking(self._async_builder.submit(parallelism=parallelism))
         return Batch.from_async_batch(async_batch)
 
 
@@ -150,6 +150,9 @@ class BatchClient:
             self._async_client.list_batches(complete=complete, success=success, attributes=attributes))
         return [Batch.from_async_batch(b) for b in batches]
 
+    def wait_many(self, jobs):
+        return async_to_blocking(self._async_client.wait_many([j._async_job for j in jobs]))
+
     def get_job(self, batch_id, job_id):
         j = async_to_blocking(self._async_client.get_job(batch_id, job_id))
         return Job.from_async_job(j)
@@ -158,8 +161,9 @@ class BatchClient:
         b = async_to_blocking(self._async_client.get_batch(id))
         return Batch.from_async_batch(b)
 
-    def create_batch(self, attributes=None, callback=None):
-        builder = self._async_client.create_batch(attributes=attributes, callback=callback)
+    def create_batch(self, attributes=None, callback=None, coalesce_callbacks=False):
+        builder = self._async_client.create_batch(attributes=attributes, callback=callback,
+                                                  coalesce_callbacks=coalesce_callbacks)
         return BatchBuilder.from_async_builder(builder)
 
     def close(self):
@@ -1,4 +1,5 @@
 from .utils import run_all, run_pattern, run_single, initialize
+from .expression_benchmarks import *
 from .matrix_table_benchmarks import *
 from .methods_benchmarks import *
 from .table_benchmarks import *
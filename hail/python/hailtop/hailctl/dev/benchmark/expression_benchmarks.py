@@ -0,0 +1,39 @@
+import hail as hl
+
+from .utils import benchmark
+
+
+@benchmark
+def expression_arithmetic_construction():
+    x = hl.literal(0)
+    for i in range(100_000):
+        x = x + i
+
+
+@benchmark
+def expression_struct_construction():
+    for _ in range(100):
+        s = hl.struct(**{f'f{i}': hl.int32(i) * 2 for i in range(1_000)})
+        for i in range(1_000):
+            s[f'f{i}']
+
+
+@benchmark
+def expression_array_construction():
+    for _ in range(100):
+        hl.array([hl.float64(i) for i in range(1_000)]).map(lambda x: hl.cond(x > 0, x, hl.null(hl.tfloat64)))
+
+
+@benchmark
+def expression_call_construction():
+    for i in range(100_000):
+        hl.call(i % 3, 1, phased=bool(i % 2))
+
+
+@benchmark
+def expression_function_calls():
+    x = hl.literal(1.5)
+    for _ in range(10_000):
+        hl.max(hl.min(x, 1), hl.abs(x), hl.sqrt(x))
+        hl.format('%s %d', hl.str(x), hl.int(x))
+        hl.cond(x > 1, x, 0.0)
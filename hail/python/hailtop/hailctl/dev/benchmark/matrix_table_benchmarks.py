@@ -101,6 +101,23 @@ def matrix_table_many_aggs_col_wise():
     mt.cols()._force_count()
 
 
+def repeated_entry_exprs_mir():
+    mt = hl.read_matrix_table(resource('profile.mt'))
+    mt = mt.annotate_entries(**{f'x{i}': (mt.GT.n_alt_alleles() * i + mt.GQ / 5) * (mt.GQ / 5)
+                                for i in range(100)})
+    return mt._mir
+
+
+@benchmark(setup=repeated_entry_exprs_mir)
+def matrix_table_repeated_entry_exprs_render(mir):
+    mir.parse(hl.ir.Renderer(cse=False)(mir))
+
+
+@benchmark(setup=repeated_entry_exprs_mir)
+def matrix_table_repeated_entry_exprs_render_cse(mir):
+    mir.parse(hl.ir.Renderer(cse=True)(mir))
+
+
 @benchmark
 def matrix_table_aggregate_entries():
     mt = hl.read_matrix_table(resource('profile.mt'))
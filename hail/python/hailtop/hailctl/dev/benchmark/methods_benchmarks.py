@@ -55,4 +55,37 @@ def concordance():
     mt = mt.filter_rows(mt.alleles.length() == 2)
     g, r, c = hl.methods.qc.concordance(mt, mt, _localize_global_statistics=False)
     r._force_count()
-    c._force_count()
\ No newline at end of file
+    c._force_count()
+
+
+def _lmm_fit_alternatives_numpy(n_threads):
+    import numpy as np
+    from hail.stats import LinearMixedModel
+
+    np.random.seed(0)
+    n, f, m = 1000, 4, 20000
+    y = np.random.normal(size=n)
+    x = np.hstack([np.ones((n, 1)), np.random.normal(size=(n, f - 1))])
+    z = np.random.normal(size=(n, 500))
+    model, p = LinearMixedModel.from_random_effects(y, x, z)
+    model.fit(log_gamma=0.0)
+    a = np.random.normal(size=(n, m))
+    model.fit_alternatives_numpy(p @ a, a, return_pandas=True, n_threads=n_threads)
+
+
+@benchmark
+def lmm_fit_alternatives_numpy():
+    _lmm_fit_alternatives_numpy(1)
+
+
+@benchmark
+def lmm_fit_alternatives_numpy_threaded():
+    _lmm_fit_alternatives_numpy(4)
+
+
+@benchmark
+def block_matrix_to_numpy_blocked():
+    bm = hl.linalg.BlockMatrix.random(10000, 10000, block_size=1024, seed=0)
+    path = hl.utils.new_temp_file(suffix='bm')
+    bm.write(path)
+    hl.linalg.BlockMatrix.read(path).to_numpy(_force_blocking=True)
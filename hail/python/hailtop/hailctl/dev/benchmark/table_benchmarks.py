@@ -110,6 +110,17 @@ def table_annotate_many_nested_dependence():
         ht = ht.annotate(**{f'x{i}': i + ht[f'x{i - 1}']})
     ht._force_count()
 
+
+@benchmark
+def table_annotate_many_nested_dependence_render():
+    M = 300
+    ht = hl.utils.range_table(100).annotate(x0=1)
+    for i in range(1, M):
+        ht = ht.annotate(**{f'x{i}': i + ht[f'x{i - 1}']})
+        hash(ht._tir)
+        str(ht._tir)
+
+
 @benchmark
 def read_force_count_p1000():
     hl.read_table(resource('table_10M_par_1000.ht'))._force_count()
@@ -207,3 +218,33 @@ def join_p100_p10():
     ht1 = hl.read_table(resource('table_10M_par_100.ht'))
     ht2 = hl.read_table(resource('table_10M_par_10.ht'))
     ht1.join(ht2)._force_count()
+
+
+@benchmark
+def table_collect_numeric_json():
+    hl.read_table(resource('table_10M_par_100.ht')).collect()
+
+
+@benchmark
+def table_collect_numeric_binary():
+    hl._set_flags(binary_results='1')
+    try:
+        hl.read_table(resource('table_10M_par_100.ht')).collect()
+    finally:
+        hl._set_flags(binary_results=None)
+
+
+@benchmark
+def table_filter_by_literal_set():
+    ht = hl.read_table(resource('table_10M_par_100.ht'))
+    ids = hl.literal({i for i in range(0, 10_000_000, 5)})
+    ht.filter(ids.contains(ht.idx))._force_count()
+
+
+@benchmark
+def table_collect_numeric_binary_numpy():
+    hl._set_flags(binary_results='numpy')
+    try:
+        hl.read_table(resource('table_10M_par_100.ht')).collect()
+    finally:
+        hl._set_flags(binary_results=None)
@@ -18,18 +18,29 @@ def get_mt():
     return _mt
 
 
-def benchmark(f):
-    _registry[f.__name__] = Benchmark(f, f.__name__)
-    return f
+def benchmark(f=None, *, setup=None):
+    """Registers `f` as a benchmark.  With `setup`, each run calls
+    ``setup()`` untimed and times only ``f(setup())``."""
+    def register(f):
+        _registry[f.__name__] = Benchmark(f, f.__name__, setup)
+        return f
+    if f is None:
+        return register
+    return register(f)
 
 
 class Benchmark(object):
-    def __init__(self, f, name):
+    def __init__(self, f, name, setup=None):
         self.name = name
         self.f = f
+        self.setup = setup
 
     def run(self):
-        self.f()
+        """Runs the benchmark once and returns the time it took."""
+        if self.setup is None:
+            return timeit.Timer(lambda: self.f()).timeit(1)
+        args = self.setup()
+        return timeit.Timer(lambda: self.f(args)).timeit(1)
 
 
 _registry = {}
@@ -100,7 +111,7 @@ def _run(benchmark, n_iter):
     print(f'running {benchmark.name}...')
     times = []
     for i in range(n_iter):
-        time = timeit.Timer(lambda: benchmark.run()).timeit(1)
+        time = benchmark.run()
         times.append(time)
         print(f'    run {i + 1} took {time:.2f}s')
     print(f'    Mean, Median: {np.mean(times):.2f}s, {np.median(times):.2f}s')
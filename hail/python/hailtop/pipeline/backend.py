@@ -1,4 +1,6 @@
 import abc
+import collections
+import concurrent.futures
 import os
 import subprocess as sp
 import uuid
@@ -9,6 +11,30 @@ import aiohttp
 from .resource import InputResourceFile, TaskResourceFile
 from .utils import PipelineException
 
+
+def _parse_cpu(cpu):
+    if cpu is None:
+        return 1
+    if isinstance(cpu, str) and cpu.endswith('m'):
+        return float(cpu[:-1]) / 1000
+    return float(cpu)
+
+
+_memory_units = {'K': 1e-6, 'M': 1e-3, 'G': 1, 'T': 1e3,
+                 'Ki': 2 ** 10 / 1e9, 'Mi': 2 ** 20 / 1e9, 'Gi': 2 ** 30 / 1e9, 'Ti': 2 ** 40 / 1e9}
+
+
+def _parse_memory(memory):
+    # in GB, like Task.memory
+    if memory is None:
+        return 0
+    if isinstance(memory, str):
+        for suffix in ('Ki', 'Mi', 'Gi', 'Ti', 'K', 'M', 'G', 'T'):
+            if memory.endswith(suffix):
+                return float(memory[:-len(suffix)]) * _memory_units[suffix]
+    return float(memory)
+
+
 class Backend:
     @abc.abstractmethod
     def _run(self, pipeline, dry_run, verbose, delete_scratch_on_exit):
@@ -37,10 +63,24 @@ class LocalBackend(Backend):
         Additional flags to pass to `docker run`. Only used if a task specifies
         a docker image. This option will override the value set by the environment
         variable `HAIL_PIPELINE_EXTRA_DOCKER_RUN_FLAGS`.
+    max_cpu: :obj:`float`, optional
+        Number of cores shared by concurrently running tasks. Tasks that don't
+        set :meth:`.Task.cpu` count as one core. Defaults to the number of
+        cores on this computer.
+    max_memory: :obj:`float`, optional
+        Memory in GB shared by concurrently running tasks that set
+        :meth:`.Task.memory`. Unlimited by default.
+    log_dir: :obj:`str`, optional
+        Directory to write a log file for each task to. By default, logs are
+        written to the temporary directory.
     """
 
-    def __init__(self, tmp_dir='/tmp/', gsa_key_file=None, extra_docker_run_flags=None):
+    def __init__(self, tmp_dir='/tmp/', gsa_key_file=None, extra_docker_run_flags=None,
+                 max_cpu=None, max_memory=None, log_dir=None):
         self._tmp_dir = tmp_dir
+        self._max_cpu = max_cpu if max_cpu is not None else (os.cpu_count() or 1)
+        self._max_memory = max_memory if max_memory is not None else float('inf')
+        self._log_dir = log_dir
 
         flags = ''
 
@@ -112,13 +152,13 @@ class LocalBackend(Backend):
             script += write_inputs
             script += ['\n']
 
+        task_scripts = []
         for task in pipeline._tasks:
             os.makedirs(tmpdir + task._uid + '/', exist_ok=True)
 
-            script.append(f"# {task._uid} {task.name if task.name else ''}")
-
-            script += [x for r in task._inputs for x in copy_input(task, r)]
+            inputs = [x for r in task._inputs for x in copy_input(task, r)]
 
+            commands = []
             resource_defs = [r._declare(tmpdir) for r in task._mentioned]
 
             if task._image:
@@ -127,38 +167,157 @@ class LocalBackend(Backend):
                 memory = f'-m {task._memory}' if task._memory else ''
                 cpu = f'--cpus={task._cpu}' if task._cpu else ''
 
-                script += [f"docker run "
-                           f"{self._extra_docker_run_flags} "
-                           f"-v {tmpdir}:{tmpdir} "
-                           f"-w {tmpdir} "
-                           f"{memory} "
-                           f"{cpu} "
-                           f"{task._image} /bin/bash "
-                           f"-c {shq(defs + cmd)}",
-                           '\n']
+                commands += [f"docker run "
+                             f"{self._extra_docker_run_flags} "
+                             f"-v {tmpdir}:{tmpdir} "
+                             f"-w {tmpdir} "
+                             f"{memory} "
+                             f"{cpu} "
+                             f"{task._image} /bin/bash "
+                             f"-c {shq(defs + cmd)}",
+                             '\n']
             else:
-                script += resource_defs
-                script += task._command
+                commands += resource_defs
+                commands += task._command
 
-            script += [x for r in task._external_outputs for x in copy_external_output(r)]
-            script += ['\n']
+            commands += [x for r in task._external_outputs for x in copy_external_output(r)]
+            task_scripts.append((task, inputs, commands))
 
-        script = "\n".join(script)
         if dry_run:
-            print(script)
-        else:
+            for task, inputs, commands in task_scripts:
+                script.append(f"# {task._uid} {task.name if task.name else ''}")
+                script += inputs
+                script += commands
+                script += ['\n']
+            print("\n".join(script))
+            print('Pipeline completed successfully!')
+            return
+
+        # Input resources are copied into the scratch directory up front, so
+        # that tasks sharing an input can start in any order.
+        bash_flags = 'set -e' + ('x' if verbose else '')
+        header = ['#!/bin/bash', bash_flags, f"cd {tmpdir}"]
+        script += [x for _, inputs, _ in task_scripts for x in inputs]
+
+        try:
             try:
-                sp.check_output(script, shell=True)
+                sp.check_output("\n".join(script), shell=True)
             except sp.CalledProcessError as e:
                 print(e)
                 print(e.output)
                 raise
-            finally:
-                if delete_scratch_on_exit:
-                    sp.run(f'rm -rf {tmpdir}', shell=True)
+
+            self._execute(pipeline,
+                          {task: "\n".join(header + commands) for task, _, commands in task_scripts},
+                          tmpdir,
+                          verbose)
+        finally:
+            if delete_scratch_on_exit:
+                sp.run(f'rm -rf {tmpdir}', shell=True)
 
         print('Pipeline completed successfully!')
 
+    def _execute(self, pipeline, scripts, tmpdir, verbose):  # pylint: disable=R0912
+        """
+        Run the task scripts concurrently. A task starts once all of its
+        dependencies have succeeded and its cpu and memory requests fit in
+        what is left of the local budget. Tasks downstream of a failed task
+        are not run.
+        """
+        children = collections.defaultdict(list)
+        n_parents = {}
+        for task in pipeline._tasks:
+            n_parents[task] = len(task._dependencies)
+            for parent in task._dependencies:
+                children[parent].append(task)
+
+        def requests(task):
+            return (min(_parse_cpu(task._cpu), self._max_cpu),
+                    min(_parse_memory(task._memory), self._max_memory))
+
+        log_dir = self._log_dir if self._log_dir is not None else tmpdir + 'logs/'
+        os.makedirs(log_dir, exist_ok=True)
+
+        ready = [task for task in pipeline._tasks if n_parents[task] == 0]
+        running = {}
+        processes = {}
+        failed = []
+        n_completed = 0
+        free_cpu = self._max_cpu
+        free_memory = self._max_memory
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(len(pipeline._tasks), 1)) as pool:
+            try:
+                while ready or running:
+                    # start ready tasks in pipeline order, letting smaller
+                    # tasks fill in behind one that does not fit yet
+                    waiting = []
+                    for task in ready:
+                        cpu, memory = requests(task)
+                        if running and (cpu > free_cpu or memory > free_memory):
+                            waiting.append(task)
+                            continue
+                        free_cpu -= cpu
+                        free_memory -= memory
+                        log_path = os.path.join(log_dir, f'{task._uid}.log')
+                        future = pool.submit(self._run_task, task, scripts[task], log_path, processes, verbose)
+                        running[future] = (task, log_path)
+                    ready = waiting
+
+                    done, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+                    for future in done:
+                        task, log_path = running.pop(future)
+                        cpu, memory = requests(task)
+                        free_cpu += cpu
+                        free_memory += memory
+
+                        returncode = future.result()
+                        if returncode != 0:
+                            failed.append((task, returncode, log_path))
+                            continue
+
+                        n_completed += 1
+                        for child in children[task]:
+                            n_parents[child] -= 1
+                            if n_parents[child] == 0:
+                                ready.append(child)
+                    ready.sort(key=pipeline._tasks.index)
+            finally:
+                for proc in list(processes.values()):
+                    if proc.poll() is None:
+                        proc.kill()
+
+        if failed:
+            n_cancelled = len(pipeline._tasks) - n_completed - len(failed)
+            for task, returncode, log_path in failed:
+                with open(log_path) as log:
+                    output = log.read()
+                print(f"Task {task._uid} {task.name if task.name else ''} failed with exit code {returncode}:")
+                print(output)
+            if n_cancelled:
+                print(f'{n_cancelled} downstream tasks were not run.')
+
+            task, returncode, log_path = failed[0]
+            with open(log_path) as log:
+                raise sp.CalledProcessError(returncode, scripts[task], log.read())
+
+    @staticmethod
+    def _run_task(task, script, log_path, processes, verbose):
+        prefix = f"[{task.name if task.name else task._uid}] "
+        with open(log_path, 'w') as log:
+            proc = sp.Popen(['/bin/bash', '-c', script],
+                            stdout=sp.PIPE,
+                            stderr=sp.STDOUT,
+                            universal_newlines=True,
+                            errors='replace')
+            processes[task] = proc
+            for line in proc.stdout:
+                log.write(line)
+                log.flush()
+                if verbose:
+                    print(prefix + line, end='', flush=True)
+            return proc.wait()
+
     def _get_scratch_dir(self):
         def _get_random_name():
             directory = self._tmp_dir + '/pipeline-{}/'.format(uuid.uuid4().hex[:12])
@@ -0,0 +1,108 @@
+import json
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import hail as hl
+from hail import ir
+from hail.backend import ServiceBackend
+
+TABLE_TYPE = {'global': 'struct{}', 'row': 'struct{idx: int32}', 'row_key': ['idx']}
+
+
+class FakeApiserver(BaseHTTPRequestHandler):
+    requests = []
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        FakeApiserver.requests.append((self.path, body))
+        if self.path == '/type/value':
+            self._respond(200, 'int32')
+        elif self.path == '/type/table':
+            self._respond(200, TABLE_TYPE)
+        elif self.path == '/execute':
+            self._respond(200, {'type': 'void', 'result': json.dumps({'value': 'null', 'timings': {}})})
+        else:
+            self._respond(404, {})
+
+    def _respond(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class Tests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = HTTPServer(('127.0.0.1', 0), FakeApiserver)
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+        cls.url = f'http://127.0.0.1:{cls.server.server_address[1]}'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        FakeApiserver.requests = []
+
+    def backend(self, **kwargs):
+        return ServiceBackend(self.url, token='token', **kwargs)
+
+    def test_types_are_cached_by_rendered_ir(self):
+        backend = self.backend()
+        self.assertEqual(backend.value_type(ir.I32(1)), hl.tint32)
+        self.assertEqual(backend.value_type(ir.I32(1)), hl.tint32)
+        self.assertEqual(len(FakeApiserver.requests), 1)
+
+        backend.value_type(ir.I32(2))
+        self.assertEqual(len(FakeApiserver.requests), 2)
+
+        typ = backend.table_type(ir.TableRange(10, 2))
+        self.assertEqual(typ.row_key, ['idx'])
+        backend.table_type(ir.TableRange(10, 2))
+        self.assertEqual([path for path, _ in FakeApiserver.requests],
+                         ['/type/value', '/type/value', '/type/table'])
+
+    def test_cache_is_bounded(self):
+        backend = self.backend(type_cache_size=2)
+        for i in [1, 2, 1, 3, 1, 2]:
+            backend.value_type(ir.I32(i))
+        # 2 was evicted by 3, since 1 was used more recently
+        self.assertEqual(len(FakeApiserver.requests), 4)
+
+    def test_cache_is_cleared_by_writes(self):
+        backend = self.backend()
+        backend.table_type(ir.TableRange(10, 2))
+        backend.execute(ir.TableCount(ir.TableRange(10, 2)))
+        backend.table_type(ir.TableRange(10, 2))
+        self.assertEqual([path for path, _ in FakeApiserver.requests], ['/type/table', '/execute'])
+
+        backend.execute(ir.TableWrite(ir.TableRange(10, 2), ir.TableNativeWriter('/tmp/t.ht', True, False, None)))
+        backend.table_type(ir.TableRange(10, 2))
+        self.assertEqual([path for path, _ in FakeApiserver.requests],
+                         ['/type/table', '/execute', '/execute', '/type/table'])
+
+    def test_cache_is_cleared_by_functions_that_write(self):
+        backend = self.backend()
+        mt = ir.MatrixRead(ir.MatrixRangeReader(10, 10, None))
+        backend.table_type(ir.TableRange(10, 2))
+        backend.execute(ir.MatrixToValueApply(mt, {'name': 'ForceCountMatrixTable'}))
+        backend.table_type(ir.TableRange(10, 2))
+        self.assertEqual([path for path, _ in FakeApiserver.requests], ['/type/table', '/execute'])
+
+        backend.execute(ir.MatrixToValueApply(mt, {'name': 'MatrixWriteBlockMatrix',
+                                                   'path': '/tmp/m.bm',
+                                                   'overwrite': True,
+                                                   'entryField': 'x',
+                                                   'blockSize': 4096}))
+        backend.table_type(ir.TableRange(10, 2))
+        self.assertEqual([path for path, _ in FakeApiserver.requests],
+                         ['/type/table', '/execute', '/execute', '/type/table'])
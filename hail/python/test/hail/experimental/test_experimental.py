@@ -333,6 +333,51 @@ class Tests(unittest.TestCase):
             a2 = np.loadtxt(f'{prefix}/files/{i}.tsv')
             self.assertTrue(np.array_equal(a, a2))
     
+    def test_binary_results(self):
+        values = [
+            hl.literal([1, None, 3]),
+            hl.literal([1.5, 2.5], hl.tarray(hl.tfloat32)),
+            hl.literal([1.1, None, 0.3], hl.tarray(hl.tfloat32)),
+            hl.float32(1.1),
+            hl.literal({'a': [True, None]}),
+            hl.literal({hl.Struct(x=1, y='foo'), None}),
+            hl.tuple([hl.null(hl.tint64), hl.call(0, 1, phased=True), hl.locus('1', 100)]),
+            hl.interval(hl.locus('1', 100), hl.locus('1', 200), includes_end=True),
+            hl.null(hl.tstruct(a=hl.tstr)),
+            hl.utils.range_table(10).annotate(f=0.5).collect(_localize=False)
+        ]
+        expected = hl.eval(hl.tuple(values))
+        hl._set_flags(binary_results='1')
+        try:
+            actual = hl.eval(hl.tuple(values))
+        finally:
+            hl._set_flags(binary_results=None)
+        self.assertEqual(actual, expected)
+
+    def test_binary_results_numpy(self):
+        hl._set_flags(binary_results='numpy')
+        try:
+            dense, missing, nested = hl.eval(hl.tuple([
+                hl.literal([1.5, 2.5]),
+                hl.literal([1, None, 3]),
+                hl.struct(a=hl.literal([True, False]))]))
+        finally:
+            hl._set_flags(binary_results=None)
+        self.assertIsInstance(dense, np.ndarray)
+        self.assertTrue(np.array_equal(dense, np.array([1.5, 2.5])))
+        self.assertIsInstance(missing, np.ma.MaskedArray)
+        self.assertEqual(missing.tolist(), [1, None, 3])
+        self.assertTrue(np.array_equal(nested.a, np.array([True, False])))
+
+    def test_binary_float32_values_match_json(self):
+        from hail.experimental.codec import decode_unblocked_uncompressed, _writer
+
+        typ = hl.ttuple(hl.tfloat32, hl.tarray(hl.tfloat32))
+        value = (1.1, [1.1, None, 0.3])
+        bytes = bytearray()
+        _writer(hl.ttuple(typ))((value,), bytes)
+        self.assertEqual(decode_unblocked_uncompressed(typ, bytes), value)
+
     def test_DB(self):
         mt = hl.balding_nichols_model(n_populations=3, n_samples=50, n_variants=10010)
         
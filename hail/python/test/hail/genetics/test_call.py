@@ -94,3 +94,21 @@ class Tests(unittest.TestCase):
                                "Calls with greater than 2 alleles are not supported.",
                                Call,
                                [1, 1, 1, 1])
+
+    def test_string_round_trip(self):
+        for s, alleles, phased in [('-', [], False), ('|-', [], True), ('3', [3], False), ('|3', [3], True),
+                                   ('0/1', [0, 1], False), ('2|1', [2, 1], True), ('1000/2000', [1000, 2000], False)]:
+            c = Call._parse(s)
+            self.assertEqual(str(c), s)
+            self.assertEqual(c.alleles, alleles)
+            self.assertEqual(c.phased, phased)
+            self.assertEqual(c, Call(alleles, phased=phased))
+            self.assertEqual(hash(c), hash(Call(alleles, phased=phased)))
+
+        # unphased diploid calls are stored with sorted alleles, as in Scala
+        self.assertEqual(str(Call([1, 0])), '0/1')
+        self.assertEqual(Call([1, 0]), Call([0, 1]))
+        self.assertEqual(Call._parse('2/1').alleles, [1, 2])
+        self.assertEqual(Call([2, 1]).unphased_diploid_gt_index(), 4)
+        # packed encoding of is.hail.variant.Call
+        self.assertEqual(Call([0, 1], phased=True)._call, (1 << 3) | (2 << 1) | 1)
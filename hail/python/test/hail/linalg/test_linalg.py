@@ -1,7 +1,7 @@
 import unittest
 
 from hail.linalg import BlockMatrix
-from hail.utils import new_temp_file, new_local_temp_dir, local_path_uri, FatalError
+from hail.utils import new_temp_file, new_local_temp_dir, new_local_temp_file, local_path_uri, FatalError
 from ..helpers import *
 import numpy as np
 import tempfile
@@ -162,6 +162,12 @@ class Tests(unittest.TestCase):
 
         self._assert_eq(bm.to_numpy(_force_blocking=True), a)
 
+        for force_blocking in [False, True]:
+            memmap_path = new_local_temp_file()
+            actual = bm.to_numpy(memmap_path=memmap_path, _force_blocking=force_blocking)
+            self.assertIsInstance(actual, np.memmap)
+            self._assert_eq(actual, a)
+
     def test_to_table(self):
         schema = hl.tstruct(row_idx=hl.tint64, entries=hl.tarray(hl.tfloat64))
         rows = [{'row_idx': 0, 'entries': [0.0, 1.0]},
@@ -762,6 +768,13 @@ class Tests(unittest.TestCase):
                              [7.0, 0.0]])
         self._assert_eq(expected, BlockMatrix.rectangles_to_numpy(rect_path))
         self._assert_eq(expected, BlockMatrix.rectangles_to_numpy(rect_bytes_path, binary=True))
+        self._assert_eq(expected, BlockMatrix.rectangles_to_numpy(rect_bytes_path, binary=True, n_threads=1))
+
+        memmap_path = new_local_temp_file()
+        actual = BlockMatrix.rectangles_to_numpy(rect_bytes_path, binary=True, memmap_path=memmap_path)
+        self.assertIsInstance(actual, np.memmap)
+        self._assert_eq(expected, actual)
+        self._assert_eq(expected, np.fromfile(memmap_path).reshape((3, 2)))
 
     def test_block_matrix_entries(self):
         n_rows, n_cols = 5, 3
@@ -809,6 +822,12 @@ class Tests(unittest.TestCase):
         assert_eq(starts, [0, 1, 1, 2, 4])
         assert_eq(stops, [1, 3, 4, 4, 5])
 
+        a = np.sort(np.random.randint(0, 100, size=200))
+        starts, stops = hl.linalg.utils.array_windows(a, 5)
+        for i in range(a.size):
+            window = np.flatnonzero(np.abs(a - a[i]) <= 5)
+            self.assertEqual((starts[i], stops[i]), (window[0], window[-1] + 1))
+
         self.assertRaises(ValueError, lambda: hl.linalg.utils.array_windows(np.array([1, 0]), -1))
         self.assertRaises(ValueError, lambda: hl.linalg.utils.array_windows(np.array([0, float('nan')]), 1))
         self.assertRaises(ValueError, lambda: hl.linalg.utils.array_windows(np.array([float('nan')]), 1))
@@ -857,6 +876,15 @@ class Tests(unittest.TestCase):
         assert_eq(starts, [0, 1, 1, 3, 3, 5])
         assert_eq(stops, [1, 3, 3, 5, 5, 6])
 
+        windows = list(hl.linalg.utils.locus_windows(ht.locus, 1, _stream=True))
+        self.assertEqual([contig for contig, _, _ in windows], ['1', '2', '3'])
+        assert_eq(np.concatenate([starts for _, starts, _ in windows]), [0, 0, 2, 3, 3, 5])
+        assert_eq(np.concatenate([stops for _, _, stops in windows]), [2, 2, 3, 5, 5, 6])
+
+        windows = list(hl.linalg.utils.locus_windows(ht.locus, 1.0, coord_expr=ht.cm, _stream=True))
+        assert_eq(np.concatenate([starts for _, starts, _ in windows]), [0, 1, 1, 3, 3, 5])
+        assert_eq(np.concatenate([stops for _, _, stops in windows]), [1, 3, 3, 5, 5, 6])
+
         with self.assertRaises(FatalError) as cm:
             hl.linalg.utils.locus_windows(ht.order_by(ht.cm).locus, 1.0)
         self.assertTrue('ascending order' in str(cm.exception))
@@ -895,6 +923,18 @@ class Tests(unittest.TestCase):
         with self.assertRaises(FatalError) as cm:
             hl.linalg.utils.locus_windows(ht.locus, 1.0, coord_expr=ht.cm)
         self.assertTrue("missing value for 'coord_expr'" in str(cm.exception))
+        with self.assertRaises(FatalError) as cm:
+            list(hl.linalg.utils.locus_windows(ht.locus, 1.0, coord_expr=ht.cm, _stream=True))
+        self.assertTrue("missing value for 'coord_expr'" in str(cm.exception))
+
+        ht = hl.Table.parallelize([{'locus': hl.Locus('1', 1), 'cm': 2.0}, {'locus': hl.Locus('1', 2), 'cm': 1.0}],
+                                  hl.tstruct(locus=hl.tlocus('GRCh37'), cm=hl.tfloat64), key=['locus'])
+        with self.assertRaises(FatalError) as cm:
+            hl.linalg.utils.locus_windows(ht.locus, 1.0, coord_expr=ht.cm)
+        self.assertTrue("ascending order" in str(cm.exception))
+        with self.assertRaises(FatalError) as cm:
+            list(hl.linalg.utils.locus_windows(ht.locus, 1.0, coord_expr=ht.cm, _stream=True))
+        self.assertTrue("ascending order" in str(cm.exception))
 
     def test_write_overwrite(self):
         path = new_temp_file()
@@ -265,6 +265,41 @@ class Tests(unittest.TestCase):
         self.assertAlmostEqual(stats.beta, beta1[0])
         self.assertAlmostEqual(stats.chi_sq, chi_sq)
 
+    def test_fit_alternatives_numpy_blocks(self):
+        np.random.seed(0)
+        n, f, m = 50, 3, 25
+        y = np.random.normal(size=n)
+        x = np.hstack([np.ones((n, 1)), np.random.normal(size=(n, f - 1))])
+        z = np.random.normal(size=(n, 10))
+        a = np.random.normal(size=(n, m))
+        columns = ['beta', 'sigma_sq', 'chi_sq', 'p_value']
+
+        # full rank
+        model, p = LinearMixedModel.from_kinship(y, x, z @ z.T)
+        model.fit(log_gamma=0.0)
+        pa = p @ a
+        expected = np.array([model._fit_alternative_numpy(pa[:, i], None) for i in range(m)])
+        for block_size, n_threads in [(1024, 1), (1, 1), (7, 1), (7, 3)]:
+            res = model.fit_alternatives_numpy(pa, return_pandas=True, block_size=block_size, n_threads=n_threads)
+            self.assertEqual(list(res['idx']), list(range(m)))
+            self.assertTrue(np.allclose(res[columns].values, expected))
+
+        # low rank
+        model, p = LinearMixedModel.from_random_effects(y, x, z)
+        model.fit(log_gamma=0.0)
+        pa = p @ a
+        expected = np.array([model._fit_alternative_numpy(pa[:, i], a[:, i]) for i in range(m)])
+        for block_size, n_threads in [(1024, 1), (7, 3)]:
+            res = model.fit_alternatives_numpy(pa, a, return_pandas=True, block_size=block_size, n_threads=n_threads)
+            self.assertTrue(np.allclose(res[columns].values, expected))
+
+        # a constant zero alternative has no fit, the others are unaffected
+        a[:, 3] = 0.0
+        pa = p @ a
+        res = model.fit_alternatives_numpy(pa, a, return_pandas=True, block_size=10)
+        self.assertTrue(np.all(np.isnan(res[columns].values[3])))
+        self.assertTrue(np.allclose(res[columns].values[4], expected[4]))
+
     @skip_unless_spark_backend()
     def test_linear_mixed_model_function(self):
         n, f, m = 4, 2, 3
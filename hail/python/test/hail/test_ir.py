@@ -1,3 +1,4 @@
+import json
 import unittest
 import hail as hl
 import hail.ir as ir
@@ -129,6 +130,7 @@ class ValueIRTests(unittest.TestCase):
         env = {name: t._parsable_string() for name, t in env.items()}
         for x in self.value_irs():
             Env.hail().expr.ir.IRParser.parse_value_ir(str(x), env, {})
+            Env.hail().expr.ir.IRParser.parse_value_ir(ir.Renderer(cse=True)(x), env, {})
 
     def test_copies(self):
         for x in self.value_irs():
@@ -275,6 +277,43 @@ class MatrixIRTests(unittest.TestCase):
         # ht._force_count()
 
 
+class NativeMetadataTypeTests(unittest.TestCase):
+    def test_table_types_match_backend(self):
+        from hail.ir.native_metadata import native_metadata_type
+
+        for path in [resource('backward_compatability/1.0.0/table/0.ht'),
+                     resource('backward_compatability/1.1.0/table/0.ht'),
+                     resource('sample.vcf.mt/rows')]:
+            tir = ir.TableRead(ir.TableNativeReader(path, None, False))
+            self.assertEqual(native_metadata_type(path), Env.backend().table_type(tir))
+
+    def test_matrix_types_match_backend(self):
+        from hail.ir.native_metadata import native_metadata_type
+
+        for path in [resource('backward_compatability/1.0.0/matrix_table/0.hmt'),
+                     resource('backward_compatability/1.1.0/matrix_table/0.hmt'),
+                     resource('sample.vcf.mt')]:
+            mir = ir.MatrixRead(ir.MatrixNativeReader(path, None, False))
+            self.assertEqual(native_metadata_type(path), Env.backend().matrix_type(mir))
+
+    def test_unsupported_paths(self):
+        from hail.ir.native_metadata import native_metadata_type
+
+        self.assertIsNone(native_metadata_type(resource('does_not_exist.ht')))
+        self.assertIsNone(native_metadata_type(resource('sample.vcf')))
+
+    def test_malformed_metadata(self):
+        from hail.ir.native_metadata import native_metadata_type
+
+        for table_type in ['Table{global:Struct{}', 'Table{global:Struct{},key:[],row:Struct{l:Locus(nope)}}']:
+            path = new_temp_file(suffix='ht')
+            with hl.hadoop_open(path + '/metadata.json.gz', 'w') as f:
+                f.write(json.dumps({'file_version': (1 << 16) | (1 << 8),
+                                    'name': 'TableSpec',
+                                    'table_type': table_type}))
+            self.assertIsNone(native_metadata_type(path))
+
+
 class BlockMatrixIRTests(unittest.TestCase):
     def blockmatrix_irs(self):
         scalar_ir = ir.F64(2)
@@ -351,3 +390,72 @@ class ValueTests(unittest.TestCase):
                     None))
             new_globals = hl.eval(hl.Table(map_globals_ir).index_globals())
             self.assertEqual(new_globals, hl.Struct(foo=v))
+
+    def test_common_subexpression_elimination(self):
+        x = hl.literal([1, 2, 3])
+        y = hl.len(x) * 2 + 1
+        z = hl.struct(a=y, b=y - 1, c=hl.cond(y > 3, y, 0), d=hl.map(lambda e: e + y + y, x))
+        optimized = ir.eliminate_common_subexpressions(z._ir)
+        self.assertIsInstance(optimized, ir.Let)
+        self.assertLess(len(str(optimized)), len(str(z._ir)))
+        self.assertEqual(hl.eval(z), hl.Struct(a=7, b=6, c=7, d=[15, 16, 17]))
+
+    def test_common_subexpression_elimination_keeps_randomness(self):
+        x = hl.rand_unif(0, 1, seed=0)
+        optimized = ir.eliminate_common_subexpressions(hl.tuple([x, x])._ir)
+        self.assertEqual(str(optimized).count('ApplySeeded'), 2)
+
+    def test_common_subexpression_elimination_over_tables(self):
+        ht = hl.utils.range_table(10, 2).annotate_globals(g=5)
+        g = ht.g + 1
+        count = ir.TableCount(ht._tir)
+        self.assertIs(ir.eliminate_common_subexpressions(count), count)
+
+        # the query is evaluated in the scope of the table, so nothing it
+        # refers to may be bound outside the aggregation
+        x = ir.MakeTuple([count, ir.TableAggregate(ht._tir, hl.tuple([g, g])._ir)])
+        optimized = ir.eliminate_common_subexpressions(x)
+        self.assertIsInstance(optimized, ir.MakeTuple)
+        self.assertIsInstance(optimized.children[1].query, ir.Let)
+
+        self.assertEqual(ht.count(), 10)
+        self.assertEqual(ht.aggregate((g, g, hl.agg.sum(ht.idx + g))), (6, 6, 105))
+
+    def test_large_literals_sent_out_of_band(self):
+        n = ir.ir._OUT_OF_BAND_LITERAL_SIZE
+        for t, v in [(hl.tset(hl.tstr), {str(i) for i in range(n)}),
+                     (hl.tarray(hl.tint32), [None if i % 7 == 0 else i for i in range(n)]),
+                     (hl.tdict(hl.tint32, hl.tstruct(x=hl.tstr)), {i: hl.Struct(x=str(i)) for i in range(n)})]:
+            lit = ir.Literal(t, v)
+            r = ir.Renderer(stop_at_jir=True)
+            self.assertEqual(r(lit), '(JavaIR m0)')
+            # literals of the same value are deduplicated, in Python and in the JVM
+            self.assertEqual(hash(lit), hash(ir.Literal(t, v)))
+            self.assertIs(ir.Literal(t, v)._to_java(), lit._to_java())
+
+            map_globals_ir = ir.TableMapGlobals(
+                ir.TableRange(1, 1),
+                ir.InsertFields(ir.Ref("global"), [("foo", lit)], None))
+            self.assertEqual(hl.eval(hl.Table(map_globals_ir).index_globals()), hl.Struct(foo=v))
+
+    def test_rendering_cache_holds_root_only(self):
+        chain = [ir.TableRange(10, 1)]
+        for i in range(5):
+            chain.append(ir.TableMapGlobals(chain[-1], ir.MakeStruct([('x', ir.I32(i))])))
+        rendered = ir.Renderer()(chain[-1])
+        self.assertEqual(chain[-1]._rendered, rendered)
+        self.assertTrue(all(x._rendered is None for x in chain[:-1]))
+
+        extended = ir.TableMapGlobals(chain[-1], ir.MakeStruct([]))
+        self.assertIn(rendered, ir.Renderer()(extended))
+        self.assertIsNone(chain[-1]._rendered_cse)
+
+    def test_rendering_cache_depends_on_mode(self):
+        n = ir.ir._OUT_OF_BAND_LITERAL_SIZE
+        lit = ir.Literal(hl.tarray(hl.tint32), list(range(n)))
+        for x in [ir.MakeTuple([lit]),
+                  ir.TableMapGlobals(ir.TableRange(1, 1), ir.InsertFields(ir.Ref("global"), [("foo", lit)], None))]:
+            self.assertIn(str(n - 1), str(x))
+            rendered = ir.Renderer(stop_at_jir=True)(x)
+            self.assertIn('(JavaIR m0)', rendered)
+            self.assertNotIn(str(n - 1), rendered)
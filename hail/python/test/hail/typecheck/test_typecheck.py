@@ -277,3 +277,38 @@ class Tests(unittest.TestCase):
         f(1)
         with self.assertRaises(TypeError):
             f(1, 2)
+
+    def test_compiled_plan(self):
+        @typecheck(a=nullable(int), b=sequenceof(oneof(int, str)), c=transformed((int, str)), d=anytype)
+        def f(a, b=(), *, c=1, d=None):
+            return a, b, c, d
+
+        self.assertEqual(f(None), (None, [], '1', None))
+        self.assertEqual(f(1, (2, 'x'), c=3, d=f), (1, [2, 'x'], '3', f))
+        with self.assertRaisesRegex(TypeError, "f: parameter 'a': expected \\(None or int\\), found str: x"):
+            f('x')
+        with self.assertRaisesRegex(TypeError, "parameter 'b'"):
+            f(1, (2, 3.0))
+        with self.assertRaisesRegex(TypeError, "parameter 'c'"):
+            f(1, c='3')
+
+    def test_plan_skip_validation(self):
+        def f(a, b):
+            return a, b
+
+        plan = CheckPlan(f, {'a': only(int), 'b': transformed((int, str))}, False, skip_validation=True)
+        # validation-only checks are skipped, conversions still run
+        self.assertEqual(plan.check(('x', 1), {}), (['x', '1'], {}))
+        self.assertEqual(plan.check((1, 1), {}), ([1, '1'], {}))
+
+    def test_skip_validation(self):
+        @typecheck(a=int, b=transformed((int, str)))
+        def f(a, b):
+            return a, b
+
+        with skip_validation():
+            # validation-only checks are skipped, conversions still run
+            self.assertEqual(f('x', 1), ('x', '1'))
+        with self.assertRaisesRegex(TypeError, "parameter 'a'"):
+            f('x', 1)
+        self.assertEqual(f(1, 1), (1, '1'))
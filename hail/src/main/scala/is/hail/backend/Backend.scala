@@ -1,18 +1,23 @@
 package is.hail.backend
 
-import is.hail.annotations.{Region, SafeRow}
+import is.hail.annotations.{Region, RegionValueBuilder, SafeRow}
 import is.hail.backend.spark.SparkBackend
 import is.hail.expr.ir.IRParser
 import is.hail.io.CodecSpec
 import is.hail.{HailContext, cxx}
 import is.hail.expr.JSONAnnotationImpex
-import is.hail.expr.ir.{Compilable, Compile, CompileAndEvaluate, ExecuteContext, IR, MakeTuple, Pretty}
-import is.hail.expr.types.physical.PTuple
+import is.hail.expr.ir.{Compilable, Compile, CompileAndEvaluate, ExecuteContext, IR, Literal, MakeTuple, Pretty}
+import is.hail.expr.types.physical.{PTuple, PType}
 import is.hail.expr.types.virtual.TVoid
 import is.hail.utils._
 import org.json4s.DefaultFormats
+import org.apache.spark.sql.Row
 import org.json4s.jackson.{JsonMethods, Serialization}
 
+import java.security.MessageDigest
+import java.util
+import java.util.Map.Entry
+
 import scala.reflect.ClassTag
 
 abstract class BroadcastValue[T] { def value: T }
@@ -96,6 +101,26 @@ abstract class Backend {
     Serialization.write(Map("value" -> jsonValue, "timings" -> timings.value))(new DefaultFormats {})
   }
 
+  // Returns the encoded result alongside the parsable string of the all-optional
+  // physical type it was encoded with, so the Python side can decode it from the
+  // virtual type alone.
+  def executeEncode(ir: IR, codecString: String): (String, Array[Byte], String) = {
+    val t = ir.typ
+    val (value, timings) = execute(ir, optimize = true)
+    timings.logInfo()
+
+    val codec = CodecSpec.fromShortString(codecString)
+    val pt = PTuple(FastIndexedSeq(PType.canonical(t.deepOptional())))
+    val bytes = Region.scoped { region =>
+      val rvb = new RegionValueBuilder(region)
+      rvb.start(pt)
+      rvb.addAnnotation(pt.virtualType, Row(value))
+      codec.encode(pt, region, rvb.end())
+    }
+
+    (pt.parsableString(), bytes, Serialization.write(timings.value)(new DefaultFormats {}))
+  }
+
   def encode(ir0: IR, codecString: String): (String, Array[Byte]) = {
     val codec = CodecSpec.fromShortString(codecString)
     val ir = lower(ir0, None, false)
@@ -133,3 +158,41 @@ abstract class Backend {
 
   def asSpark(): SparkBackend = fatal("SparkBackend needed for this operation.")
 }
+
+object Backend {
+  // Large literals are sent by Python as encoded bytes, outside of the IR
+  // text. They are kept by type and SHA-256 digest of their encoding, so that
+  // queries using the same value share one decoded copy and Python can skip
+  // sending it again.
+  private[this] val literalCacheCapacity = 16
+
+  private[this] val literalCache = new util.LinkedHashMap[(String, String), IR](literalCacheCapacity, 0.75f, true) {
+    override def removeEldestEntry(eldest: Entry[(String, String), IR]): Boolean = size() > literalCacheCapacity
+  }
+
+  def cachedLiteral(typeString: String, digest: String): IR = literalCache.synchronized {
+    literalCache.get((typeString, digest))
+  }
+
+  def decodeLiteral(typeString: String, bytes: Array[Byte], digest: String): IR = {
+    val cached = cachedLiteral(typeString, digest)
+    if (cached != null)
+      return cached
+
+    val actualDigest = MessageDigest.getInstance("SHA-256").digest(bytes).map("%02x".format(_)).mkString
+    if (actualDigest != digest)
+      fatal(s"literal digest mismatch: expected $digest, found $actualDigest")
+
+    val t = IRParser.parseType(typeString)
+    val pt = PTuple(FastIndexedSeq(PType.canonical(t.deepOptional())))
+    val value = Region.scoped { region =>
+      val codec = CodecSpec.fromShortString("unblockedUncompressed")
+      SafeRow(pt, region, codec.decode(pt, bytes, region)).get(0)
+    }
+    val ir = Literal.coerce(t, value)
+    literalCache.synchronized {
+      literalCache.put((typeString, digest), ir)
+    }
+    ir
+  }
+}
@@ -15,6 +15,9 @@ import scala.reflect.ClassTag
 
 object SparkBackend {
   def executeJSON(ir: IR): String = HailContext.backend.executeJSON(ir)
+
+  def executeEncode(ir: IR, codecString: String): (String, Array[Byte], String) =
+    HailContext.backend.executeEncode(ir, codecString)
 }
 
 class SparkBroadcastValue[T](bc: Broadcast[T]) extends BroadcastValue[T] with Serializable {
@@ -318,6 +318,8 @@ abstract class Type extends BaseType with Serializable {
         TStruct(t.fields.map(f => Field(f.name, f.typ.deepOptional(), f.index)))
       case t: TTuple =>
         TTuple(t.types.map(_.deepOptional()))
+      case t: TInterval =>
+        TInterval(t.pointType.deepOptional())
       case t =>
         t.setRequired(false)
     }
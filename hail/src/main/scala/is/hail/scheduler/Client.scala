@@ -12,9 +12,16 @@ object ClientMessage {
   // Client => Scheduler
   val SUBMIT = 5
 
+  val ACKTASKRESULT = 7
+  val NEGOTIATE = 8
+  val ACKTASKRESULTBATCH = 12
+
   // Scheduler => Client
   val APPTASKRESULT = 6
-  val ACKTASKRESULT = 7
+  val APPTASKRESULTBATCH = 11
+
+  // most results accepted in one batched frame
+  val maxBatchSize = 1024
 }
 
 class SubmitterThread(host: String, token: Token, q: LinkedBlockingQueue[Option[(Token, DArray[_])]]) extends Runnable {
@@ -119,6 +126,8 @@ class SchedulerAppClient(host: String) {
       s = new DataSocket(new Socket(host, 5053))
       info(s"SchedulerAppClient.getConnection: connected to $host:5053")
       writeByteArray(token, s.out)
+      s.out.writeInt(ClientMessage.NEGOTIATE)
+      s.out.writeInt(ClientMessage.maxBatchSize)
       s.out.flush()
       socket = s
     }
@@ -143,10 +152,16 @@ class SchedulerAppClient(host: String) {
     }
   }
 
-  private def sendAckTask(s: DataSocket, index: Int, taskID: Token): Unit = {
-    s.out.writeInt(ClientMessage.ACKTASKRESULT)
-    writeByteArray(taskID, s.out)
-    s.out.writeInt(index)
+  private def sendAckTasks(s: DataSocket, indices: IndexedSeq[Int], taskID: Token): Unit = {
+    if (indices.length == 1) {
+      s.out.writeInt(ClientMessage.ACKTASKRESULT)
+      writeByteArray(taskID, s.out)
+    } else {
+      s.out.writeInt(ClientMessage.ACKTASKRESULTBATCH)
+      writeByteArray(taskID, s.out)
+      s.out.writeInt(indices.length)
+    }
+    indices.foreach(s.out.writeInt)
     s.out.flush()
   }
 
@@ -156,38 +171,45 @@ class SchedulerAppClient(host: String) {
     callbackExc = null
   }
 
+  private def handleResult(index: Int, res: Any): Unit = {
+    log.info(s"SchedulerAppClient.receive: received task result for index $index / $nTasks.")
+
+    res match {
+      case re: RemoteException =>
+        // we are done here
+        clear()
+        throw new BreakRetryException(re.getCause)
+      case _ =>
+        if (!receivedTasks.contains(index)) {
+          try {
+            callback(index, res)
+          } catch {
+            case e: Exception =>
+              log.info(s"SchedulerAppClient.receive: got callback exception for task $index / $nTasks:\n$e")
+              callbackExc = e
+          }
+          receivedTasks += index
+          nComplete += 1
+        }
+        log.info(s"SchedulerAppClient.receive: tasks completed: $nComplete / $nTasks.")
+    }
+  }
+
   private def receive(taskID: Token): Unit = {
     withConnection { s =>
       while (nComplete < nTasks) {
         val msg = s.in.readInt()
-        assert(msg == ClientMessage.APPTASKRESULT)
+        assert(msg == ClientMessage.APPTASKRESULT || msg == ClientMessage.APPTASKRESULTBATCH)
         val taskToken = readByteArray(s.in)
         assert(taskID sameElements taskToken)
 
-        val index = s.in.readInt()
-        val res = readObject[Any](s.in)
-        log.info(s"SchedulerAppClient.receive: received task result for index $index / $nTasks.")
-
-        res match {
-          case re: RemoteException =>
-            // we are done here
-            clear()
-            throw new BreakRetryException(re.getCause)
-          case _ =>
-            if (!receivedTasks.contains(index)) {
-              try {
-                callback(index, res)
-              } catch {
-                case e: Exception =>
-                  log.info(s"SchedulerAppClient.receive: got callback exception for task $index / $nTasks:\n$e")
-                  callbackExc = e
-              }
-              receivedTasks += index
-              nComplete += 1
-            }
-            log.info(s"SchedulerAppClient.receive: tasks completed: $nComplete / $nTasks.")
-            sendAckTask(s, index, taskID)
+        val n = if (msg == ClientMessage.APPTASKRESULT) 1 else s.in.readInt()
+        val indices = (0 until n).map { _ =>
+          val index = s.in.readInt()
+          handleResult(index, readObject[Any](s.in))
+          index
         }
+        sendAckTasks(s, indices, taskID)
       }
     }
   }
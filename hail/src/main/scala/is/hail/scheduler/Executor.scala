@@ -2,7 +2,9 @@ package is.hail.scheduler
 
 import java.io._
 import java.net.Socket
-import java.util.concurrent.Executors
+import java.util
+import java.util.concurrent.{Executors, LinkedBlockingQueue}
+import scala.collection.JavaConverters._
 import scala.collection.mutable
 
 import is.hail.utils._
@@ -12,10 +14,16 @@ class RemoteException(cause: Throwable) extends Exception(cause)
 object ExecutorMessage {
   // Scheduler => Executor
   val EXECUTE = 2
+  val EXECUTEBATCH = 9
 
   // Executor => Scheduler
   val PING = 1
   val TASKRESULT = 4
+  val NEGOTIATE = 8
+  val TASKRESULTBATCH = 10
+
+  // most tasks or results accepted in one batched frame
+  val maxBatchSize = 1024
 }
 
 class TaskThread[T](ex: Executor, taskId: Int, f: () => T) extends Runnable {
@@ -32,6 +40,13 @@ class TaskThread[T](ex: Executor, taskId: Int, f: () => T) extends Runnable {
   }
 }
 
+class ResultSenderThread(ex: Executor) extends Runnable {
+  def run(): Unit = {
+    while (true)
+      ex.sendQueuedResults()
+  }
+}
+
 class PingThread(ex: Executor) extends Runnable {
   def run(): Unit = {
     while (true) {
@@ -62,6 +77,9 @@ class Executor(host: String, nCores: Int) extends Runnable {
 
   private var pendingResults = new mutable.ArrayBuffer[TaskResult[_]]()
 
+  // results of finished tasks, sent in batches by a ResultSenderThread
+  private val resultQueue = new LinkedBlockingQueue[TaskResult[_]]()
+
   def sendPing(): Unit = outLock.synchronized {
     val s = socket
     if (s != null) {
@@ -77,23 +95,43 @@ class Executor(host: String, nCores: Int) extends Runnable {
     }
   }
 
-  def sendTaskResult[T](taskId: Int, result: T): Unit = outLock.synchronized {
-    val s = socket
-    if (s != null) {
-      try {
-        s.out.writeInt(ExecutorMessage.TASKRESULT)
-        s.out.writeInt(taskId)
-        writeObject(result, s.out)
-        s.out.flush()
-        log.info(s"sent task $taskId result")
-      } catch {
-        case e: Exception =>
-          log.error(s"Client.sendTaskResult: queuing result, send failed due to exception: $e")
-          pendingResults += new TaskResult(taskId, result)
-          closeConnection()
+  def sendTaskResult[T](taskId: Int, result: T): Unit = {
+    resultQueue.put(new TaskResult(taskId, result))
+  }
+
+  // blocks until a result is ready, then sends it together with any others
+  // that are ready in one frame
+  def sendQueuedResults(): Unit = {
+    val batch = new util.ArrayList[TaskResult[_]]()
+    batch.add(resultQueue.take())
+    resultQueue.drainTo(batch, ExecutorMessage.maxBatchSize - 1)
+    val results = batch.asScala
+
+    outLock.synchronized {
+      val s = socket
+      if (s != null) {
+        try {
+          if (results.length == 1) {
+            s.out.writeInt(ExecutorMessage.TASKRESULT)
+          } else {
+            s.out.writeInt(ExecutorMessage.TASKRESULTBATCH)
+            s.out.writeInt(results.length)
+          }
+          results.foreach { tr =>
+            s.out.writeInt(tr.taskId)
+            writeObject(tr.result, s.out)
+          }
+          s.out.flush()
+          log.info(s"sent ${ results.length } task results")
+        } catch {
+          case e: Exception =>
+            log.error(s"Client.sendTaskResult: queuing results, send failed due to exception: $e")
+            pendingResults ++= results
+            closeConnection()
+        }
+      } else {
+        pendingResults ++= results
       }
-    } else {
-      pendingResults += new TaskResult(taskId, result)
     }
   }
 
@@ -105,20 +143,30 @@ class Executor(host: String, nCores: Int) extends Runnable {
     pool.execute(new TaskThread(this, taskId, f))
   }
 
+  def handleExecuteBatch(): Unit = {
+    val n = socket.in.readInt()
+    var i = 0
+    while (i < n) {
+      handleExecute()
+      i += 1
+    }
+  }
+
   def run1(): Unit = {
     try {
       val s = new DataSocket(new Socket(host, 5051))
 
       s.out.writeInt(nCores)
+      s.out.writeInt(ExecutorMessage.NEGOTIATE)
+      s.out.writeInt(ExecutorMessage.maxBatchSize)
       s.out.flush()
 
-      socket = s
-      log.info(s"Client.run1: connected to $host:5051")
+      outLock.synchronized {
+        socket = s
+        log.info(s"Client.run1: connected to $host:5051")
 
-      while (pendingResults.nonEmpty) {
-        val tr = pendingResults.last
-        sendTaskResult(tr.taskId, tr.result)
-        pendingResults.reduceToSize(pendingResults.size - 1)
+        pendingResults.foreach(tr => resultQueue.put(tr))
+        pendingResults.clear()
       }
 
       while (true) {
@@ -126,6 +174,8 @@ class Executor(host: String, nCores: Int) extends Runnable {
         msg match {
           case ExecutorMessage.EXECUTE =>
             handleExecute()
+          case ExecutorMessage.EXECUTEBATCH =>
+            handleExecuteBatch()
         }
       }
     } finally {
@@ -134,6 +184,9 @@ class Executor(host: String, nCores: Int) extends Runnable {
   }
 
   def run(): Unit = {
+    val rt = new Thread(new ResultSenderThread(this))
+    rt.start()
+
     retry(run1)
   }
 
@@ -128,6 +128,44 @@ class LocalTests(unittest.TestCase):
         with self.assertRaises(sp.CalledProcessError):
             p.run()
 
+    def test_independent_tasks_run_concurrently(self):
+        with tempfile.TemporaryDirectory() as flags:
+            p = Pipeline(backend=LocalBackend(max_cpu=2))
+            for name, other in [('a', 'b'), ('b', 'a')]:
+                t = p.new_task()
+                t.command(f'touch {flags}/{name}')
+                t.command(f'for i in $(seq 100); do [ -e {flags}/{other} ] && break; sleep 0.1; done')
+                t.command(f'[ -e {flags}/{other} ]')
+            p.run()
+
+    def test_cpu_budget(self):
+        with tempfile.TemporaryDirectory() as lock_dir:
+            p = Pipeline(backend=LocalBackend(max_cpu=2))
+            for _ in range(3):
+                t = p.new_task()
+                t.cpu(2)
+                t.command(f'mkdir {lock_dir}/lock && sleep 0.2 && rmdir {lock_dir}/lock')
+            p.run()
+
+    def test_failure_cancels_only_downstream_tasks(self):
+        with tempfile.NamedTemporaryFile('w') as downstream_file, \
+                tempfile.NamedTemporaryFile('w') as independent_file:
+            p = self.pipeline()
+            bad = p.new_task()
+            bad.command(f'exit 1; echo "unreachable" > {bad.ofile}')
+            downstream = p.new_task()
+            downstream.command(f'echo "downstream" > {downstream.ofile}')
+            downstream.depends_on(bad)
+            independent = p.new_task()
+            independent.command(f'echo "independent" > {independent.ofile}')
+            p.write_output(downstream.ofile, downstream_file.name)
+            p.write_output(independent.ofile, independent_file.name)
+            with self.assertRaises(sp.CalledProcessError):
+                p.run()
+
+            assert self.read(downstream_file.name) == ''
+            assert self.read(independent_file.name) == 'independent'
+
     def test_declare_resource_group(self):
         with tempfile.NamedTemporaryFile('w') as output_file:
             msg = 'hello world'
@@ -0,0 +1,163 @@
+"""Measures /auth/{namespace} latency with and without the router cache.
+
+A stand-in for router-resolver is served on a local port.  It answers
+/auth/{namespace} either by reading the router service, as router-resolver
+did on every request, or from a RouterCache.  The Kubernetes API is faked
+in memory and takes a fixed time to answer each call.  Concurrent clients
+request the routers of random namespaces, some of which have no router.
+
+    python3 router-resolver/auth_benchmark.py --clients 32 --requests 200 --api-latency 0.005
+"""
+import argparse
+import asyncio
+import logging
+import random
+import time
+
+import aiohttp
+from aiohttp import web
+from kubernetes_asyncio import client
+
+from router_cache import RouterCache
+
+log = logging.getLogger('auth_benchmark')
+
+
+class IdleWatchResponse:
+    """A watch on which nothing happens until it times out."""
+
+    def __init__(self, timeout_seconds):
+        self.timeout_seconds = timeout_seconds
+
+    @property
+    def content(self):
+        return self
+
+    async def readline(self):
+        await asyncio.sleep(self.timeout_seconds)
+        return b''
+
+    def release(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class SlowK8s:
+    def __init__(self, services, latency):
+        self.services = services
+        self.latency = latency
+        self.n_calls = 0
+
+    async def read_namespaced_service(self, name, namespace):
+        self.n_calls += 1
+        await asyncio.sleep(self.latency)
+        if namespace not in self.services:
+            raise client.rest.ApiException(status=404)
+        return client.V1Service(spec=client.V1ServiceSpec(cluster_ip=self.services[namespace]))
+
+    async def list_service_for_all_namespaces(self, field_selector=None, resource_version=None,
+                                              timeout_seconds=None, watch=False, _preload_content=True):
+        """
+        :return: V1ServiceList
+        """
+        self.n_calls += 1
+        await asyncio.sleep(self.latency)
+        if watch:
+            return IdleWatchResponse(timeout_seconds)
+        return client.V1ServiceList(
+            items=[client.V1Service(metadata=client.V1ObjectMeta(name='router', namespace=namespace),
+                                    spec=client.V1ServiceSpec(cluster_ip=ip))
+                   for namespace, ip in self.services.items()],
+            metadata=client.V1ListMeta(resource_version='1'))
+
+
+class StandInServer:
+    def __init__(self, k8s, cached):
+        self.k8s = k8s
+        self.router_cache = RouterCache(k8s, log) if cached else None
+
+        self.app = web.Application()
+        self.app.add_routes([web.get('/auth/{namespace}', self.auth)])
+
+    async def router_ip(self, namespace):
+        if self.router_cache is not None:
+            return await self.router_cache.get(namespace)
+        try:
+            router = await self.k8s.read_namespaced_service('router', namespace)
+        except client.rest.ApiException as err:
+            if err.status == 404:
+                return None
+            raise
+        return router.spec.cluster_ip
+
+    async def auth(self, request):
+        ip = await self.router_ip(request.match_info['namespace'])
+        if ip is None:
+            return web.Response(status=403)
+        return web.Response(status=200, headers={'X-Router-IP': ip})
+
+
+async def send_requests(session, url, namespaces, n_requests, latencies):
+    for _ in range(n_requests):
+        start = time.time()
+        async with session.get(f'{url}/auth/{random.choice(namespaces)}') as resp:
+            await resp.read()
+        latencies.append(time.time() - start)
+
+
+async def run(args, cached):
+    services = {f'ns-{i}': f'10.0.{i // 256}.{i % 256}' for i in range(args.namespaces)}
+    namespaces = list(services) + [f'missing-{i}' for i in range(args.namespaces // 10)]
+    k8s = SlowK8s(services, args.api_latency)
+    server = StandInServer(k8s, cached)
+    watch_task = None
+    if server.router_cache is not None:
+        watch_task = asyncio.ensure_future(server.router_cache.run())
+        while not server.router_cache.synced:
+            await asyncio.sleep(0.01)
+    n_startup_calls = k8s.n_calls
+
+    runner = web.AppRunner(server.app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    url = f'http://127.0.0.1:{port}'
+
+    latencies = []
+    try:
+        async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=args.clients)) as session:
+            start = time.time()
+            await asyncio.gather(*[send_requests(session, url, namespaces, args.requests, latencies)
+                                   for _ in range(args.clients)])
+            elapsed = time.time() - start
+    finally:
+        await runner.cleanup()
+        if watch_task is not None:
+            watch_task.cancel()
+
+    latencies.sort()
+    return len(latencies), elapsed, latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99)], \
+        k8s.n_calls - n_startup_calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure router-resolver /auth latency.')
+    parser.add_argument('--clients', type=int, default=32)
+    parser.add_argument('--requests', type=int, default=200, help='requests sent by each client')
+    parser.add_argument('--namespaces', type=int, default=50)
+    parser.add_argument('--api-latency', type=float, default=0.005,
+                        help='seconds the fake Kubernetes API takes to answer a call')
+    args = parser.parse_args()
+
+    loop = asyncio.get_event_loop()
+    for name, cached in [('uncached', False), ('cached', True)]:
+        n, elapsed, p50, p99, n_calls = loop.run_until_complete(run(args, cached))
+        print(f'{name}: {n} requests in {elapsed:.2f}s, {n / elapsed:.0f} requests/s, '
+              f'p50 {p50 * 1000:.2f}ms, p99 {p99 * 1000:.2f}ms, {n_calls} API calls')
+
+
+if __name__ == '__main__':
+    main()
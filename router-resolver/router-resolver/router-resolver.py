@@ -10,6 +10,8 @@ import logging
 from hailtop import gear
 from hailtop.gear.auth import authenticated_developers_only
 
+from router_cache import RouterCache
+
 uvloop.install()
 
 gear.configure_logging()
@@ -22,16 +24,12 @@ routes = web.RouteTableDef()
 @routes.get('/auth/{namespace}')
 @authenticated_developers_only
 async def auth(request):
-    app = request.app
-    k8s_client = app['k8s_client']
+    router_cache = request.app['router_cache']
     namespace = request.match_info['namespace']
-    try:
-        router = await k8s_client.read_namespaced_service('router', namespace)
-    except client.rest.ApiException as err:
-        if err.status == 404:
-            return web.Response(status=403)
-        raise
-    return web.Response(status=200, headers={'X-Router-IP': router.spec.cluster_ip})
+    ip = await router_cache.get(namespace)
+    if ip is None:
+        return web.Response(status=403)
+    return web.Response(status=200, headers={'X-Router-IP': ip})
 
 
 app.add_routes(routes)
@@ -43,8 +41,15 @@ async def on_startup(app):
     else:
         config.load_incluster_config()
     app['k8s_client'] = client.CoreV1Api()
+    app['router_cache'] = RouterCache(app['k8s_client'], log)
+    app['router_cache_task'] = asyncio.ensure_future(app['router_cache'].run())
+
+
+async def on_cleanup(app):
+    app['router_cache_task'].cancel()
 
 
 app.on_startup.append(on_startup)
+app.on_cleanup.append(on_cleanup)
 
 web.run_app(app, host='0.0.0.0', port=5000)
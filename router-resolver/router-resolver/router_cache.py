@@ -0,0 +1,100 @@
+import asyncio
+import time
+
+from kubernetes_asyncio import client, watch
+
+
+class RouterCache:
+    """Cluster IPs of the router services of all namespaces.
+
+    The services are listed once and then kept up to date by a watch, so
+    that in the steady state lookups make no API calls.  Until the first
+    list, or while the watch is being restarted after an error, lookups
+    read the service and remember missing services for `negative_ttl`
+    seconds.
+    """
+
+    def __init__(self, k8s_client, log, watch_timeout=300, retry_delay=5, negative_ttl=5):
+        self.k8s_client = k8s_client
+        self.log = log
+        self.watch_timeout = watch_timeout
+        self.retry_delay = retry_delay
+        self.negative_ttl = negative_ttl
+        # each Watch opens an API client session, so reuse one
+        self._watch = watch.Watch()
+
+        # namespace => router cluster IP
+        self.ips = {}
+        self.resource_version = None
+        self.synced = False
+        # namespace => time until which its router is known not to exist
+        self._missing = {}
+
+    async def get(self, namespace):
+        """Returns the cluster IP of the router of `namespace`, or None if
+        it has no router."""
+        ip = self.ips.get(namespace)
+        if ip is not None or self.synced:
+            return ip
+
+        now = time.time()
+        if self._missing.get(namespace, 0) > now:
+            return None
+        try:
+            router = await self.k8s_client.read_namespaced_service('router', namespace)
+        except client.rest.ApiException as err:
+            if err.status == 404:
+                self._missing[namespace] = now + self.negative_ttl
+                return None
+            raise
+        return router.spec.cluster_ip
+
+    async def relist(self):
+        services = await self.k8s_client.list_service_for_all_namespaces(
+            field_selector='metadata.name=router')
+        self.ips = {s.metadata.namespace: s.spec.cluster_ip for s in services.items}
+        self.resource_version = services.metadata.resource_version
+        self._missing = {}
+        self.synced = True
+        self.log.info(f'listed {len(self.ips)} routers at resource version {self.resource_version}')
+
+    def apply(self, event):
+        service = event['object']
+        namespace = service.metadata.namespace
+        if event['type'] == 'DELETED':
+            self.ips.pop(namespace, None)
+        else:
+            self.ips[namespace] = service.spec.cluster_ip
+        self.resource_version = service.metadata.resource_version
+
+    async def watch(self):
+        async with self._watch.stream(
+                self.k8s_client.list_service_for_all_namespaces,
+                field_selector='metadata.name=router',
+                resource_version=self.resource_version,
+                timeout_seconds=self.watch_timeout) as stream:
+            async for event in stream:
+                if event['type'] == 'ERROR':
+                    status = event['raw_object']
+                    raise client.rest.ApiException(status=status.get('code'), reason=status.get('message'))
+                self.apply(event)
+
+    async def run(self):
+        while True:
+            try:
+                if not self.synced:
+                    await self.relist()
+                await self.watch()
+            except asyncio.CancelledError:  # pylint: disable=try-except-raise
+                raise
+            except client.rest.ApiException as err:
+                self.synced = False
+                if err.status == 410:
+                    self.log.info(f'resource version {self.resource_version} is too old, relisting')
+                else:
+                    self.log.exception(f'watching routers failed, retrying in {self.retry_delay}s')
+                    await asyncio.sleep(self.retry_delay)
+            except Exception:  # pylint: disable=broad-except
+                self.synced = False
+                self.log.exception(f'watching routers failed, retrying in {self.retry_delay}s')
+                await asyncio.sleep(self.retry_delay)
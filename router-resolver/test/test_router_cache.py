@@ -0,0 +1,234 @@
+import asyncio
+import json
+import logging
+
+import pytest
+from kubernetes_asyncio import client
+
+from router_cache import RouterCache
+
+log = logging.getLogger('test_router_cache')
+
+
+def service(namespace, ip, resource_version):
+    return {'kind': 'Service', 'apiVersion': 'v1',
+            'metadata': {'name': 'router', 'namespace': namespace, 'resourceVersion': str(resource_version)},
+            'spec': {'clusterIP': ip}}
+
+
+class FakeWatchResponse:
+    def __init__(self, k8s, resource_version, timeout_seconds):
+        self.k8s = k8s
+        self.resource_version = resource_version
+        self.timeout_seconds = timeout_seconds
+        self.released = False
+
+    async def _next_line(self):
+        async with self.k8s.changed:
+            while True:
+                if self.resource_version < self.k8s.oldest_resource_version:
+                    return {'type': 'ERROR', 'object': {'kind': 'Status', 'code': 410, 'message': 'too old'}}
+                for rv, event in self.k8s.events:
+                    if rv > self.resource_version:
+                        self.resource_version = rv
+                        return event
+                await self.k8s.changed.wait()
+
+    async def readline(self):
+        try:
+            event = await asyncio.wait_for(self._next_line(), self.timeout_seconds)
+        except asyncio.TimeoutError:
+            return b''
+        return json.dumps(event).encode('utf-8') + b'\n'
+
+    @property
+    def content(self):
+        return self
+
+    def release(self):
+        self.released = True
+
+    def close(self):
+        self.released = True
+
+
+class FakeK8s:
+    """The parts of CoreV1Api the router cache uses, serving router services
+    from memory."""
+
+    def __init__(self):
+        self.services = {}
+        self.resource_version = 0
+        self.oldest_resource_version = 0
+        self.events = []
+        self.changed = asyncio.Condition()
+        self.calls = {'read': 0, 'list': 0, 'watch': 0}
+        self.read_error = None
+
+    async def update(self, namespace, ip):
+        self.resource_version += 1
+        obj = service(namespace, ip, self.resource_version)
+        if ip is None:
+            event_type = 'DELETED'
+            del self.services[namespace]
+        else:
+            event_type = 'MODIFIED' if namespace in self.services else 'ADDED'
+            self.services[namespace] = ip
+        self.events.append((self.resource_version, {'type': event_type, 'object': obj}))
+        async with self.changed:
+            self.changed.notify_all()
+
+    async def compact(self):
+        self.oldest_resource_version = self.resource_version
+        self.events = []
+        async with self.changed:
+            self.changed.notify_all()
+
+    async def read_namespaced_service(self, name, namespace):
+        assert name == 'router'
+        self.calls['read'] += 1
+        if self.read_error is not None:
+            raise client.rest.ApiException(status=self.read_error)
+        if namespace not in self.services:
+            raise client.rest.ApiException(status=404)
+        return client.V1Service(metadata=client.V1ObjectMeta(name='router', namespace=namespace),
+                                spec=client.V1ServiceSpec(cluster_ip=self.services[namespace]))
+
+    async def list_service_for_all_namespaces(self, field_selector=None, resource_version=None,
+                                              timeout_seconds=None, watch=False, _preload_content=True):
+        """
+        :return: V1ServiceList
+        """
+        assert field_selector == 'metadata.name=router'
+        if watch:
+            self.calls['watch'] += 1
+            return FakeWatchResponse(self, int(resource_version), timeout_seconds)
+        self.calls['list'] += 1
+        return client.V1ServiceList(
+            items=[client.V1Service(metadata=client.V1ObjectMeta(name='router', namespace=namespace),
+                                    spec=client.V1ServiceSpec(cluster_ip=ip))
+                   for namespace, ip in self.services.items()],
+            metadata=client.V1ListMeta(resource_version=str(self.resource_version)))
+
+
+async def eventually(predicate, timeout=5):
+    for _ in range(int(timeout / 0.01)):
+        if predicate():
+            return
+        await asyncio.sleep(0.01)
+    assert predicate()
+
+
+def run(test):
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(test())
+    finally:
+        loop.close()
+
+
+async def stop(task):
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+
+
+async def running_cache(k8s, **kwargs):
+    cache = RouterCache(k8s, log, **kwargs)
+    task = asyncio.ensure_future(cache.run())
+    await eventually(lambda: cache.synced)
+    return cache, task
+
+
+def test_steady_state_makes_no_api_calls():
+    async def test():
+        k8s = FakeK8s()
+        await k8s.update('default', '10.0.0.1')
+        await k8s.update('test-1', '10.0.0.2')
+        cache, task = await running_cache(k8s)
+        try:
+            for _ in range(100):
+                assert await cache.get('default') == '10.0.0.1'
+                assert await cache.get('test-1') == '10.0.0.2'
+                assert await cache.get('missing') is None
+            assert k8s.calls['read'] == 0
+            assert k8s.calls['list'] == 1
+        finally:
+            await stop(task)
+
+    run(test)
+
+
+def test_watch_keeps_cache_fresh():
+    async def test():
+        k8s = FakeK8s()
+        await k8s.update('default', '10.0.0.1')
+        cache, task = await running_cache(k8s)
+        try:
+            await k8s.update('test-1', '10.0.0.2')
+            await eventually(lambda: cache.ips.get('test-1') == '10.0.0.2')
+            await k8s.update('default', '10.0.0.3')
+            await eventually(lambda: cache.ips.get('default') == '10.0.0.3')
+            await k8s.update('test-1', None)
+            await eventually(lambda: 'test-1' not in cache.ips)
+            assert await cache.get('test-1') is None
+            assert k8s.calls['read'] == 0
+            assert k8s.calls['list'] == 1
+        finally:
+            await stop(task)
+
+    run(test)
+
+
+def test_watch_restarts_from_last_resource_version():
+    async def test():
+        k8s = FakeK8s()
+        await k8s.update('default', '10.0.0.1')
+        cache, task = await running_cache(k8s, watch_timeout=0.05)
+        try:
+            await eventually(lambda: k8s.calls['watch'] >= 3)
+            await k8s.update('test-1', '10.0.0.2')
+            await eventually(lambda: cache.ips.get('test-1') == '10.0.0.2')
+            assert k8s.calls['list'] == 1
+        finally:
+            await stop(task)
+
+    run(test)
+
+
+def test_expired_resource_version_relists():
+    async def test():
+        k8s = FakeK8s()
+        await k8s.update('default', '10.0.0.1')
+        cache, task = await running_cache(k8s)
+        try:
+            # changes the watch misses, then the history it would resume from is gone
+            k8s.events = []
+            k8s.services['test-1'] = '10.0.0.2'
+            k8s.resource_version += 1
+            await k8s.compact()
+            await eventually(lambda: cache.ips.get('test-1') == '10.0.0.2')
+            assert k8s.calls['list'] == 2
+        finally:
+            await stop(task)
+
+    run(test)
+
+
+def test_reads_before_sync_and_caches_missing_routers():
+    async def test():
+        k8s = FakeK8s()
+        await k8s.update('default', '10.0.0.1')
+        cache = RouterCache(k8s, log, negative_ttl=60)
+        assert await cache.get('default') == '10.0.0.1'
+        assert await cache.get('missing') is None
+        assert await cache.get('missing') is None
+        assert k8s.calls['read'] == 2
+
+        k8s.read_error = 500
+        with pytest.raises(client.rest.ApiException):
+            await cache.get('other')
+
+    run(test)
@@ -0,0 +1,177 @@
+"""Measures scheduler throughput with in-process fake executors and clients.
+
+The scheduler's connection handlers are served on local ports, and fake
+executors and clients talk to them over TCP with the real wire protocol.
+Executors answer each task immediately with its payload, so the run time is
+dominated by the scheduler and the protocol.  Each configuration is run with
+legacy single-task frames and with negotiated batched frames.
+
+    python3 -m scheduler.loadgen --tasks 100000 --clients 4 --executors 4
+"""
+import argparse
+import asyncio
+import logging
+import os
+import time
+
+from . import scheduler as s
+
+
+async def fake_executor(port, n_cores, batch_size):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    s.write_int(writer, n_cores)
+    if batch_size > 1:
+        s.write_int(writer, s.NEGOTIATE)
+        s.write_int(writer, batch_size)
+    await writer.drain()
+
+    try:
+        while True:
+            cmd = await s.read_int(reader)
+            if cmd is None:
+                return
+            if cmd == s.EXECUTE:
+                task_id = await s.read_int(reader)
+                f = await s.read_bytes(reader)
+                parts = [s.pack_int(s.TASKRESULT),
+                         s.pack_int(task_id),
+                         s.pack_bytes(f)]
+            else:
+                assert cmd == s.EXECUTEBATCH
+                n = await s.read_int(reader)
+                parts = [s.pack_int(s.TASKRESULTBATCH), s.pack_int(n)]
+                for _ in range(n):
+                    task_id = await s.read_int(reader)
+                    f = await s.read_bytes(reader)
+                    parts.append(s.pack_int(task_id))
+                    parts.append(s.pack_bytes(f))
+            writer.write(b''.join(parts))
+            await writer.drain()
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+
+async def fake_client(submit_port, result_port, n_tasks, task_size,
+                      batch_size):
+    token = os.urandom(16)
+    job_token = os.urandom(16)
+
+    result_reader, result_writer = await asyncio.open_connection(
+        '127.0.0.1', result_port)
+    s.write_bytes(result_writer, token)
+    if batch_size > 1:
+        s.write_int(result_writer, s.NEGOTIATE)
+        s.write_int(result_writer, batch_size)
+    await result_writer.drain()
+
+    submit_reader, submit_writer = await asyncio.open_connection(
+        '127.0.0.1', submit_port)
+    s.write_bytes(submit_writer, token)
+    s.write_int(submit_writer, s.SUBMIT)
+    s.write_bytes(submit_writer, job_token)
+    s.write_int(submit_writer, n_tasks)
+    await submit_writer.drain()
+
+    async def submit():
+        i = await s.read_int(submit_reader)
+        submit_writer.write(s.pack_bytes(bytes(task_size)) * (n_tasks - i))
+        await submit_writer.drain()
+        assert await s.read_int(submit_reader) == 0
+        assert await s.read_bytes(submit_reader) == job_token
+
+    async def receive():
+        received = set()
+        while len(received) < n_tasks:
+            cmd = await s.read_int(result_reader)
+            assert await s.read_bytes(result_reader) == job_token
+            if cmd == s.APPTASKRESULT:
+                index = await s.read_int(result_reader)
+                await s.read_bytes(result_reader)
+                received.add(index)
+                parts = [s.pack_int(s.ACKTASKRESULT),
+                         s.pack_bytes(job_token),
+                         s.pack_int(index)]
+            else:
+                assert cmd == s.APPTASKRESULTBATCH
+                n = await s.read_int(result_reader)
+                indices = []
+                for _ in range(n):
+                    indices.append(await s.read_int(result_reader))
+                    await s.read_bytes(result_reader)
+                received.update(indices)
+                parts = [s.pack_int(s.ACKTASKRESULTBATCH),
+                         s.pack_bytes(job_token),
+                         s.pack_int(n)]
+                parts.extend(s.pack_int(index) for index in indices)
+            result_writer.write(b''.join(parts))
+            await result_writer.drain()
+
+    await asyncio.gather(submit(), receive())
+    submit_writer.close()
+    result_writer.close()
+
+
+async def run(args, batch_size):
+    callbacks = (s.executor_connected_cb,
+                 s.client_submit_cb,
+                 s.client_result_cb)
+    servers = [await asyncio.start_server(cb, host='127.0.0.1', port=0)
+               for cb in callbacks]
+    executor_port, submit_port, result_port = [
+        server.sockets[0].getsockname()[1] for server in servers]
+
+    executor_tasks = [
+        asyncio.ensure_future(
+            fake_executor(executor_port, args.cores, batch_size))
+        for _ in range(args.executors)]
+    while len(s.executors) < args.executors:
+        await asyncio.sleep(0.01)
+
+    n_tasks = args.tasks // args.clients
+    start = time.time()
+    await asyncio.gather(*[
+        fake_client(submit_port, result_port, n_tasks, args.task_size,
+                    batch_size)
+        for _ in range(args.clients)])
+    elapsed = time.time() - start
+
+    for server in servers:
+        server.close()
+    for e in list(s.executors):
+        e.writer.close()
+    await asyncio.gather(*executor_tasks)
+    while s.executors:
+        await asyncio.sleep(0.01)
+
+    return n_tasks * args.clients, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Measure scheduler task throughput.')
+    parser.add_argument('--tasks', type=int, default=100000,
+                        help='total number of tasks')
+    parser.add_argument('--clients', type=int, default=4)
+    parser.add_argument('--executors', type=int, default=4)
+    parser.add_argument('--cores', type=int, default=16)
+    parser.add_argument('--task-size', type=int, default=64,
+                        help='bytes per task and result')
+    parser.add_argument('--batch-size', type=int, default=256,
+                        help='batch size requested by batching peers')
+    args = parser.parse_args()
+
+    logging.getLogger('scheduler').setLevel(logging.WARNING)
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    for name, batch_size in [('single-task frames', 1),
+                             ('batched frames', args.batch_size)]:
+        n_tasks, elapsed = loop.run_until_complete(run(args, batch_size))
+        print(f'{name}: {n_tasks} tasks in {elapsed:.2f}s, '
+              f'{n_tasks / elapsed:.0f} tasks/s')
+
+
+if __name__ == '__main__':
+    main()
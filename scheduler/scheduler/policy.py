@@ -0,0 +1,67 @@
+# Scheduling policies choose which pending job runs its next task and on
+# which available executor.  They only look at the following attributes, so
+# they can be driven by the scheduler or by the simulation:
+#
+#   job: id (increasing in submission order), client, priority, n_running
+#   client: n_running
+#   executor: id, n_cores, running, job_ids (jobs whose state it holds)
+
+
+def free_cores(e):
+    return e.n_cores - len(e.running)
+
+
+class Policy:
+    name = None
+
+    def __init__(self, affinity=True):
+        self.affinity = affinity
+
+    def job_key(self, job):
+        raise NotImplementedError
+
+    def choose_job(self, pending_jobs):
+        return min(pending_jobs, key=self.job_key)
+
+    def choose_executor(self, job, available_executors):
+        # prefer executors that already ran tasks of this job, then the least
+        # loaded; ties go to the oldest executor so placement is deterministic
+        def key(e):
+            warm = self.affinity and job.id in e.job_ids
+            return (not warm, -free_cores(e), e.id)
+        return min(available_executors, key=key)
+
+
+class FIFOPolicy(Policy):
+    """Runs jobs in submission order."""
+    name = 'fifo'
+
+    def job_key(self, job):
+        return job.id
+
+
+class FairSharePolicy(Policy):
+    """Gives the next core to the client with the fewest running tasks."""
+    name = 'fair'
+
+    def job_key(self, job):
+        return (job.client.n_running, job.id)
+
+
+class PriorityPolicy(Policy):
+    """Shares cores between jobs in proportion to their priority."""
+    name = 'priority'
+
+    def job_key(self, job):
+        return (job.n_running / job.priority, -job.priority, job.id)
+
+
+policies = {p.name: p for p in (FIFOPolicy, FairSharePolicy, PriorityPolicy)}
+
+
+def make_policy(name, affinity=True):
+    policy = policies.get(name)
+    if policy is None:
+        raise ValueError(f'unknown scheduling policy {name}, '
+                         f'expected one of {", ".join(sorted(policies))}')
+    return policy(affinity)
@@ -1,5 +1,9 @@
+import os
 import struct
+import tempfile
 import datetime
+import collections
+import itertools
 import logging
 from base64 import b64encode
 import asyncio
@@ -10,11 +14,30 @@ import uvloop
 
 from hailtop import gear
 
+from .policy import make_policy
+
 uvloop.install()
 
 gear.configure_logging()
 log = logging.getLogger('scheduler')
 
+POLICY = os.environ.get('HAIL_SCHEDULER_POLICY', 'fair')
+AFFINITY = os.environ.get('HAIL_SCHEDULER_AFFINITY', '1') == '1'
+# most tasks or results sent in one batched frame
+MAX_BATCH_SIZE = int(os.environ.get('HAIL_SCHEDULER_MAX_BATCH_SIZE', 1024))
+# unacknowledged results beyond this many bytes are spilled to disk
+MAX_RESULT_MEMORY = int(os.environ.get('HAIL_SCHEDULER_MAX_RESULT_MEMORY',
+                                       256 * 1024 * 1024))
+# submitters wait while tasks that have not completed hold this many bytes
+MAX_PENDING_TASK_BYTES = int(
+    os.environ.get('HAIL_SCHEDULER_MAX_PENDING_TASK_BYTES',
+                   1024 * 1024 * 1024))
+SPILL_DIR = os.environ.get('HAIL_SCHEDULER_SPILL_DIR')
+# spilled results are appended to a new file once the current one holds
+# this many bytes
+SPILL_SEGMENT_BYTES = int(
+    os.environ.get('HAIL_SCHEDULER_SPILL_SEGMENT_BYTES', 64 * 1024 * 1024))
+
 
 async def read_int(reader):
     try:
@@ -40,6 +63,15 @@ def write_bytes(writer, b):
     writer.write(b)
 
 
+# frames with many fields are assembled from these and written at once
+def pack_int(i):
+    return struct.pack('>I', i)
+
+
+def pack_bytes(b):
+    return struct.pack('>I', len(b)) + b
+
+
 counter = 0
 
 
@@ -61,6 +93,129 @@ pending_jobs = set()
 task_index = {}
 
 
+class SpillSegment:
+    """A spill file holding the results spilled while it was current."""
+
+    def __init__(self, spill_dir):
+        self.file = tempfile.TemporaryFile(prefix='results-', dir=spill_dir)
+        self.n_bytes = 0
+        self.n_results = 0
+
+    def close(self):
+        self.file.close()
+
+
+class ResultStore:
+    """Holds task results until the client acknowledges them.  Up to
+    `max_memory` bytes are kept in memory; the rest are appended to spill
+    segments of about `segment_bytes` each.  A segment is deleted, or
+    truncated if it is still being appended to, once all of its results
+    have been acknowledged, so the spill files hold at most the
+    unacknowledged results and the unacknowledged segments' gaps."""
+
+    def __init__(self, max_memory, spill_dir, segment_bytes):
+        self.max_memory = max_memory
+        self.spill_dir = spill_dir
+        self.segment_bytes = segment_bytes
+        self.segment = None
+        self.segments = set()
+
+        self.memory_bytes = 0
+        self.n_in_memory = 0
+        self.spilled_bytes = 0
+        self.n_spilled = 0
+        self.n_spilled_total = 0
+
+    def put(self, result):
+        """Stores `result` and returns a handle for it."""
+        if self.memory_bytes + len(result) <= self.max_memory:
+            self.memory_bytes += len(result)
+            self.n_in_memory += 1
+            return result
+
+        if self.segment is None or self.segment.n_bytes >= self.segment_bytes:
+            self.segment = SpillSegment(self.spill_dir)
+            self.segments.add(self.segment)
+        segment = self.segment
+        offset = segment.n_bytes
+        os.pwrite(segment.file.fileno(), result, offset)
+        segment.n_bytes += len(result)
+        segment.n_results += 1
+        self.spilled_bytes += len(result)
+        self.n_spilled += 1
+        self.n_spilled_total += 1
+        return (segment, offset, len(result))
+
+    def get(self, handle):
+        if isinstance(handle, bytes):
+            return handle
+        segment, offset, n = handle
+        return os.pread(segment.file.fileno(), n, offset)
+
+    def remove(self, handle):
+        if isinstance(handle, bytes):
+            self.memory_bytes -= len(handle)
+            self.n_in_memory -= 1
+            return
+        segment, _, n = handle
+        self.spilled_bytes -= n
+        self.n_spilled -= 1
+        segment.n_results -= 1
+        if segment.n_results == 0:
+            if segment is self.segment:
+                segment.file.truncate(0)
+                segment.n_bytes = 0
+            else:
+                self.segments.remove(segment)
+                segment.close()
+
+    def to_dict(self):
+        return {
+            'results_in_memory': self.n_in_memory,
+            'result_memory_bytes': self.memory_bytes,
+            'results_spilled': self.n_spilled,
+            'result_spilled_bytes': self.spilled_bytes,
+            'spill_segments': len(self.segments),
+            'spill_file_bytes': sum(segment.n_bytes
+                                    for segment in self.segments),
+            'results_spilled_total': self.n_spilled_total
+        }
+
+
+results = ResultStore(MAX_RESULT_MEMORY, SPILL_DIR, SPILL_SEGMENT_BYTES)
+
+# bytes of task payloads held for tasks that have not completed
+pending_task_bytes = 0
+task_bytes_waiters = []
+
+
+def hold_task_bytes(n):
+    global pending_task_bytes
+
+    pending_task_bytes += n
+
+
+def release_task_bytes(n):
+    global pending_task_bytes
+
+    pending_task_bytes -= n
+    if pending_task_bytes < MAX_PENDING_TASK_BYTES:
+        for w in task_bytes_waiters:
+            if not w.done():
+                w.set_result(None)
+        task_bytes_waiters.clear()
+
+
+async def wait_for_task_bytes():
+    while pending_task_bytes >= MAX_PENDING_TASK_BYTES:
+        w = asyncio.get_event_loop().create_future()
+        task_bytes_waiters.append(w)
+        await w
+
+
+policy = make_policy(POLICY, AFFINITY)
+log.info(f'scheduling policy {policy.name}, affinity {policy.affinity}')
+
 scheduling = False
 
 
@@ -71,20 +226,46 @@ async def schedule():
         return
 
     scheduling = True
-    while pending_jobs and available_executors:
-        e = next(iter(available_executors))
-        await e.schedule()
-
-    scheduling = False
-
+    try:
+        while pending_jobs and available_executors:
+            # assign as many tasks as possible before writing, so each
+            # executor gets its tasks in as few frames as possible
+            assigned = set()
+            while pending_jobs and available_executors:
+                j = policy.choose_job(pending_jobs)
+                e = policy.choose_executor(j, available_executors)
+                t = j.next_task()
+                e.add_running(t)
+                e.unsent.append(t)
+                assigned.add(e)
+
+            for e in assigned:
+                await e.execute_unsent()
+    finally:
+        scheduling = False
+
+
+# Peers that understand batched frames send NEGOTIATE with the most tasks or
+# results they accept per frame right after connecting.  Until then, and
+# for peers that never send it, only single-task frames are used.
+NEGOTIATE = 8
 
 # executor messages
 # scheduler => executor
 EXECUTE = 2
+# n, then n times: task id, task
+EXECUTEBATCH = 9
 
 # executor => scheduler
 PING = 1
 TASKRESULT = 4
+# n, then n times: task id, result
+TASKRESULTBATCH = 10
+
+
+def chunks(xs, size):
+    for i in range(0, len(xs), size):
+        yield xs[i:i + size]
 
 
 class ExecutorConnection:
@@ -97,44 +278,71 @@ class ExecutorConnection:
         self.writer = writer
         self.n_cores = n_cores
         self.running = set()
+        self.job_ids = set()
+        self.unsent = []
+        self.batch_size = 1
         self.last_message_time = datetime.datetime.now()
         executors.add(self)
         available_executors.add(self)
 
-    async def handle_result(self):
-        task_id = await read_int(self.reader)
-        res = await read_bytes(self.reader)
+    def complete_task(self, task_id, res):
+        t = task_index.get(task_id)
+        if t is None:
+            return
 
-        if task_id in task_index:
-            t = task_index[task_id]
+        log.debug(f'executor {self.id}: '
+                  f'task {t.id} for job {t.job.id} complete: '
+                  f'{datetime.datetime.now() - t.start_time}')
 
-            duration = datetime.datetime.now() - t.start_time
-            log.info(f'executor {self.id}: '
-                     f'task {t.id} for job {t.job.id} complete: {duration}')
+        t.set_result(res)
 
-            t.set_result(res)
+        if t in self.running:
+            self.remove_running(t)
 
-        if len(self.running) == self.n_cores:
-            assert self not in available_executors
-            available_executors.add(self)
-        self.running.remove(t)
+    async def handle_result(self):
+        task_id = await read_int(self.reader)
+        res = await read_bytes(self.reader)
+        self.complete_task(task_id, res)
+        await schedule()
 
-        await self.schedule()
+    async def handle_result_batch(self):
+        n = await read_int(self.reader)
+        for _ in range(n):
+            task_id = await read_int(self.reader)
+            res = await read_bytes(self.reader)
+            self.complete_task(task_id, res)
+        await schedule()
+
+    async def handle_negotiate(self):
+        max_batch_size = await read_int(self.reader)
+        self.batch_size = max(1, min(max_batch_size, MAX_BATCH_SIZE))
+        log.info(f'executor {self.id}: batch size {self.batch_size}')
 
     async def handle_ping(self):
         log.info(f'executor {self.id}: received ping')
 
-    async def execute(self, t):
-        log.info(f'schedule task {t.id} for job {t.job.id} on executor {self.id}')
+    async def execute_unsent(self):
+        tasks = self.unsent
+        self.unsent = []
+        log.info(f'schedule {len(tasks)} tasks on executor {self.id}')
 
         # FIXME time this attempt
-        t.start_time = datetime.datetime.now()
+        now = datetime.datetime.now()
 
-        # don't need to lock becuase only called by schedule and
+        # don't need to lock because only called by schedule and
         # schedule is serial
-        write_int(self.writer, EXECUTE)
-        write_int(self.writer, t.id)
-        write_bytes(self.writer, t.f)
+        parts = []
+        for batch in chunks(tasks, self.batch_size):
+            if self.batch_size == 1:
+                parts.append(pack_int(EXECUTE))
+            else:
+                parts.append(pack_int(EXECUTEBATCH))
+                parts.append(pack_int(len(batch)))
+            for t in batch:
+                t.start_time = now
+                parts.append(pack_int(t.id))
+                parts.append(pack_bytes(t.f))
+        self.writer.write(b''.join(parts))
         await self.writer.drain()
 
     async def handler_loop(self):
@@ -147,6 +355,10 @@ class ExecutorConnection:
                     await self.handle_ping()
                 elif cmd == TASKRESULT:
                     await self.handle_result()
+                elif cmd == TASKRESULTBATCH:
+                    await self.handle_result_batch()
+                elif cmd == NEGOTIATE:
+                    await self.handle_negotiate()
                 else:
                     raise ValueError(f'unknown command {cmd}')
                 self.last_message_time = datetime.datetime.now()
@@ -158,23 +370,27 @@ class ExecutorConnection:
 
     def close(self):
         executors.remove(self)
-        available_executors.remove(self)
-        for t in self.running:
-            t.job.pending_tasks.append(t)
-        self.running = set()
-
-    async def schedule(self):
-        while len(self.running) < self.n_cores and pending_jobs:
-            j = next(iter(pending_jobs))
-            t = j.pending_tasks.pop()
-            if not j.pending_tasks:
-                pending_jobs.remove(j)
-
-            self.running.add(t)
-            if len(self.running) == self.n_cores:
-                available_executors.remove(self)
+        available_executors.discard(self)
+        for t in list(self.running):
+            self.remove_running(t)
+            t.job.requeue_task(t)
+        asyncio.ensure_future(schedule())
+
+    def add_running(self, t):
+        self.running.add(t)
+        self.job_ids.add(t.job.id)
+        t.job.n_running += 1
+        t.job.client.n_running += 1
+        if len(self.running) == self.n_cores:
+            available_executors.remove(self)
 
-            await self.execute(t)
+    def remove_running(self, t):
+        if len(self.running) == self.n_cores:
+            assert self not in available_executors
+            available_executors.add(self)
+        self.running.remove(t)
+        t.job.n_running -= 1
+        t.job.client.n_running -= 1
 
     def to_dict(self):
         return {
@@ -189,7 +405,7 @@ async def executor_connected_cb(reader, writer):
     n_cores = await read_int(reader)
     conn = ExecutorConnection(reader, writer, n_cores)
     asyncio.ensure_future(conn.handler_loop())
-    await conn.schedule()
+    await schedule()
 
 
 class Job:
@@ -199,16 +415,19 @@ class Job:
         self.client = client
         self.start_time = datetime.datetime.utcnow()
         self.end_time = None
+        self.priority = 1
 
         self.n_tasks = n_tasks
         self.n_submitted = 0
+        self.n_running = 0
         self.index_task = {}
-        self.pending_tasks = []
+        self.pending_tasks = collections.deque()
         self.complete_tasks = set()
 
         jobs[token] = self
 
-    async def add_task(self, f, index):
+    def add_task(self, f, index):
+        """Queues a task and returns whether the job became pending."""
         assert index == self.n_submitted
         t = Task(self, f, index)
         self.index_task[index] = t
@@ -218,7 +437,18 @@ class Job:
 
         if len(self.pending_tasks) == 1:
             pending_jobs.add(self)
-            await schedule()
+            return True
+        return False
+
+    def next_task(self):
+        t = self.pending_tasks.popleft()
+        if not self.pending_tasks:
+            pending_jobs.remove(self)
+        return t
+
+    def requeue_task(self, t):
+        self.pending_tasks.appendleft(t)
+        pending_jobs.add(self)
 
     def ack_task(self, index):
         t = self.index_task.get(index)
@@ -231,6 +461,8 @@ class Job:
         if self.is_complete():
             self.client.end_job(self.token)
             self.end_time = datetime.datetime.utcnow()
+            for e in executors:
+                e.job_ids.discard(self.id)
 
     def is_complete(self):
         return (self.n_submitted == self.n_tasks) and (not self.index_task)
@@ -241,7 +473,8 @@ class Job:
         n_running = (self.n_submitted - n_complete) - len(self.pending_tasks)
         timef = '%Y-%m-%dT%H:%M:%S.%fZ'
         start_string = self.start_time.strftime(timef)
-        end_string = '--' if self.end_time is None else self.end_time.strftime(timef)
+        end_string = ('--' if self.end_time is None
+                      else self.end_time.strftime(timef))
         return {
             'client': self.client.id,
             'id': self.id,
@@ -261,22 +494,28 @@ class Task:
         self.f = f
         self.index = index
         self.start_time = None
+        # handle in results
         self.result = None
 
         task_index[self.id] = self
+        hold_task_bytes(len(f))
 
     def set_result(self, result):
         if self.result is not None:
             return
-        self.result = result
+        self.result = results.put(result)
         self.job.complete_tasks.add(self)
 
+        # a complete task is never run again
+        release_task_bytes(len(self.f))
+        self.f = None
+
         result_conn = self.job.client.result_conn
         if result_conn:
-            asyncio.ensure_future(
-                result_conn.task_result(self.job.token, self.index, self.result))
+            result_conn.send_result(self)
 
     def ack(self):
+        results.remove(self.result)
         self.result = None
         del task_index[self.id]
 
@@ -287,7 +526,13 @@ SUBMIT = 5
 
 # scheduler => client
 APPTASKRESULT = 6
+# job token, n, then n times: index, result
+APPTASKRESULTBATCH = 11
+
+# client => scheduler
 ACKTASKRESULT = 7
+# job token, n, then n times: index
+ACKTASKRESULTBATCH = 12
 
 
 class ClientSubmitConnection:
@@ -295,10 +540,11 @@ class ClientSubmitConnection:
         self.client = client
         self.reader = reader
         self.writer = writer
+        self.blocked = False
 
     async def handle_submit(self):
         job_token = await read_bytes(self.reader)
-        log.info(f'received job')
+        log.info('received job')
         n = await read_int(self.reader)
 
         j = self.client.start_job(job_token, n)
@@ -307,9 +553,19 @@ class ClientSubmitConnection:
 
         i = j.n_submitted
         while i < n:
+            if pending_task_bytes >= MAX_PENDING_TASK_BYTES:
+                self.blocked = True
+                await schedule()
+                await wait_for_task_bytes()
+                self.blocked = False
             b = await read_bytes(self.reader)
-            await j.add_task(b, i)
+            became_pending = j.add_task(b, i)
             i += 1
+            # dispatch as soon as the job becomes pending; tasks that
+            # arrive while executors are busy queue up and are sent
+            # together once they free up
+            if became_pending:
+                await schedule()
 
         # ack
         write_int(self.writer, 0)
@@ -331,7 +587,7 @@ class ClientSubmitConnection:
                 else:
                     raise ValueError(f'unknown command {cmd}')
         except Exception:  # pylint: disable=broad-except
-            log.exception(f'error in handler loop')
+            log.exception('error in handler loop')
         finally:
             self.close()
 
@@ -347,21 +603,72 @@ class ClientResultConnection:
         self.client = client
         self.reader = reader
         self.writer = writer
+        self.batch_size = 1
+        self.unsent = collections.deque()
+        self.sending = False
 
     async def handle_ack_task(self):
         job_token = await read_bytes(self.reader)
         index = await read_int(self.reader)
-        
+
         j = jobs.get(job_token)
         if j is not None:
             j.ack_task(index)
 
-    async def task_result(self, job_token, index, result):
-        write_int(self.writer, APPTASKRESULT)
-        write_bytes(self.writer, job_token)
-        write_int(self.writer, index)
-        write_bytes(self.writer, result)
-        await self.writer.drain()
+    async def handle_ack_task_batch(self):
+        job_token = await read_bytes(self.reader)
+        n = await read_int(self.reader)
+        indices = [await read_int(self.reader) for _ in range(n)]
+
+        j = jobs.get(job_token)
+        if j is not None:
+            for index in indices:
+                j.ack_task(index)
+
+    async def handle_negotiate(self):
+        max_batch_size = await read_int(self.reader)
+        self.batch_size = max(1, min(max_batch_size, MAX_BATCH_SIZE))
+        log.info(f'client {self.client.id}: '
+                 f'result batch size {self.batch_size}')
+
+    def send_result(self, t):
+        self.unsent.append(t)
+        if not self.sending:
+            self.sending = True
+            asyncio.ensure_future(self.send_unsent())
+
+    async def send_unsent(self):
+        # results are read from the store only when written, and at most
+        # MAX_BATCH_SIZE at a time, so a slow client does not pin them in
+        # memory; results that arrive while draining are sent next
+        try:
+            while self.unsent:
+                tasks = []
+                while self.unsent and len(tasks) < MAX_BATCH_SIZE:
+                    t = self.unsent.popleft()
+                    # skip results acknowledged since they were queued
+                    if t.result is not None:
+                        tasks.append(t)
+
+                parts = []
+                for batch in chunks(tasks, self.batch_size):
+                    groups = itertools.groupby(batch, lambda t: t.job.token)
+                    for job_token, group in groups:
+                        group = list(group)
+                        if self.batch_size > 1:
+                            parts.append(pack_int(APPTASKRESULTBATCH))
+                            parts.append(pack_bytes(job_token))
+                            parts.append(pack_int(len(group)))
+                        for t in group:
+                            if self.batch_size == 1:
+                                parts.append(pack_int(APPTASKRESULT))
+                                parts.append(pack_bytes(job_token))
+                            parts.append(pack_int(t.index))
+                            parts.append(pack_bytes(results.get(t.result)))
+                self.writer.write(b''.join(parts))
+                await self.writer.drain()
+        finally:
+            self.sending = False
 
     async def handler_loop(self):
         try:
@@ -371,16 +678,21 @@ class ClientResultConnection:
                     return
                 if cmd == ACKTASKRESULT:
                     await self.handle_ack_task()
+                elif cmd == ACKTASKRESULTBATCH:
+                    await self.handle_ack_task_batch()
+                elif cmd == NEGOTIATE:
+                    await self.handle_negotiate()
                 else:
                     raise ValueError(f'unknown command {cmd}')
         except Exception:  # pylint: disable=broad-except
-            log.exception(f'error in handler loop')
+            log.exception('error in handler loop')
         finally:
             self.close()
 
     def close(self):
         self.writer.close()
-        self.client.result_conn = None
+        if self.client.result_conn is self:
+            self.client.result_conn = None
         # new in 3.7
         # await self.writer.wait_closed()
 
@@ -396,6 +708,7 @@ class Client:
         self.result_conn = None
 
         self.job = None
+        self.n_running = 0
 
         clients.add(self)
         log.info(f'client {self.id} created')
@@ -424,6 +737,11 @@ class Client:
         log.info(f'client {self.id} result connected')
         asyncio.ensure_future(self.result_conn.handler_loop())
 
+        # resend results that were not acknowledged on the last connection
+        if self.job is not None:
+            for t in sorted(self.job.complete_tasks, key=lambda t: t.index):
+                self.result_conn.send_result(t)
+
     def to_dict(self):
         is_disconnected = ((self.submit_conn is None) and
                            (self.result_conn is None))
@@ -470,6 +788,16 @@ async def healthcheck(request):  # pylint: disable=unused-argument
 @aiohttp_jinja2.template('index.html')
 async def index(request):  # pylint: disable=unused-argument
     return {
+        'memory': {
+            'pending_task_bytes': pending_task_bytes,
+            'max_pending_task_bytes': MAX_PENDING_TASK_BYTES,
+            'blocked_submitters': sum(
+                1 for client in clients
+                if client.submit_conn is not None
+                and client.submit_conn.blocked),
+            'max_result_memory': MAX_RESULT_MEMORY,
+            **results.to_dict()
+        },
         'executors': [e.to_dict() for e in executors],
         'clients': [client.to_dict() for client in clients],
         'jobs': [j.to_dict() for j in reversed(list(jobs.values()))]
@@ -492,5 +820,3 @@ async def on_startup(app):  # pylint: disable=unused-argument
     log.info(f'listening on port {5053} for clients, result')
 
 app.on_startup.append(on_startup)
-
-web.run_app(app, host='0.0.0.0', port=5000)
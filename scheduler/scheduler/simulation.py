@@ -0,0 +1,164 @@
+"""Discrete-event simulation of the scheduling policies.
+
+Fake executors run tasks for a fixed duration, plus a start-up cost the first
+time an executor runs a task of a given job, standing in for loading the
+job's state.  A mixed workload of one large batch client and several
+interactive clients is replayed under each policy, and the makespan and
+per-client job latencies are reported.
+
+    python3 -m scheduler.simulation --executors 8 --cores 4
+"""
+import argparse
+import collections
+import heapq
+import random
+import statistics
+
+from .policy import policies, make_policy
+
+
+class FakeExecutor:
+    def __init__(self, id, n_cores):
+        self.id = id
+        self.n_cores = n_cores
+        self.running = set()
+        self.job_ids = set()
+
+
+class FakeClient:
+    def __init__(self, id, name):
+        self.id = id
+        self.name = name
+        self.n_running = 0
+
+
+class FakeJob:
+    def __init__(self, id, client, submit_time, task_durations, priority=1):
+        self.id = id
+        self.client = client
+        self.submit_time = submit_time
+        self.end_time = None
+        self.priority = priority
+        self.pending_tasks = collections.deque(task_durations)
+        self.n_running = 0
+        self.n_incomplete = len(task_durations)
+
+
+def mixed_workload(seed, n_interactive=4, n_interactive_jobs=10):
+    """One client submits a large job at time 0; interactive clients submit
+    a stream of small jobs while it runs."""
+    rng = random.Random(seed)
+    batch = FakeClient(0, 'batch')
+    workload = [(0.0, batch, [rng.uniform(5, 15) for _ in range(2000)], 1)]
+    for i in range(n_interactive):
+        client = FakeClient(i + 1, f'interactive-{i + 1}')
+        t = rng.uniform(0, 10)
+        for _ in range(n_interactive_jobs):
+            durations = [rng.uniform(1, 3)
+                         for _ in range(rng.randint(4, 32))]
+            workload.append((t, client, durations, 2))
+            t += rng.expovariate(1 / 60)
+    return workload
+
+
+def simulate(policy, workload, n_executors, n_cores, state_load_time):
+    executors = [FakeExecutor(i, n_cores) for i in range(n_executors)]
+    available = set(executors)
+    pending_jobs = set()
+    jobs = []
+    n_cold = 0
+    n_tasks = 0
+
+    # events are (time, seq, kind, payload); seq keeps the order stable
+    events = []
+    seq = 0
+    for submit_time, client, durations, priority in sorted(
+            workload, key=lambda w: w[0]):
+        job = FakeJob(len(jobs), client, submit_time, durations,
+                      priority)
+        jobs.append(job)
+        heapq.heappush(events, (submit_time, seq, 'submit', job))
+        seq += 1
+
+    now = 0.0
+    while events:
+        now, event_seq, kind, payload = heapq.heappop(events)
+        if kind == 'submit':
+            pending_jobs.add(payload)
+        else:
+            e, job = payload
+            if len(e.running) == e.n_cores:
+                available.add(e)
+            e.running.remove((job, event_seq))
+            job.n_running -= 1
+            job.client.n_running -= 1
+            job.n_incomplete -= 1
+            if job.n_incomplete == 0:
+                job.end_time = now
+                for x in executors:
+                    x.job_ids.discard(job.id)
+
+        while pending_jobs and available:
+            job = policy.choose_job(pending_jobs)
+            e = policy.choose_executor(job, available)
+            duration = job.pending_tasks.popleft()
+            if not job.pending_tasks:
+                pending_jobs.remove(job)
+            if job.id not in e.job_ids:
+                n_cold += 1
+                duration += state_load_time
+            n_tasks += 1
+
+            e.running.add((job, seq))
+            e.job_ids.add(job.id)
+            job.n_running += 1
+            job.client.n_running += 1
+            if len(e.running) == e.n_cores:
+                available.remove(e)
+            heapq.heappush(events,
+                           (now + duration, seq, 'complete', (e, job)))
+            seq += 1
+
+    latencies = collections.defaultdict(list)
+    for job in jobs:
+        latencies[job.client.name].append(job.end_time - job.submit_time)
+
+    return {
+        'makespan': now,
+        'cold_fraction': n_cold / n_tasks,
+        'latencies': dict(latencies)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Simulate scheduler policies on a mixed workload.')
+    parser.add_argument('--policy', choices=sorted(policies),
+                        action='append',
+                        help='policy to simulate, may be repeated '
+                             '(default: all)')
+    parser.add_argument('--executors', type=int, default=8)
+    parser.add_argument('--cores', type=int, default=4)
+    parser.add_argument('--state-load-time', type=float, default=2.0,
+                        help='extra time for a job\'s first task on an '
+                             'executor')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    for name in args.policy or sorted(policies):
+        for affinity in (False, True):
+            result = simulate(make_policy(name, affinity),
+                              mixed_workload(args.seed),
+                              args.executors, args.cores,
+                              args.state_load_time)
+            print(f'{name} affinity={affinity}: '
+                  f'makespan {result["makespan"]:.1f}, '
+                  f'cold starts {100 * result["cold_fraction"]:.1f}%')
+            for client, latencies in sorted(result['latencies'].items()):
+                print(f'  {client}: {len(latencies)} jobs, '
+                      f'latency mean {statistics.mean(latencies):.1f} '
+                      f'max {max(latencies):.1f}')
+
+
+if __name__ == '__main__':
+    main()
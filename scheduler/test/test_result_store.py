@@ -0,0 +1,38 @@
+import collections
+
+from scheduler.scheduler import ResultStore
+
+
+def test_spilled_results_round_trip(tmp_path):
+    store = ResultStore(10, str(tmp_path), 100)
+    handles = [store.put(bytes([i]) * 8) for i in range(20)]
+    assert store.n_in_memory == 1
+    assert store.n_spilled == 19
+    assert [store.get(h) for h in handles] == \
+        [bytes([i]) * 8 for i in range(20)]
+    for h in handles:
+        store.remove(h)
+    assert store.to_dict()['spill_file_bytes'] == 0
+    assert store.memory_bytes == 0
+
+
+def test_spill_files_are_bounded_under_sustained_load(tmp_path):
+    # results are acknowledged a window behind as they keep arriving, so
+    # some are always spilled and the spill file is never empty
+    store = ResultStore(0, str(tmp_path), 1000)
+    window = collections.deque()
+    max_spill_file_bytes = 0
+    for i in range(10000):
+        result = i.to_bytes(4, 'big') * 25
+        window.append((store.put(result), result))
+        if len(window) > 50:
+            handle, expected = window.popleft()
+            assert store.get(handle) == expected
+            store.remove(handle)
+        assert store.n_spilled > 0
+        max_spill_file_bytes = max(max_spill_file_bytes,
+                                   store.to_dict()['spill_file_bytes'])
+
+    # 50 results of 100 bytes span at most 7 segments of 1000 bytes
+    assert max_spill_file_bytes <= 7 * 1000
+    assert len(store.segments) <= 7